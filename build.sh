@@ -8,4 +8,7 @@ pip install -r requirements.txt
 python manage.py collectstatic --no-input
 
 # อัปเดต Database (Migrate)
-python manage.py migrate
\ No newline at end of file
+python manage.py migrate
+
+# สร้างตาราง Cache กลาง (django_cache) ถ้ายังไม่มี
+python manage.py createcachetable
\ No newline at end of file
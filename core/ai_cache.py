@@ -0,0 +1,90 @@
+# core/ai_cache.py
+
+import datetime
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AICacheEntry
+
+HITS_KEY = 'ai_cache:hits'
+MISSES_KEY = 'ai_cache:misses'
+
+
+def make_cache_key(model_name, prompt):
+    """สร้าง key จาก hash ของชื่อโมเดล + prompt (prompt เดียวกัน = คำตอบเดียวกัน)"""
+    return hashlib.sha256(f"{model_name}\n{prompt}".encode('utf-8')).hexdigest()
+
+
+def _count(key):
+    """
+    นับ hit/miss ใน Django cache (ไม่ต้องเขียน DB ทุกครั้งที่เรียก AI)
+    ค่าเป็นค่าประมาณ: Redis นับ incr แบบ atomic แต่ DatabaseCache/LocMem ทำ get แล้ว set
+    หลาย Worker พร้อมกันอาจนับหายบ้าง และค่าหายเมื่อ cache ถูกล้าง
+    """
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError: # key ถูกลบไประหว่าง add กับ incr
+        cache.set(key, 1, None)
+
+
+def cache_get(cache_key, count_miss=True):
+    """คืนค่าที่เก็บไว้ หรือ None ถ้าไม่มี/หมดอายุ"""
+    now = timezone.now()
+    entry = AICacheEntry.objects.filter(cache_key=cache_key, expires_at__gt=now).first()
+    if entry is None:
+        if count_miss:
+            _count(MISSES_KEY)
+        return None
+
+    # อัปเดตเวลาใช้งานล่าสุด (LRU) และจำนวนครั้งที่ถูกใช้ (บวกใน DB ไม่ให้ Request พร้อมกันนับทับกัน)
+    AICacheEntry.objects.filter(cache_key=cache_key).update(
+        last_used_at=now, hit_count=F('hit_count') + 1
+    )
+    _count(HITS_KEY)
+    return entry.value
+
+
+def cache_set(cache_key, model_name, value):
+    """บันทึกผลลัพธ์ลง Cache และไล่ลบรายการที่หมดอายุ/เก่าที่สุดเมื่อเกินขนาด"""
+    now = timezone.now()
+    ttl = getattr(settings, 'AI_CACHE_TTL', 30 * 24 * 3600)
+    AICacheEntry.objects.update_or_create(
+        cache_key=cache_key,
+        defaults={
+            'model_name': model_name,
+            'value': value,
+            'last_used_at': now,
+            'expires_at': now + datetime.timedelta(seconds=ttl),
+        }
+    )
+    evict()
+
+
+def evict():
+    """ลบรายการที่หมดอายุ และรายการที่ไม่ได้ใช้นานที่สุดเมื่อเกิน AI_CACHE_MAX_ENTRIES"""
+    AICacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    max_entries = getattr(settings, 'AI_CACHE_MAX_ENTRIES', 5000)
+    overflow = AICacheEntry.objects.count() - max_entries
+    if overflow > 0:
+        oldest = list(
+            AICacheEntry.objects.order_by('last_used_at').values_list('cache_key', flat=True)[:overflow]
+        )
+        AICacheEntry.objects.filter(cache_key__in=oldest).delete()
+
+
+def get_cache_stats():
+    """สถิติ hit/miss ของ Cache (hits/misses เป็นค่าประมาณ ดู _count)"""
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': (hits / total) if total else 0.0,
+        'entries': AICacheEntry.objects.count(),
+    }
@@ -1,187 +1,284 @@
 # core/ai_service.py
 
-import google.generativeai as genai
 from django.conf import settings
-from django.utils import timezone
 import json
-import re
-import datetime
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 
-from core.google_calendar import delete_event_from_google
-from .models import Subject, UserAvailability, StudySession
+from core.google_calendar import delete_events_from_google
+from .ai_cache import cache_get, cache_set, make_cache_key
+from .progress import session_bucket, update_progress
+from .json_stream import JSONArrayStream
+from .llm import get_provider
+from .models import AIGenerationLock, Subject, UserAvailability, StudySession
+from .scheduler import apply_study_plan, build_study_plan
 
-# ตั้งค่า API Key
-genai.configure(api_key=settings.GEMINI_API_KEY)
+# เวลารอสูงสุด (วินาที) ระหว่างรอคนอื่นสร้างคำตอบเดียวกันให้
+SINGLE_FLIGHT_TIMEOUT = 120
 
-def generate_study_schedule(user, user_settings):
-    print("--- เริ่มต้นกระบวนการ AI (Robust Version) ---")
+# รูปแบบ JSON ที่บังคับให้ AI ตอบ (Structured Output)
+QUIZ_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'question': {'type': 'string'},
+            'options': {'type': 'array', 'items': {'type': 'string'}},
+            'correct_index': {'type': 'integer'},
+        },
+        'required': ['question', 'options', 'correct_index'],
+    },
+}
 
-    # 1. ดึงข้อมูลวิชา
-    subjects = Subject.objects.filter(user=user)
-    if not subjects.exists():
-        print("Error: ไม่พบวิชาเรียนในระบบ (กรุณาเพิ่มวิชาก่อน)")
-        return False
+TOPICS_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'subject': {'type': 'string'},
+            'topic': {'type': 'string'},
+        },
+        'required': ['subject', 'topic'],
+    },
+}
 
-    subjects_data = []
-    for sub in subjects:
-        subjects_data.append({
-            "name": sub.name,
-            "difficulty": sub.get_difficulty_display(),
-            "exam_date": sub.exam_date.strftime("%Y-%m-%d %H:%M") if sub.exam_date else "No exam date"
-        })
-    print(f"ส่งข้อมูลวิชาไป: {[s['name'] for s in subjects_data]}")
 
-    # 2. ดึงข้อมูลเวลาว่าง
-    availability = UserAvailability.objects.filter(user=user)
-    availability_data = []
-    if availability.exists():
-        for slot in availability:
-            # availability_data.append(f"{slot.get_day_of_week_display()} - {slot.get_time_slot_display()}")
-            start_time = f"{slot.hour:02d}:00"
-            end_time = f"{(slot.hour + 1) % 24:02d}:00"
-            availability_data.append(f"{slot.get_day_of_week_display()}: {start_time} - {end_time}")
-        availability_prompt = f"User's available slots: {availability_data}"
-    else:
-        availability_prompt = "The user has NOT provided specific availability. Please create a balanced schedule."
-
-    # 3. สร้าง Prompt
-    now = timezone.localtime(timezone.now())
-    current_time_str = now.strftime("%Y-%m-%d %H:%M")
-    
+class _InFlightCall:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+_inflight_calls = {}
+_inflight_lock = threading.Lock()
+
+
+@contextmanager
+def _process_lock(key, timeout=SINGLE_FLIGHT_TIMEOUT):
+    """ล็อกข้าม Process ด้วยแถวใน DB (insert ได้ = ได้ล็อก)"""
+    deadline = time.monotonic() + timeout
+    acquired = False
+    while not acquired:
+        try:
+            with transaction.atomic():
+                AIGenerationLock.objects.create(lock_key=key)
+            acquired = True
+        except IntegrityError:
+            # ล็อกที่ค้างนานเกิน timeout (Process ตายไปแล้ว) ให้ลบทิ้ง
+            AIGenerationLock.objects.filter(
+                lock_key=key, created_at__lt=timezone.now() - timedelta(seconds=timeout)
+            ).delete()
+            if time.monotonic() > deadline:
+                break # รอนานเกินไป ทำเองเลย
+            time.sleep(0.5)
+    try:
+        yield
+    finally:
+        if acquired:
+            AIGenerationLock.objects.filter(lock_key=key).delete()
+
+
+def single_flight(key, fn, timeout=SINGLE_FLIGHT_TIMEOUT):
+    """
+    รวมการเรียกที่ key เดียวกันให้ทำงานจริงแค่ครั้งเดียว
+    - Thread อื่นใน Process เดียวกันจะรอผลจาก Thread แรก
+    - Process อื่นจะรอที่ล็อกใน DB (fn ควรเช็ค Cache ซ้ำหลังได้ล็อก)
+    """
+    with _inflight_lock:
+        call = _inflight_calls.get(key)
+        is_leader = call is None
+        if is_leader:
+            call = _InFlightCall()
+            _inflight_calls[key] = call
+
+    if not is_leader:
+        if call.event.wait(timeout):
+            if call.error is not None:
+                raise call.error
+            return call.result
+        return fn() # รอนานเกินไป ทำเองเลย
+
+    try:
+        with _process_lock(key, timeout):
+            call.result = fn()
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight_calls.pop(key, None)
+        call.event.set()
+
+
+def _generate_with_cache(prompt, parse, use_cache=True, task=None, schema=None):
+    """
+    เรียก AI ผ่าน Cache + Single-flight
+    parse: ฟังก์ชันรับคำตอบแบบ Stream (iterable ของข้อความ) แล้วแปลงผล
+           (คืน None ถ้าใช้ไม่ได้ และจะไม่ถูก Cache)
+    """
+    provider = get_provider()
+    # แยก Cache ตามโมเดล (คำตอบจาก AI จำลองจะไม่ปนกับของจริง)
+    cache_key = make_cache_key(provider.model_name, prompt)
+
+    def produce():
+        value = parse(provider.stream(prompt, task, schema))
+        if value is not None:
+            cache_set(cache_key, provider.model_name, value)
+        return value
+
+    if not use_cache:
+        return produce()
+
+    cached = cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    def produce_once():
+        # ระหว่างรอล็อก คนอื่นอาจสร้างเสร็จและเก็บลง Cache แล้ว
+        cached = cache_get(cache_key, count_miss=False)
+        if cached is not None:
+            return cached
+        return produce()
+
+    return single_flight(cache_key, produce_once)
+
+def label_session_topics(plan):
+    """
+    (ตัวเลือกเสริม) ให้ AI ตั้งชื่อหัวข้ออ่านให้แต่ละ Session ในแผนที่สร้างเสร็จแล้ว
+    ถ้า AI ล้มเหลว จะคงหัวข้อเดิมไว้ ตารางเรียนยังใช้งานได้ตามปกติ
+    """
+    # นับว่าแต่ละวิชาต้องการกี่หัวข้อ
+    topic_counts = {}
+    for item in plan:
+        name = item['subject'].name
+        topic_counts[name] = topic_counts.get(name, 0) + 1
+
     prompt = f"""
-    You are an expert study planner. Create a study schedule for a student.
-    
-    Current Date/Time: {current_time_str} (Do NOT schedule anything before this time).
-    
-    Configuration:
-    - Session Duration: {user_settings.session_duration} minutes per session.
-    - Break Duration: {user_settings.break_duration} minutes between sessions.
-    
-    Subjects to study (Source of Truth):
-    {json.dumps(subjects_data, ensure_ascii=False)} 
+    You are an expert study planner. Suggest study topics for each subject below.
 
-    Availability Constraints:
-    {availability_prompt}
+    Subjects and number of sessions:
+    {json.dumps(topic_counts, ensure_ascii=False)}
 
     Instructions:
-    1. Plan for the next 5 days only.
-    2. Return the output STRICTLY as a JSON Array.
-    3. Date format MUST be "YYYY-MM-DD HH:MM".
-    4. CRITICAL: You MUST use the EXACT subject name provided in the 'Subjects to study' list. 
-       - Do NOT paraphrase (e.g., do not change "History of Art" to "Art History").
-       - Do NOT abbreviate.
-       - Copy the name string exactly character-by-character.
-    
-    JSON Format required:
-    [
-        {{
-            "subject_name": "Subject Name Here (EXACT MATCH ONLY)",
-            "start_time": "YYYY-MM-DD HH:MM", 
-            "end_time": "YYYY-MM-DD HH:MM",
-            "topic": "Topic to read"
-        }}
-    ]
+    1. For each subject, return exactly that many short topics, ordered from fundamentals to advanced.
+    2. Return a JSON Array of objects {{"subject": <EXACT subject name>, "topic": <short topic>}}.
     """
 
-    # 4. เรียก Gemini
-    model = genai.GenerativeModel('models/gemini-2.5-flash')
+    # Session ที่ยังรอหัวข้อ แยกตามวิชา (เรียงตามเวลาในแผน)
+    pending = {}
+    for item in plan:
+        pending.setdefault(item['subject'].name, []).append(item)
+
+    def apply(entry):
+        if not isinstance(entry, dict) or not isinstance(entry.get('topic'), str):
+            return
+        items = pending.get(entry.get('subject'))
+        if items:
+            items.pop(0)['topic'] = entry['topic'][:255]
+
+    # ใส่หัวข้อทันทีที่ได้แต่ละรายการ ถ้า AI ล้มเหลวกลางทาง หัวข้อที่ได้แล้วยังใช้ได้
+    parser = JSONArrayStream()
     try:
-        response = model.generate_content(prompt)
-        raw_text = response.text
-        print(f"AI Response Raw (First 100 chars): {raw_text[:100]}...")
-
-        # --- New Cleaning Logic ---
-        # ลบ Markdown Code Block ออก (เช่น ```json ... ```)
-        cleaned_text = re.sub(r'```json\s*', '', raw_text)
-        cleaned_text = re.sub(r'```\s*', '', cleaned_text)
-        cleaned_text = cleaned_text.strip()
-
-        # พยายามหา List [ ... ] ด้วย Regex เผื่อมีข้อความอื่นปนมา
-        json_match = re.search(r'\[.*\]', cleaned_text, re.DOTALL)
-        if json_match:
-            cleaned_text = json_match.group(0)
-
-        # แปลง String เป็น JSON
-        try:
-            data = json.loads(cleaned_text)
-        except json.JSONDecodeError as e:
-            print(f"JSON Decode Error: {e}")
-            print(f"Text that failed: {cleaned_text}")
-            return False
-
-        # Normalization: ทำให้เป็น List เสมอ
-        schedule_list = []
-        if isinstance(data, list):
-            schedule_list = data
-        elif isinstance(data, dict):
-            # ถ้า AI ส่งมาเป็น Object ให้ลองหา Key ที่เป็น List
-            for key, value in data.items():
-                if isinstance(value, list):
-                    schedule_list = value
-                    break
-        
-        if not schedule_list:
-             print("Error: แปลง JSON ได้แต่ไม่พบรายการตารางเรียน (Empty List)")
-             return False
+        for chunk in get_provider().stream(prompt, task='topics', schema=TOPICS_SCHEMA):
+            for entry in parser.feed(chunk):
+                apply(entry)
+    except Exception as e:
+        print(f"AI Topic Labelling Error: {e}")
+    for entry in parser.close():
+        apply(entry)
 
-        print(f"ได้รายการตารางเรียนมาทั้งหมด: {len(schedule_list)} รายการ")
+    if parser.skipped:
+        print(f"Warning: ข้ามหัวข้อที่รูปแบบไม่ถูกต้อง {parser.skipped} รายการ")
+    return plan
 
-        # 5. บันทึกลง Database
-        # --- ✅ ส่วนที่เพิ่มใหม่: ลบ Event เก่าใน Google Calendar ก่อน ---
-        old_sessions = StudySession.objects.filter(user=user, is_completed=False)
-        
-        for session in old_sessions:
-            # ถ้า Session นี้เคยซิงค์ไปแล้ว (มี ID) ให้ลบออกจาก Google ด้วย
-            if session.google_event_id:
-                delete_event_from_google(user, session.google_event_id)
-                
-        StudySession.objects.filter(user=user, is_completed=False).delete()
-
-        new_sessions = []
-        
-        for item in schedule_list:
-            subject_name = item.get('subject_name', '').strip()
-            
-            # ค้นหาวิชา (Case-Insensitive)
-            subject_obj = subjects.filter(name__iexact=subject_name).first()
-            
-            if subject_obj:
-                try:
-                    # แปลงเวลาและใส่ Timezone (สำคัญมากสำหรับ Django)
-                    naive_start = datetime.datetime.strptime(item['start_time'], "%Y-%m-%d %H:%M")
-                    naive_end = datetime.datetime.strptime(item['end_time'], "%Y-%m-%d %H:%M")
-                    
-                    start_t = timezone.make_aware(naive_start)
-                    end_t = timezone.make_aware(naive_end)
-                    
-                    new_sessions.append(StudySession(
-                        user=user,
-                        subject=subject_obj,
-                        start_time=start_t,
-                        end_time=end_t,
-                        topic=item.get('topic', 'Review')
-                    ))
-                except ValueError as ve:
-                    print(f"Date format error: {ve} in item: {item}")
-            else:
-                print(f"Warning: วิชา '{subject_name}' ที่ AI บอกมา ไม่มีในฐานข้อมูล")
-        
-        if new_sessions:
-            StudySession.objects.bulk_create(new_sessions)
-            print(f"SUCCESS: บันทึกตารางเรียนลง DB สำเร็จ {len(new_sessions)} รายการ")
-            return True
-        else:
-            print("Error: ไม่สามารถสร้าง Session ได้เลย (อาจเพราะชื่อวิชาไม่ตรง)")
-            return False
 
-    except Exception as e:
-        print(f"CRITICAL ERROR: {e}")
+def generate_study_schedule(user, user_settings, incremental=True):
+    print("--- เริ่มต้นสร้างตารางเรียน (Local Scheduler) ---")
+
+    # 1. ดึงข้อมูลวิชา
+    subjects = list(Subject.objects.filter(user=user))
+    if not subjects:
+        print("Error: ไม่พบวิชาเรียนในระบบ (กรุณาเพิ่มวิชาก่อน)")
         return False
+
+    # 2. ดึงข้อมูลเวลาว่าง
+    availability_hours = list(
+        UserAvailability.objects.filter(user=user).values_list('day_of_week', 'hour')
+    )
+
+    # 3. จัดตารางด้วย Scheduler ในเครื่อง (ไม่ต้องรอ AI)
+    plan = build_study_plan(
+        subjects,
+        availability_hours,
+        user_settings.session_duration,
+        user_settings.break_duration,
+    )
+    if not plan:
+        print("Error: ไม่มีช่วงเวลาว่างพอสำหรับสร้าง Session (หรือทุกวิชาสอบไปแล้ว)")
+        return False
+
+    print(f"ได้รายการตารางเรียนมาทั้งหมด: {len(plan)} รายการ")
+
+    # 4. (ตัวเลือก) ให้ AI ช่วยตั้งชื่อหัวข้อ
+    if getattr(settings, 'AI_TOPIC_LABELLING', False):
+        plan = label_session_topics(plan)
+
+    # 5. บันทึกลง Database
+    if incremental:
+        # เทียบกับตารางเดิม แก้เฉพาะส่วนที่เปลี่ยน (Session ที่ไม่เปลี่ยนยังคง google_event_id เดิม)
+        changes = apply_study_plan(user, plan)
+        print(f"SUCCESS: อัปเดตตารางเรียนสำเร็จ {changes}")
+        return True
+
+    # --- ✅ ส่วนที่เพิ่มใหม่: ลบ Event เก่าใน Google Calendar ก่อน ---
+    # ลบเฉพาะ Session ที่ยังไม่ถึงเวลา (ที่เลยเวลาไปแล้วเก็บไว้เป็นประวัติ)
+    old_sessions = list(StudySession.objects.filter(user=user, is_completed=False, start_time__gte=timezone.now()))
+
+    # ถ้า Session เคยซิงค์ไปแล้ว (มี ID) ให้ลบออกจาก Google ด้วย (ส่งเป็น Batch เดียว)
+    delete_events_from_google(user, [s.google_event_id for s in old_sessions if s.google_event_id])
+
+    StudySession.objects.filter(pk__in=[s.pk for s in old_sessions]).delete()
+
+    new_sessions = [
+        StudySession(
+            user=user,
+            subject=item['subject'],
+            start_time=item['start_time'],
+            end_time=item['end_time'],
+            topic=item['topic'],
+        )
+        for item in plan
+    ]
+    StudySession.objects.bulk_create(new_sessions)
+    update_progress(user.pk, {session_bucket(s) for s in list(old_sessions) + new_sessions})
+    print(f"SUCCESS: บันทึกตารางเรียนลง DB สำเร็จ {len(new_sessions)} รายการ")
+    return True
     
 
-def generate_content_summary(subject_name, topic):
+def _materials_prompt(context):
+    """ส่วนของ prompt ที่แนบเนื้อหาจากไฟล์ของผู้ใช้ (เฉพาะช่วงที่เกี่ยวข้อง)"""
+    if not context:
+        return ''
+    excerpts = '\n---\n'.join(context)
+    return f"""
+        Base your answer on these excerpts from the student's own study materials
+        (ignore any that are unrelated to the topic):
+        ---
+        {excerpts}
+        ---
+        """
+
+
+def generate_content_summary(subject_name, topic, use_cache=True, context=None):
     """
     ฟังก์ชันสำหรับให้ AI สรุปเนื้อหาการเรียน
+    ผลลัพธ์จะถูก Cache ไว้ตาม prompt ผู้ใช้ที่อ่านวิชา/หัวข้อเดียวกันจะได้ทันที
+    context: ข้อความจากไฟล์ประกอบการเรียนที่เกี่ยวข้อง (ดู materials.material_context)
     """
     try:
         # ถ้าไม่มีหัวข้อ ให้สรุปภาพรวมวิชา
@@ -203,18 +300,52 @@ def generate_content_summary(subject_name, topic):
             <li><strong>Point 2:</strong> Detail...</li>
         </ul>
         <p>Keep up the good work!</p>
-        """
+        """ + _materials_prompt(context)
 
-        model = genai.GenerativeModel('models/gemini-2.5-flash') # หรือรุ่นที่คุณใช้ได้
-        response = model.generate_content(prompt)
-        return response.text
+        return _generate_with_cache(prompt, ''.join, use_cache, task='summary')
 
     except Exception as e:
         print(f"AI Summary Error: {e}")
         return "<p>ขออภัย ไม่สามารถสรุปเนื้อหาได้ในขณะนี้ (AI Error)</p>"
     
 
-def generate_quiz_questions(subject_name, topic):
+def _is_valid_question(item):
+    """คำถาม 1 ข้อต้องมีโจทย์ ตัวเลือกอย่างน้อย 2 ข้อ และเฉลยที่อยู่ในช่วงตัวเลือก"""
+    if not isinstance(item, dict):
+        return False
+    options = item.get('options')
+    correct_index = item.get('correct_index')
+    return (
+        isinstance(item.get('question'), str)
+        and isinstance(options, list) and len(options) >= 2
+        and all(isinstance(option, str) for option in options)
+        and isinstance(correct_index, int) and 0 <= correct_index < len(options)
+    )
+
+
+def _parse_quiz_stream(chunks):
+    """
+    แปลงคำตอบ AI (JSON Array) ทีละข้อระหว่างที่ Stream เข้ามา
+    ข้อที่รูปแบบผิดจะถูกข้าม ข้อที่ถูกต้องยังใช้ได้ (ไม่ต้องทิ้งทั้งชุด)
+    """
+    parser = JSONArrayStream()
+    items = []
+    for chunk in chunks:
+        items += parser.feed(chunk)
+    items += parser.close()
+
+    if not parser.started:
+        print("❌ Error: AI ไม่ได้ส่ง JSON Array มา")
+        return None
+
+    questions = [q for q in items if _is_valid_question(q)]
+    skipped = parser.skipped + len(items) - len(questions)
+    if skipped:
+        print(f"Warning: ข้ามคำถามที่รูปแบบไม่ถูกต้อง {skipped} ข้อ")
+    return questions or None
+
+
+def generate_quiz_questions(subject_name, topic, use_cache=True, context=None):
     print(f"--- 🚀 AI Quiz Start: {subject_name} ---") # เพิ่ม Log บรรทัดนี้เพื่อเช็คว่าโค้ดถูกเรียกจริง
 
     try:
@@ -237,25 +368,10 @@ def generate_quiz_questions(subject_name, topic):
                 "correct_index": 0
             }}
         ]
-        """
+        """ + _materials_prompt(context)
 
-        model = genai.GenerativeModel('models/gemini-2.5-flash') 
-        
-        response = model.generate_content(prompt)
-        raw_text = response.text
-        
-        print(f"DEBUG RAW AI: {raw_text[:50]}...") # ดูว่า AI ตอบกลับมาไหม
-
-        # ใช้ Regex แกะ JSON (ต้องมี import re ข้างบนสุด)
-        match = re.search(r'\[.*\]', raw_text, re.DOTALL)
-        
-        if match:
-            json_str = match.group(0)
-            json_str = json_str.replace("`", "") 
-            return json.loads(json_str)
-        else:
-            print("❌ Error: AI ไม่ได้ส่ง JSON Array มา")
-            return None
+        # ใช้ข้อสอบที่เคยสร้างจาก prompt เดียวกัน (ยกเว้นผู้ใช้ขอข้อสอบใหม่)
+        return _generate_with_cache(prompt, _parse_quiz_stream, use_cache, task='quiz', schema=QUIZ_SCHEMA)
 
     except Exception as e:
         print(f"❌ AI Quiz Error: {e}") # Log นี้สำคัญมาก
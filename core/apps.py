@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # ลงทะเบียน Signal (แจ้งเตือน, Blob ของไฟล์)
+        from . import signals  # noqa: F401
@@ -0,0 +1,134 @@
+# core/blobs.py
+
+import hashlib
+import os
+from collections import Counter
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Blob, File
+
+
+def hash_upload(upload):
+    """sha256 ของไฟล์ที่อัปโหลด อ่านทีละ Chunk (ไฟล์ใหญ่ไม่ต้องโหลดทั้งไฟล์เข้า Memory)"""
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def blob_file_name(content_hash, original_name):
+    """ชื่อไฟล์ของ Blob ใน Storage: hash ของเนื้อหา + นามสกุลเดิม (ตัวเล็ก)"""
+    return f"{content_hash}{os.path.splitext(original_name)[1].lower()}"
+
+
+def acquire_blob(upload, content_hash=None):
+    """
+    คืน Blob ของเนื้อหาไฟล์นี้ (เพิ่ม ref_count แล้ว) ถ้ามีเนื้อหาเดียวกันอยู่แล้วไม่ต้องอัปโหลดซ้ำ
+    ต้องเรียกภายใน transaction เดียวกับการสร้าง File ที่ใช้ Blob นี้
+    ไฟล์จากฟอร์มมี content_hash ที่ Upload handler คำนวณไว้แล้ว ไฟล์อื่นจึงค่อยอ่านเพื่อหา hash
+    """
+    content_hash = content_hash or getattr(upload, 'content_hash', None) or hash_upload(upload)
+    blob = Blob.objects.select_for_update().filter(content_hash=content_hash).first()
+    if blob is None:
+        blob = Blob(content_hash=content_hash, size_in_bytes=upload.size, ref_count=1)
+        # ตั้งชื่อไฟล์ตามเนื้อหา (subject_materials/<sha256>.<ext>) ไม่ใช้ชื่อของคนอัปโหลดคนแรก
+        # เพราะผู้ใช้อื่นที่อัปโหลดเนื้อหาเดียวกันจะใช้ไฟล์นี้ร่วมกัน ชื่อที่แสดงให้แต่ละคนเห็นอยู่ใน File.file_name
+        blob.file.save(blob_file_name(content_hash, upload.name), upload, save=False)
+        try:
+            with transaction.atomic():
+                blob.save(force_insert=True)
+            return blob
+        except IntegrityError:
+            # อีก Request อัปโหลดเนื้อหาเดียวกันเสร็จก่อน ใช้ของเขาแล้วลบไฟล์ที่เพิ่งอัปโหลดทิ้ง
+            blob.file.delete(save=False)
+            blob = Blob.objects.select_for_update().get(content_hash=content_hash)
+
+    Blob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+    blob.ref_count += 1
+    return blob
+
+
+def release_blobs(content_hashes):
+    """ลด ref_count ของ Blob (เรียกเมื่อ File ถูกลบ) Blob ที่ไม่มีใครใช้แล้วจะถูกลบหลัง Commit"""
+    counts = Counter(h for h in content_hashes if h)
+    # รวม Blob ที่ลดเท่ากันไว้ใน UPDATE เดียว (ปกติทุกตัวลด 1 = Query เดียวไม่ว่าจะลบกี่ไฟล์)
+    by_count = {}
+    for content_hash, count in counts.items():
+        by_count.setdefault(count, []).append(content_hash)
+    for count, hashes in by_count.items():
+        Blob.objects.filter(pk__in=hashes).update(ref_count=F('ref_count') - count)
+    if counts:
+        transaction.on_commit(lambda: collect_blobs(list(counts)))
+
+
+def discard_unreferenced(names):
+    """
+    ลบไฟล์ที่เพิ่งเขียนลง Storage แต่ Transaction ถูก Rollback (ไม่มีแถว Blob/File ไหนอ้างถึงแล้ว)
+    ไฟล์ของ Blob ที่มีอยู่ก่อน (แถวยังอยู่) ไม่ถูกลบ
+    """
+    storage = Blob._meta.get_field('file').storage
+    for name in set(names):
+        if name and not Blob.objects.filter(file=name).exists() and not File.objects.filter(file=name).exists():
+            storage.delete(name)
+
+
+def collect_blobs(content_hashes=None):
+    """
+    ลบ Blob ที่ ref_count เหลือ 0 ทั้งแถวและไฟล์ใน Storage (ไม่ระบุ = ตรวจทุก Blob)
+    คืนค่าจำนวน Blob ที่ลบ
+    """
+    candidates = Blob.objects.filter(ref_count__lte=0)
+    if content_hashes is not None:
+        candidates = candidates.filter(pk__in=content_hashes)
+
+    deleted = 0
+    for content_hash in candidates.values_list('pk', flat=True):
+        with transaction.atomic():
+            # ล็อกแล้วเช็คอีกครั้ง เผื่อมีการอัปโหลดเนื้อหาเดียวกันเข้ามาใช้ระหว่างนี้
+            blob = Blob.objects.select_for_update().filter(pk=content_hash, ref_count__lte=0).first()
+            if blob is None:
+                continue
+            name = blob.file.name
+            storage = blob.file.storage
+            blob.delete()
+            transaction.on_commit(lambda storage=storage, name=name: storage.delete(name))
+        deleted += 1
+    return deleted
+
+
+def adopt_file(file_obj, dry_run=False):
+    """
+    ย้าย File เก่า (ก่อนมี Blob) มาใช้ Blob: ถ้าเนื้อหาซ้ำกับ Blob ที่มีอยู่ ให้ชี้ไปที่ไฟล์ของ Blob แล้วลบสำเนาของตัวเอง
+    คืนค่าชื่อไฟล์สำเนาที่ลบได้ (None = ไม่ซ้ำ)
+    """
+    digest = hashlib.sha256()
+    with file_obj.file.open('rb') as f:
+        for chunk in f.chunks():
+            digest.update(chunk)
+    content_hash = digest.hexdigest()
+
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(content_hash=content_hash).first()
+        duplicate = file_obj.file.name if blob and blob.file.name != file_obj.file.name else None
+        if dry_run:
+            if blob is None:
+                # ให้ไฟล์ถัดไปที่เนื้อหาเหมือนกันนับเป็นสำเนา (ย้อนกลับตอนจบ)
+                Blob.objects.create(content_hash=content_hash, file=file_obj.file.name, size_in_bytes=file_obj.size_in_bytes)
+            return duplicate
+
+        if blob is None:
+            blob = Blob.objects.create(
+                content_hash=content_hash, file=file_obj.file.name,
+                size_in_bytes=file_obj.size_in_bytes, ref_count=1,
+            )
+        else:
+            Blob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+        File.objects.filter(pk=file_obj.pk).update(blob=blob, file=blob.file.name)
+
+        # ลบสำเนาออกจาก Storage เมื่อไม่มี File ไหนชี้ไปที่ชื่อนั้นแล้ว
+        if duplicate and not File.objects.filter(file=duplicate).exists():
+            storage = file_obj.file.storage
+            transaction.on_commit(lambda: storage.delete(duplicate))
+    return duplicate
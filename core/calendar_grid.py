@@ -0,0 +1,48 @@
+# core/calendar_grid.py
+
+import datetime
+from django.utils import timezone
+
+# แถวชั่วโมงที่แสดงในตาราง (01:00 - 23:00)
+DEFAULT_HOURS = range(1, 24)
+
+ONE_HOUR = datetime.timedelta(hours=1)
+
+
+def bucket_sessions(sessions):
+    """
+    จัด Session ลงช่อง (วันที่ local, ชั่วโมง) ในรอบเดียว
+    คืนค่า 2 dict: ช่องที่ Session เริ่ม และช่องที่ Session ยังเรียนต่อเนื่องอยู่
+    (Session ที่ยาวหลายชั่วโมงหรือข้ามเที่ยงคืนจะอยู่ในทุกช่องที่ครอบคลุม)
+    """
+    starts = {}
+    continued = {}
+    for session in sessions:
+        # แปลงเป็น local time ครั้งเดียวต่อ Session
+        local_start = timezone.localtime(session.start_time)
+        local_end = timezone.localtime(session.end_time)
+
+        starts.setdefault((local_start.date(), local_start.hour), []).append(session)
+
+        cursor = local_start.replace(minute=0, second=0, microsecond=0) + ONE_HOUR
+        while cursor < local_end:
+            continued.setdefault((cursor.date(), cursor.hour), []).append(session)
+            cursor += ONE_HOUR
+    return starts, continued
+
+
+def build_calendar_grid(sessions, week_dates, hours=DEFAULT_HOURS):
+    """สร้างข้อมูลตาราง (แถว = ชั่วโมง, คอลัมน์ = วัน) สำหรับ home_page.html"""
+    starts, continued = bucket_sessions(sessions)
+
+    calendar_grid = []
+    for hour in hours:
+        row = {'hour': f"{hour:02d}:00", 'days': []}
+        for day in week_dates:
+            row['days'].append({
+                'date': day,
+                'sessions': starts.get((day, hour), []),
+                'continued': continued.get((day, hour), []),
+            })
+        calendar_grid.append(row)
+    return calendar_grid
@@ -1,16 +1,20 @@
-from .models import Notification
+from django.utils.functional import SimpleLazyObject
+
+from .notifications import get_notification_summary
 
 def notifications(request):
     if request.user.is_authenticated:
-        # ดึงแจ้งเตือนทั้งหมดของผู้ใช้ (เอาแค่ 10 อันล่าสุด)
-        all_notifs = Notification.objects.filter(recipient=request.user)[:10]
-        # นับจำนวนที่ยังไม่อ่าน
-        unread_count = Notification.objects.filter(recipient=request.user, is_read=False).count()
+        user_id = request.user.pk
+        # โหลดแบบ Lazy: หน้าที่ไม่ได้แสดงกระดิ่งแจ้งเตือนจะไม่ต้องดึงข้อมูลเลย
+        # (Template จะเรียก callable ให้เองตอนใช้ตัวแปร)
+        summary = SimpleLazyObject(lambda: get_notification_summary(user_id))
         return {
-            'notifications': all_notifs,
-            'unread_count': unread_count
+            # แจ้งเตือน 10 อันล่าสุด
+            'notifications': lambda: summary['recent'],
+            # จำนวนที่ยังไม่อ่าน
+            'unread_count': lambda: summary['unread_count']
         }
     return {
         'notifications': [],
         'unread_count': 0
-    }
\ No newline at end of file
+    }
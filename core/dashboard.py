@@ -0,0 +1,45 @@
+# core/dashboard.py
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ProgressAnalytic
+from .progress import rebuild_progress
+
+
+def compute_dashboard_stats(user, day):
+    """อ่านสถิติหน้าแรกจากแถวสรุปความก้าวหน้า (รวมทั้งหมด + รายวัน) ใน Query เดียว ไม่ต้องนับ Session ทั้งหมด"""
+    rows = {
+        row.date: row
+        for row in ProgressAnalytic.objects.filter(user=user, subject__isnull=True).filter(Q(date=day) | Q(date__isnull=True))
+    }
+    if None not in rows:
+        # ผู้ใช้ที่ยังไม่เคยคำนวณสรุป (ก่อนมีตารางนี้) Backfill ครั้งเดียว
+        rebuild_progress(user)
+        return compute_dashboard_stats(user, day)
+
+    total, today = rows[None], rows.get(day) or ProgressAnalytic()
+    return {
+        'total_plans': total.sessions_planned,
+        'completed_all': total.sessions_completed,
+        'total_today': today.sessions_planned,
+        'completed_today': today.sessions_completed,
+    }
+
+
+def get_dashboard_stats(user, day=None):
+    """
+    คืนค่า dict สถิติของผู้ใช้ (total_plans, completed_all, total_today, completed_today,
+    daily_progress, readiness_score)
+    แถวสรุปใน DB คือ Snapshot ที่ทุก Process เห็นตรงกันอยู่แล้ว (อัปเดตทุกครั้งที่ Session เปลี่ยน)
+    จึงไม่ต้อง Cache ซ้ำ (Cache ในหน่วยความจำของแต่ละ Process ล้างข้าม Process ไม่ได้)
+    """
+    if day is None:
+        day = timezone.localdate()
+
+    stats = compute_dashboard_stats(user, day)
+    total_today = stats['total_today']
+    total_plans = stats['total_plans']
+    stats['daily_progress'] = int((stats['completed_today'] / total_today) * 100) if total_today > 0 else 0
+    stats['readiness_score'] = int((stats['completed_all'] / total_plans) * 100) if total_plans > 0 else 0
+    return stats
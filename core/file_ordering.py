@@ -0,0 +1,72 @@
+# core/file_ordering.py
+
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .blobs import acquire_blob, discard_unreferenced
+from .models import File, Subject
+
+MAX_FILES_PER_SUBJECT = 5
+# เว้นระยะระหว่างลำดับ: ลบไฟล์แล้วไม่ต้องรันเลขใหม่ (ลำดับเว้นช่องได้ ใช้แค่เปรียบเทียบก่อน-หลัง)
+ORDER_GAP = 1024
+
+
+def add_files(subject, uploads, content_hashes=None):
+    """
+    บันทึกไฟล์ที่อัปโหลดต่อท้ายไฟล์เดิมของวิชา (ไม่เกิน MAX_FILES_PER_SUBJECT) ด้วย INSERT ครั้งเดียว
+    content_hashes = hash ที่คำนวณไว้แล้วของแต่ละไฟล์ (ไม่ต้องอ่านไฟล์ซ้ำ)
+    คืนค่า List ของ File ที่บันทึกแล้ว
+    """
+    stored = []
+    try:
+        with transaction.atomic():
+            # ล็อกแถววิชาไว้ (อัปโหลดพร้อมกัน 2 ครั้งจะได้ไม่เกินโควต้า/ลำดับไม่ชนกัน)
+            Subject.objects.select_for_update().filter(pk=subject.pk).exists()
+            current = File.objects.filter(subject=subject).aggregate(
+                count=Count('pk'), last=Max('order'),
+            )
+            # ตัดไฟล์ที่เกินโควต้าทิ้งก่อนเขียนลง Storage
+            uploads = list(uploads)[:max(MAX_FILES_PER_SUBJECT - current['count'], 0)]
+            last = current['last'] or 0
+            files = []
+            for index, f in enumerate(uploads):
+                # ไฟล์เนื้อหาซ้ำกับที่เคยอัปโหลด (ของใครก็ได้) ใช้ไฟล์เดิมใน Storage ไม่อัปโหลดซ้ำ
+                blob = acquire_blob(f, content_hashes[index] if content_hashes else None)
+                stored.append(blob.file.name)
+                files.append(File(
+                    subject=subject,
+                    blob=blob,
+                    file=blob.file.name,
+                    file_name=f.name,
+                    file_type=f.content_type,
+                    size_in_bytes=f.size,
+                    order=last + ORDER_GAP * (index + 1),
+                ))
+            return File.objects.bulk_create(files)
+    except Exception:
+        # แถวถูก Rollback แล้ว ไฟล์ที่เพิ่งเขียนลง Storage ไม่มีใครอ้างถึง
+        discard_unreferenced(stored)
+        raise
+
+
+def reorder_files(subject, file_ids):
+    """
+    เรียงไฟล์ของวิชาตาม file_ids (ต้องครบทุกไฟล์ของวิชา) อัปเดตเฉพาะแถวที่ลำดับเปลี่ยนใน UPDATE เดียว
+    คืนค่า List ของ File ตามลำดับใหม่ หรือ ValueError ถ้า file_ids ไม่ตรงกับไฟล์ของวิชา
+    """
+    with transaction.atomic():
+        files = {str(f.file_id): f for f in File.objects.select_for_update().filter(subject=subject)}
+        file_ids = [str(file_id) for file_id in file_ids]
+        if len(file_ids) != len(files) or set(file_ids) != set(files):
+            raise ValueError('file_ids must list every file of the subject exactly once')
+
+        ordered = [files[file_id] for file_id in file_ids]
+        changed = []
+        for index, f in enumerate(ordered):
+            order = ORDER_GAP * (index + 1)
+            if f.order != order:
+                f.order = order
+                changed.append(f)
+        # bulk_update = UPDATE ... SET order = CASE WHEN ... ครั้งเดียว (เขียนแค่คอลัมน์ order)
+        File.objects.bulk_update(changed, ['order'])
+    return ordered
@@ -66,13 +66,14 @@ class UserSettingsForm(forms.ModelForm):
     class Meta:
         model = UserSettings
         # เพิ่ม 'bio' และ 'academic_goal' ต่อท้าย
-        fields = ['session_duration', 'break_duration', 'notifications_enabled', 'bio', 'academic_goal']
+        fields = ['session_duration', 'break_duration', 'notifications_enabled', 'fresh_quizzes', 'bio', 'academic_goal']
         
         widgets = {
             # อันเดิม (ถ้าไม่ได้ใส่ widget ไว้ก็ปล่อยว่างได้ แต่แนะนำให้ใส่ class form-control)
             'session_duration': forms.NumberInput(attrs={'class': 'form-control'}),
             'break_duration': forms.NumberInput(attrs={'class': 'form-control'}),
             'notifications_enabled': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'fresh_quizzes': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             
             # อันใหม่
             'bio': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'คติประจำใจ หรือ คำอธิบายตัวเองสั้นๆ'}),
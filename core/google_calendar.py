@@ -2,23 +2,126 @@
 
 import os
 import datetime
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+import json
+import logging
+import threading
+from collections import OrderedDict
 from django.conf import settings
-from google.auth.transport.requests import Request  # <--- เพิ่ม
-from google.auth.exceptions import RefreshError     # <--- เพิ่ม
 from .models import GoogleCredential, StudySession
 
+logger = logging.getLogger(__name__)
+
+# หมายเหตุ: Google SDK (googleapiclient, google_auth_oauthlib, google.auth) import ในฟังก์ชันที่ใช้
+# เพื่อไม่ให้ทุก Worker/คำสั่ง manage.py ต้องโหลด SDK ตั้งแต่เริ่ม
+
 # ตั้งค่า Path ของไฟล์ client_secret.json
 CLIENT_SECRETS_FILE = os.path.join(settings.BASE_DIR, "client_secret.json")
 SCOPES = ['https://www.googleapis.com/auth/calendar.events']
 
+# Google Calendar รับได้สูงสุด 50 Request ต่อ 1 Batch
+BATCH_SIZE = 50
+
+# จำนวนผู้ใช้สูงสุดที่เก็บ Credentials/Service ไว้ใน Process (เกินแล้วลบตัวที่ไม่ได้ใช้นานที่สุด)
+MAX_CACHED_USERS = 256
+
+_discovery_doc = None
+_discovery_lock = threading.Lock()
+_credentials_cache = OrderedDict() # user_id -> (fingerprint ของ Token, Credentials)
+_credentials_lock = threading.Lock()
+# httplib2 ไม่ thread-safe จึงเก็บ Service แยกตาม Thread
+_thread_local = threading.local()
+
 REDIRECT_URI = 'http://127.0.0.1:8000/google/callback/'  # สำหรับทดสอบบนเครื่อง localhost
 REDIRECT_URI = 'https://smart-study-planner-wa6t.onrender.com/google/callback/'  # สำหรับใช้งานจริงบน Render
 
+def _get_discovery_doc():
+    """โหลด Discovery Document ของ Calendar API ครั้งเดียวต่อ Process"""
+    global _discovery_doc
+    if _discovery_doc is None:
+        with _discovery_lock:
+            if _discovery_doc is None:
+                from googleapiclient.discovery_cache import get_static_doc
+                doc = get_static_doc('calendar', 'v3')
+                _discovery_doc = json.loads(doc) if doc else {}
+    return _discovery_doc
+
+def _token_fingerprint(token_data):
+    return (token_data.get('token'), token_data.get('refresh_token'))
+
+def _credentials_from_token(token_data):
+    """สร้าง Credentials จาก dict ใน DB (expiry ถูกเก็บเป็น ISO string)"""
+    from google.oauth2.credentials import Credentials
+
+    data = dict(token_data)
+    expiry = data.pop('expiry', None)
+    creds = Credentials(**data)
+    if expiry:
+        creds.expiry = datetime.datetime.fromisoformat(expiry)
+    return creds
+
+def invalidate_calendar_service(user):
+    """ลบ Credentials/Service ที่ Cache ไว้ (เช่น ตอนลบ Token หรือเชื่อมต่อใหม่)"""
+    with _credentials_lock:
+        _credentials_cache.pop(user.pk, None)
+
+def get_calendar_service(user):
+    """
+    คืนค่า Calendar Service ของผู้ใช้ โดยสร้างครั้งเดียวต่อ Token แล้วใช้ซ้ำ
+    Token ที่หมดอายุจะถูก Refresh และบันทึกลง DB อัตโนมัติ
+    - raise GoogleCredential.DoesNotExist ถ้ายังไม่ได้เชื่อมต่อ
+    - raise RefreshError ถ้า Refresh ไม่ผ่าน (เช่น invalid_grant)
+    """
+    g_cred = GoogleCredential.objects.get(user=user)
+    fingerprint = _token_fingerprint(g_cred.token)
+
+    with _credentials_lock:
+        cached = _credentials_cache.get(user.pk)
+        if cached and cached[0] == fingerprint:
+            creds = cached[1]
+            _credentials_cache.move_to_end(user.pk)
+        else:
+            creds = _credentials_from_token(g_cred.token)
+
+    # --- ตรวจสอบและ Refresh Token อัตโนมัติ ---
+    if not creds.valid and creds.expired and creds.refresh_token:
+        from google.auth.transport.requests import Request
+        creds.refresh(Request())
+        # บันทึก Token ใหม่ลง DB
+        g_cred.token.update({
+            'token': creds.token,
+            'expiry': creds.expiry.isoformat() if creds.expiry else None
+        })
+        g_cred.save()
+        fingerprint = _token_fingerprint(g_cred.token)
+
+    with _credentials_lock:
+        _credentials_cache[user.pk] = (fingerprint, creds)
+        _credentials_cache.move_to_end(user.pk)
+        while len(_credentials_cache) > MAX_CACHED_USERS:
+            _credentials_cache.popitem(last=False)
+
+    services = getattr(_thread_local, 'services', None)
+    if services is None or len(services) > MAX_CACHED_USERS:
+        services = _thread_local.services = {}
+
+    cached_service = services.get(user.pk)
+    if cached_service and cached_service[0] is creds:
+        return cached_service[1]
+
+    from googleapiclient.discovery import build, build_from_document
+
+    discovery_doc = _get_discovery_doc()
+    if discovery_doc:
+        service = build_from_document(discovery_doc, credentials=creds)
+    else:
+        service = build('calendar', 'v3', credentials=creds)
+    services[user.pk] = (creds, service)
+    return service
+
 def get_auth_url():
     """สร้าง URL เพื่อส่งผู้ใช้ไป Login Google"""
+    from google_auth_oauthlib.flow import Flow
+
     flow = Flow.from_client_secrets_file(
         CLIENT_SECRETS_FILE, scopes=SCOPES, redirect_uri=REDIRECT_URI
     )
@@ -27,6 +130,8 @@ def get_auth_url():
 
 def exchange_code_for_token(user, code):
     """นำ Code ที่ได้จาก Google มาแลกเป็น Token ถาวรและบันทึก"""
+    from google_auth_oauthlib.flow import Flow
+
     flow = Flow.from_client_secrets_file(
         CLIENT_SECRETS_FILE, scopes=SCOPES, redirect_uri=REDIRECT_URI
     )
@@ -46,102 +151,173 @@ def exchange_code_for_token(user, code):
     GoogleCredential.objects.update_or_create(
         user=user, defaults={'token': creds_data}
     )
+    invalidate_calendar_service(user)
+
+def _build_event_body(session):
+    """แปลง StudySession เป็น Event ของ Google Calendar"""
+    return {
+        'summary': f"อ่าน: {session.subject.name}",
+        'description': f"Topic: {session.topic}\n(Created by Smart Study Planner)",
+        'start': {
+            # แปลงเวลาเป็น Format ที่ Google ต้องการ (ISO Format)
+            'dateTime': session.start_time.isoformat(),
+            'timeZone': 'Asia/Bangkok', # หรือ 'UTC' ตาม setting
+        },
+        'end': {
+            'dateTime': session.end_time.isoformat(),
+            'timeZone': 'Asia/Bangkok',
+        },
+        'reminders': {
+            'useDefault': False,
+            'overrides': [
+                {'method': 'popup', 'minutes': 10},
+            ],
+        },
+    }
+
+def _is_missing_event(exception):
+    """Event ถูกลบไปแล้วฝั่ง Google (404 Not Found / 410 Gone)"""
+    from googleapiclient.errors import HttpError
+    return isinstance(exception, HttpError) and exception.resp.status in (404, 410)
+
+def execute_in_batches(service, requests):
+    """
+    ส่งหลาย Request ไปใน HTTP Batch (ครั้งละไม่เกิน BATCH_SIZE)
+    requests: List ของ (request_id, HttpRequest)
+    คืนค่า dict {request_id: (response, exception)} แยกผลรายตัว
+    Batch ที่ส่งไม่ผ่านทั้งก้อน (เน็ตหลุด/5xx/Refresh ไม่ผ่าน) นับเป็น exception เฉพาะ Request ใน Batch นั้น
+    ผลของ Batch ก่อนหน้ายังอยู่ครบ
+    """
+    results = {}
+
+    def callback(request_id, response, exception):
+        results[request_id] = (response, exception)
+
+    for i in range(0, len(requests), BATCH_SIZE):
+        chunk = requests[i:i + BATCH_SIZE]
+        batch = service.new_batch_http_request(callback=callback)
+        for request_id, request in chunk:
+            batch.add(request, request_id=request_id)
+        try:
+            batch.execute()
+        except Exception as e:
+            for request_id, _ in chunk:
+                results.setdefault(request_id, (None, e))
+    return results
 
 def sync_sessions_to_google(user):
     """ฟังก์ชันหลัก: ดึงตารางเรียนไปใส่ Google Calendar"""
     try:
-        # 1. ดึง Token จาก DB
-        g_cred = GoogleCredential.objects.get(user=user)
-        creds = Credentials(**g_cred.token)
+        # 1-2. ดึง Service ที่ Cache ไว้ (Refresh Token อัตโนมัติถ้าหมดอายุ)
+        from google.auth.exceptions import RefreshError
 
-        # --- เพิ่ม: ตรวจสอบและ Refresh Token อัตโนมัติ ---
         try:
-            if not creds.valid:
-                if creds.expired and creds.refresh_token:
-                    creds.refresh(Request())
-                    # บันทึก Token ใหม่ลง DB
-                    g_cred.token.update({
-                        'token': creds.token,
-                        'expiry': creds.expiry.isoformat() if creds.expiry else None
-                    })
-                    g_cred.save()
-        except (RefreshError, Exception) as e:
-            # ถ้า Refresh ไม่ผ่าน (เช่น invalid_grant) ให้ลบทิ้งเลย
-            print(f"Token expired/invalid: {e}")
-            g_cred.delete()
+            service = get_calendar_service(user)
+        except RefreshError as e:
+            # ลบ Token เฉพาะตอนที่ Google ปฏิเสธ Refresh Token (invalid_grant = ถูกเพิกถอน/หมดอายุถาวร)
+            # Error อื่น (เน็ตหลุด, Google ล่ม) ไม่ลบ ให้ลองใหม่รอบหน้าได้
+            if 'invalid_grant' not in str(e):
+                raise
+            logger.warning("Google token revoked for user %s: %s", user.pk, e)
+            GoogleCredential.objects.filter(user=user).delete()
+            invalidate_calendar_service(user)
             return False, "ยังไม่ได้เชื่อมต่อ (Session หมดอายุ กรุณา Login ใหม่)"
-        
-        # 2. สร้าง Service
-        service = build('calendar', 'v3', credentials=creds)
 
         # 3. หาวิชาที่ยังไม่ได้ซิงค์
-        sessions = StudySession.objects.filter(user=user, is_synced=False)
-        
-        synced_count = 0
+        sessions = list(StudySession.objects.filter(user=user, is_synced=False).select_related('subject'))
+        sessions_by_id = {str(session.session_id): session for session in sessions}
+
+        # 4. รวมทุก Event เป็น Batch Request เดียว (แทนการยิงทีละ Event)
+        requests = []
         for session in sessions:
-            # แปลงเวลาเป็น Format ที่ Google ต้องการ (ISO Format)
-            start_time = session.start_time.isoformat()
-            end_time = session.end_time.isoformat()
-            
-            event = {
-                'summary': f"อ่าน: {session.subject.name}",
-                'description': f"Topic: {session.topic}\n(Created by Smart Study Planner)",
-                'start': {
-                    'dateTime': start_time,
-                    'timeZone': 'Asia/Bangkok', # หรือ 'UTC' ตาม setting
-                },
-                'end': {
-                    'dateTime': end_time,
-                    'timeZone': 'Asia/Bangkok',
-                },
-                'reminders': {
-                    'useDefault': False,
-                    'overrides': [
-                        {'method': 'popup', 'minutes': 10},
-                    ],
-                },
-            }
-
-            try:
-                # ยิง API ไปสร้าง Event
-                event_result = service.events().insert(calendarId='primary', body=event).execute()
-                
-                # อัปเดตสถานะใน DB เรา
-                session.google_event_id = event_result['id']
+            event = _build_event_body(session)
+            if session.google_event_id:
+                # Session เดิมที่ถูกเลื่อนเวลา/เปลี่ยนวิชา -> แก้ Event เดิมแทนการสร้างใหม่
+                request = service.events().update(
+                    calendarId='primary', eventId=session.google_event_id, body=event
+                )
+            else:
+                request = service.events().insert(calendarId='primary', body=event)
+            requests.append((str(session.session_id), request))
+
+        results = execute_in_batches(service, requests)
+
+        # Event ที่ถูกลบไปแล้วฝั่ง Google (404/410) ให้สร้างใหม่แทน
+        retry_requests = [
+            (request_id, service.events().insert(calendarId='primary', body=_build_event_body(sessions_by_id[request_id])))
+            for request_id, (response, exception) in results.items()
+            if exception is not None and _is_missing_event(exception) and sessions_by_id[request_id].google_event_id
+        ]
+        results.update(execute_in_batches(service, retry_requests))
+
+        # 5. อัปเดตสถานะใน DB เราครั้งเดียวด้วย bulk_update
+        synced = []
+        failed_count = 0
+        token_revoked = False
+        for request_id, (response, exception) in results.items():
+            session = sessions_by_id[request_id]
+            if exception is None:
+                session.google_event_id = response['id']
                 session.is_synced = True
-                session.save()
-                synced_count += 1
+                synced.append(session)
+                continue
+
+            failed_count += 1
+            logger.warning("Error syncing session %s: %s", session.session_id, exception)
+
+            # --- เพิ่ม: ดักจับ Error invalid_grant ---
+            # ยังไม่ return ตรงนี้: Event ที่สร้างสำเร็จไปแล้วต้องบันทึก google_event_id ก่อน ไม่งั้นซิงค์รอบหน้าจะสร้างซ้ำ
+            if 'invalid_grant' in str(exception):
+                token_revoked = True
 
-            except Exception as e:
-                error_str = str(e)
-                print(f"Error syncing session {session.session_id}: {e}")
+        if synced:
+            StudySession.objects.bulk_update(synced, ['google_event_id', 'is_synced'])
 
-                # --- เพิ่ม: ดักจับ Error invalid_grant ในลูป ---
-                if 'invalid_grant' in error_str:
-                    g_cred.delete() # ลบ Token ทิ้ง
-                    return False, "ยังไม่ได้เชื่อมต่อ (Token หลุดระหว่างทำงาน กรุณา Login ใหม่)"
+        if token_revoked:
+            GoogleCredential.objects.filter(user=user).delete() # ลบ Token ทิ้ง
+            invalidate_calendar_service(user)
+            return False, f"ยังไม่ได้เชื่อมต่อ (Token หลุดระหว่างทำงาน ซิงค์ได้ {len(synced)} รายการ กรุณา Login ใหม่)"
 
-        return True, f"ซิงค์เรียบร้อย {synced_count} รายการ"
+        if failed_count:
+            return True, f"ซิงค์เรียบร้อย {len(synced)} รายการ (ไม่สำเร็จ {failed_count} รายการ)"
+        return True, f"ซิงค์เรียบร้อย {len(synced)} รายการ"
 
     except GoogleCredential.DoesNotExist:
         return False, "ยังไม่ได้เชื่อมต่อบัญชี Google"
     except Exception as e:
+        logger.exception("Google Calendar sync failed for user %s", user.pk)
         return False, str(e)
     
-def delete_event_from_google(user, google_event_id):
-    """ฟังก์ชันสำหรับลบ Event ออกจาก Google Calendar"""
+def delete_events_from_google(user, google_event_ids):
+    """ลบหลาย Event ออกจาก Google Calendar ด้วย Batch Request คืนค่าจำนวนที่ลบสำเร็จ"""
+    google_event_ids = [event_id for event_id in google_event_ids if event_id]
+    if not google_event_ids:
+        return 0
+
     try:
-        # 1. ดึง Token
-        g_cred = GoogleCredential.objects.get(user=user)
-        creds = Credentials(**g_cred.token)
+        # 1-2. ดึง Service ที่ Cache ไว้
+        service = get_calendar_service(user)
         
-        # 2. สร้าง Service
-        service = build('calendar', 'v3', credentials=creds)
-        
-        # 3. สั่งลบ Event
-        service.events().delete(calendarId='primary', eventId=google_event_id).execute()
-        print(f"Deleted Google Event: {google_event_id}")
-        return True
+        # 3. สั่งลบ Event ทั้งหมดใน Batch
+        requests = [
+            (event_id, service.events().delete(calendarId='primary', eventId=event_id))
+            for event_id in google_event_ids
+        ]
+        results = execute_in_batches(service, requests)
     except Exception as e:
-        print(f"Error deleting google event: {e}")
-        return False
\ No newline at end of file
+        logger.exception("Error deleting google events: %s", e)
+        return 0
+
+    deleted_count = 0
+    for event_id, (response, exception) in results.items():
+        # Event ที่ไม่มีอยู่แล้วฝั่ง Google ถือว่าลบสำเร็จ
+        if exception is None or _is_missing_event(exception):
+            deleted_count += 1
+        else:
+            logger.warning("Error deleting google event %s: %s", event_id, exception)
+    logger.info("Deleted Google Events: %s/%s", deleted_count, len(google_event_ids))
+    return deleted_count
+
+def delete_event_from_google(user, google_event_id):
+    """ฟังก์ชันสำหรับลบ Event ออกจาก Google Calendar"""
+    return delete_events_from_google(user, [google_event_id]) == 1
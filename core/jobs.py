@@ -0,0 +1,211 @@
+# core/jobs.py
+
+import datetime
+import threading
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import BackgroundJob, IssuedQuiz, Notification, StudySession, StudySummary, Subject, UserSettings
+from .ai_service import generate_content_summary, generate_quiz_questions, generate_study_schedule
+from .materials import index_subject_materials, material_context
+from .quizzes import BANK_MIN_SIZE, QUIZ_SIZE, add_to_bank, public_questions, sample_questions, store_quiz
+from .query_inspector import inline_job
+
+# งานที่ค้างสถานะ running นานเกินนี้ ถือว่า Worker ตายไปแล้ว ให้นำกลับเข้าคิว
+JOB_TIMEOUT = datetime.timedelta(minutes=10)
+MAX_ATTEMPTS = 3
+
+# งานที่หน้าเว็บไม่ต้องรอผล: ถ้าไม่มี Worker ให้รันใน Thread หลัง Commit แทนการรันค้างอยู่ใน Request
+# (ถ้า Thread หายไปก่อนทำเสร็จ material_context จะอ่านไฟล์ที่ค้างให้ตอนใช้งานครั้งแรก)
+DETACHED_JOB_TYPES = {'index_materials'}
+
+
+def _run_schedule(job):
+    user_settings, _ = UserSettings.objects.get_or_create(user=job.user)
+    success = generate_study_schedule(job.user, user_settings)
+
+    # แจ้งผู้ใช้ผ่านกระดิ่งแจ้งเตือน เพราะหน้าเว็บไม่ได้รอผลแล้ว (ถ้ารันใน Request หน้าเว็บจะแจ้งเอง)
+    if getattr(settings, 'USE_BACKGROUND_JOBS', False):
+        if success:
+            Notification.objects.create(
+                recipient=job.user, message='สร้างตารางเรียนเรียบร้อยแล้ว!',
+                link='/home/', notification_type='success'
+            )
+        else:
+            Notification.objects.create(
+                recipient=job.user, message='เกิดข้อผิดพลาดในการสร้างตาราง (อาจไม่มีข้อมูลวิชา หรือ AI มีปัญหา)',
+                link='/study-settings/', notification_type='warning'
+            )
+    return {'success': success}
+
+
+def _session_context(subject, topic):
+    """เนื้อหาจากไฟล์ประกอบการเรียนของวิชาที่เกี่ยวกับหัวข้อนี้ (ไม่มีไฟล์ = List ว่าง)"""
+    return material_context(subject.pk, f"{subject.name} {topic or ''}")
+
+
+def _bank_subject(subject, context):
+    """ข้อสอบที่อิงไฟล์ของผู้ใช้ เก็บแยกคลังของวิชานั้น (ไม่ปนกับคลังกลางที่ผู้ใช้อื่นใช้ร่วมกัน)"""
+    return f"{subject.name} #{subject.pk}" if context else subject.name
+
+
+def _run_summary(job):
+    session = StudySession.objects.select_related('subject').get(
+        session_id=job.payload['session_id'], user=job.user
+    )
+    summary_obj, created = StudySummary.objects.get_or_create(
+        session=session,
+        defaults={'user': job.user, 'subject': session.subject, 'content': ''}
+    )
+    if not summary_obj.content:
+        summary_obj.content = generate_content_summary(
+            session.subject.name, session.topic, context=_session_context(session.subject, session.topic)
+        )
+        summary_obj.save()
+    return {'summary_id': str(summary_obj.summary_id)}
+
+
+def _run_quiz(job):
+    session = StudySession.objects.select_related('subject').get(
+        session_id=job.payload['session_id'], user=job.user
+    )
+    subject_name, topic = session.subject.name, session.topic
+    context = _session_context(session.subject, topic)
+    bank_subject = _bank_subject(session.subject, context)
+    # ผู้ใช้ที่เลือก "ออกข้อสอบใหม่ทุกครั้ง" หรือขอ fresh มา จะได้ข้อใหม่จาก AI (แล้วเก็บเข้าคลังด้วย)
+    user_settings = UserSettings.objects.filter(user=job.user).first()
+    fresh = job.payload.get('fresh') or (user_settings is not None and user_settings.fresh_quizzes)
+
+    # ปกติสุ่มจากคลังข้อสอบของวิชา/หัวข้อนี้ เรียก AI เฉพาะตอนคลังมีไม่พอ 1 ชุด
+    questions, bank_size = ([], 0) if fresh else sample_questions(bank_subject, topic)
+    if len(questions) < QUIZ_SIZE:
+        quiz_data = generate_quiz_questions(subject_name, topic, use_cache=not fresh, context=context)
+        if quiz_data:
+            generated = add_to_bank(bank_subject, topic, quiz_data)
+            bank_size += len(generated)
+            picked = {q.question_id for q in generated}
+            questions = generated + [q for q in questions if q.question_id not in picked]
+            questions = questions[:QUIZ_SIZE]
+    if not questions:
+        raise ValueError('AI could not generate quiz')
+
+    # คลังเหลือน้อย: สั่ง Worker เติมโจทย์ใหม่ไว้ล่วงหน้า (ผู้ใช้ไม่ต้องรอ)
+    # ถ้าไม่ได้เปิด Worker จะไม่เติม เพราะ enqueue_job จะรันใน Request นี้ทันที
+    if getattr(settings, 'USE_BACKGROUND_JOBS', False) and bank_size < BANK_MIN_SIZE:
+        enqueue_job(job.user, 'refill_bank', {'subject_id': str(session.subject_id), 'topic': topic})
+
+    # เก็บชุดข้อสอบ (ID ของข้อในคลัง) ไว้ฝั่ง Server ส่งให้หน้าเว็บเฉพาะโจทย์และตัวเลือก
+    quiz = store_quiz(questions)
+    IssuedQuiz.objects.get_or_create(user=job.user, session=session, quiz=quiz)
+    return {'quiz_id': str(quiz.quiz_id), 'quiz': public_questions([q.as_dict() for q in questions])}
+
+
+def _run_refill_bank(job):
+    """ให้ AI สร้างโจทย์ชุดใหม่เข้าคลังของวิชา/หัวข้อ (ไม่ใช้ Cache เพราะต้องการข้อที่ยังไม่มี)"""
+    subject = Subject.objects.get(subject_id=job.payload['subject_id'], user=job.user)
+    topic = job.payload['topic']
+    context = _session_context(subject, topic)
+    quiz_data = generate_quiz_questions(subject.name, topic, use_cache=False, context=context)
+    if not quiz_data:
+        raise ValueError('AI could not generate quiz')
+    added = add_to_bank(_bank_subject(subject, context), topic, quiz_data)
+    return {'questions': len(added)}
+
+
+def _run_index_materials(job):
+    """อ่านข้อความจากไฟล์ที่เพิ่งอัปโหลด แบ่ง Chunk และสร้าง Index ของวิชา"""
+    subject = Subject.objects.get(subject_id=job.payload['subject_id'], user=job.user)
+    return index_subject_materials(subject.pk)
+
+
+JOB_HANDLERS = {
+    'schedule': _run_schedule,
+    'summary': _run_summary,
+    'quiz': _run_quiz,
+    'refill_bank': _run_refill_bank,
+    'index_materials': _run_index_materials,
+}
+
+
+def enqueue_job(user, job_type, payload=None):
+    """
+    เพิ่มงานเข้าคิว ถ้ามีงานเดียวกันรออยู่แล้วจะคืนงานเดิม (ไม่สร้างซ้ำ)
+    ถ้าไม่ได้เปิด USE_BACKGROUND_JOBS จะรันทันทีใน Request เหมือนเดิม
+    ยกเว้น DETACHED_JOB_TYPES ที่รันใน Thread หลัง Commit (Request ตอบกลับได้เลย)
+    """
+    payload = payload or {}
+    job = BackgroundJob.objects.filter(
+        user=user, job_type=job_type, payload=payload, status__in=['pending', 'running']
+    ).first()
+    if job:
+        return job
+
+    job = BackgroundJob.objects.create(user=user, job_type=job_type, payload=payload)
+
+    if not getattr(settings, 'USE_BACKGROUND_JOBS', False):
+        if job_type in DETACHED_JOB_TYPES:
+            transaction.on_commit(
+                lambda: threading.Thread(target=_run_detached, args=(job,), daemon=True).start()
+            )
+        else:
+            with inline_job():
+                if claim_job(job):
+                    run_job(job)
+    return job
+
+
+def _run_detached(job):
+    """รันงานใน Thread แยก (มี Connection ของตัวเอง ต้องปิดเองเมื่อจบ)"""
+    try:
+        if claim_job(job):
+            run_job(job)
+    finally:
+        connection.close()
+
+
+def claim_job(job):
+    """จองงานด้วย UPDATE แบบมีเงื่อนไข Worker หลายตัวจะไม่ได้งานเดียวกัน"""
+    now = timezone.now()
+    claimed = BackgroundJob.objects.filter(pk=job.pk, status='pending').update(
+        status='running', started_at=now, attempts=job.attempts + 1
+    )
+    if claimed:
+        job.status = 'running'
+        job.started_at = now
+        job.attempts += 1
+    return bool(claimed)
+
+
+def claim_next_job():
+    """หยิบงานที่เก่าที่สุดในคิวมาทำ คืนค่า None ถ้าคิวว่าง"""
+    for job in BackgroundJob.objects.filter(status='pending').order_by('created_at')[:10]:
+        if claim_job(job):
+            return job
+    return None
+
+
+def requeue_stale_jobs():
+    """นำงานที่ค้างนานเกินไปกลับเข้าคิว (หรือปิดเป็น failed ถ้าลองครบแล้ว)"""
+    cutoff = timezone.now() - JOB_TIMEOUT
+    stale = BackgroundJob.objects.filter(status='running', started_at__lt=cutoff)
+    requeued = stale.filter(attempts__lt=MAX_ATTEMPTS).update(status='pending')
+    stale.update(status='failed', error='Job timed out', finished_at=timezone.now())
+    return requeued
+
+
+def run_job(job):
+    """รันงานที่จองไว้แล้ว และบันทึกผลลัพธ์/ข้อผิดพลาดลง DB"""
+    handler = JOB_HANDLERS.get(job.job_type)
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job type: {job.job_type}")
+        job.result = handler(job)
+        job.status = 'done'
+    except Exception as e:
+        print(f"Job {job.job_id} ({job.job_type}) failed: {e}")
+        job.error = str(e)
+        job.status = 'failed'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result', 'status', 'error', 'finished_at'])
+    return job
@@ -0,0 +1,80 @@
+# core/json_stream.py
+
+import json
+
+
+class JSONArrayStream:
+    """
+    แปลง JSON Array ที่ได้มาทีละส่วน (Streaming) เป็นรายการทีละตัว
+    - คืนค่าแต่ละ Element ทันทีที่ได้ครบ ไม่ต้องรอทั้ง Array
+    - Element ที่รูปแบบผิดจะถูกข้าม (นับใน skipped) ตัวอื่นยังใช้ได้
+    - ข้อความก่อน '[' (เช่น ```json) จะถูกข้ามไป
+
+        parser = JSONArrayStream()
+        for chunk in chunks:
+            for item in parser.feed(chunk):
+                ...
+        leftovers = parser.close()
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.pos = 0
+        self.started = False
+        self.done = False
+        self.element_start = None
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.skipped = 0
+
+    def feed(self, chunk):
+        """เพิ่มข้อความ คืนค่า List ของ Element ที่ได้ครบแล้ว"""
+        self.buffer += chunk
+        items = []
+        buffer = self.buffer
+        while self.pos < len(buffer) and not self.done:
+            ch = buffer[self.pos]
+            if not self.started:
+                if ch == '[':
+                    self.started = True
+                    self.element_start = self.pos + 1
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in '{[':
+                self.depth += 1
+            elif ch in '}]':
+                if self.depth == 0: # ปิด Array ชั้นนอกสุด
+                    self._emit(buffer[self.element_start:self.pos], items)
+                    self.done = True
+                else:
+                    self.depth -= 1
+            elif ch == ',' and self.depth == 0:
+                self._emit(buffer[self.element_start:self.pos], items)
+                self.element_start = self.pos + 1
+            self.pos += 1
+        return items
+
+    def close(self):
+        """จบ Stream: ถ้า Array ไม่ถูกปิด (คำตอบถูกตัด) ลองแปลง Element สุดท้ายที่ค้างอยู่"""
+        items = []
+        if self.started and not self.done:
+            self._emit(self.buffer[self.element_start:], items)
+            self.done = True
+        return items
+
+    def _emit(self, text, items):
+        text = text.strip()
+        if not text:
+            return
+        try:
+            items.append(json.loads(text))
+        except ValueError:
+            self.skipped += 1
@@ -0,0 +1,185 @@
+# core/llm.py
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from django.conf import settings
+
+
+class LLMProviderError(Exception):
+    """AI ตอบไม่ได้ (รวมถึงความผิดพลาดที่จำลองขึ้นด้วย failure_rate)"""
+
+
+class LLMProvider:
+    """
+    ตัวกลางเรียก AI: ส่ง prompt เข้าไป ได้ข้อความกลับมา
+    latency / failure_rate ใช้จำลองความช้าและความล้มเหลว (ใช้ได้กับทุก Provider)
+    task บอกว่าเป็นงานอะไร ('summary', 'quiz', 'topics') ให้ Provider จำลองตอบได้ถูกรูปแบบ
+    schema (ถ้ามี) คือ JSON Schema ของคำตอบ ให้โมเดลตอบเป็น JSON ตามรูปแบบนั้น
+    """
+    model_name = None
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _inject_faults(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate:
+            with self._rng_lock:
+                failed = self._rng.random() < self.failure_rate
+            if failed:
+                raise LLMProviderError(f"Injected failure from {self.model_name}")
+
+    def generate(self, prompt, task=None, schema=None):
+        """คืนคำตอบทั้งหมดเป็นข้อความเดียว"""
+        self._inject_faults()
+        return self._generate(prompt, task, schema)
+
+    def stream(self, prompt, task=None, schema=None):
+        """คืนคำตอบทีละส่วน (Generator ของ str) ตามที่โมเดลส่งมา"""
+        self._inject_faults()
+        yield from self._stream(prompt, task, schema)
+
+    def _generate(self, prompt, task, schema):
+        raise NotImplementedError
+
+    def _stream(self, prompt, task, schema):
+        yield self._generate(prompt, task, schema)
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini (ตั้งค่า API Key ตอนเรียกใช้ครั้งแรก ไม่ใช่ตอน import)"""
+    model_name = 'models/gemini-2.5-flash'
+
+    def __init__(self, api_key=None, model_name=None, **kwargs):
+        super().__init__(**kwargs)
+        self.api_key = api_key
+        if model_name:
+            self.model_name = model_name
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    def _get_model(self):
+        with self._model_lock:
+            if self._model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                self._model = genai.GenerativeModel(self.model_name)
+            return self._model
+
+    def _generation_config(self, schema):
+        if schema is None:
+            return None
+        # บังคับให้ตอบเป็น JSON ตาม Schema (ไม่มี Markdown/คำอธิบายปน)
+        return {'response_mime_type': 'application/json', 'response_schema': schema}
+
+    def _generate(self, prompt, task, schema):
+        try:
+            response = self._get_model().generate_content(
+                prompt, generation_config=self._generation_config(schema)
+            )
+            return response.text
+        except Exception as e:
+            raise LLMProviderError(str(e)) from e
+
+    def _stream(self, prompt, task, schema):
+        try:
+            response = self._get_model().generate_content(
+                prompt, generation_config=self._generation_config(schema), stream=True
+            )
+            for chunk in response:
+                yield chunk.text
+        except Exception as e:
+            raise LLMProviderError(str(e)) from e
+
+
+class FakeProvider(LLMProvider):
+    """
+    AI จำลองในเครื่อง (ไม่ต้องต่อเน็ต): prompt เดียวกันได้คำตอบเดียวกันเสมอ
+    คำตอบอยู่ในรูปแบบที่ ai_service แปลงได้จริง ใช้สำหรับ Load test / CI
+    """
+    model_name = 'fake-llm'
+    chunk_size = 64 # ขนาดแต่ละส่วนตอนจำลอง Streaming
+
+    def _stream(self, prompt, task, schema):
+        text = self._generate(prompt, task, schema)
+        for i in range(0, len(text), self.chunk_size):
+            yield text[i:i + self.chunk_size]
+
+    def _generate(self, prompt, task, schema):
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+
+        if task == 'quiz':
+            return json.dumps([
+                {
+                    'question': f"คำถามจำลองข้อที่ {i + 1}?",
+                    'options': ['ตัวเลือก ก', 'ตัวเลือก ข', 'ตัวเลือก ค', 'ตัวเลือก ง'],
+                    'correct_index': digest[i] % 4,
+                }
+                for i in range(5)
+            ], ensure_ascii=False)
+
+        if task == 'topics':
+            # prompt มี JSON {ชื่อวิชา: จำนวน Session} อยู่ ตอบหัวข้อให้ครบตามจำนวน
+            match = re.search(r'\{.*?\}', prompt, re.DOTALL)
+            counts = json.loads(match.group(0)) if match else {}
+            return json.dumps([
+                {'subject': name, 'topic': f"{name} หัวข้อที่ {i + 1}"}
+                for name, count in counts.items() for i in range(int(count))
+            ], ensure_ascii=False)
+
+        return (
+            "<ul>"
+            "<li><strong>ประเด็นที่ 1:</strong> เนื้อหาสรุปจำลอง</li>"
+            "<li><strong>ประเด็นที่ 2:</strong> ทบทวนตัวอย่างโจทย์</li>"
+            "</ul>"
+            f"<p>สู้ๆ นะ! (#{digest.hex()[:8]})</p>"
+        )
+
+
+PROVIDERS = {
+    'gemini': GeminiProvider,
+    'fake': FakeProvider,
+}
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def build_provider(name=None):
+    """สร้าง Provider จาก settings (AI_PROVIDER, AI_PROVIDER_LATENCY, AI_PROVIDER_FAILURE_RATE)"""
+    name = name or getattr(settings, 'AI_PROVIDER', 'gemini')
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown AI_PROVIDER: {name}")
+
+    kwargs = {
+        'latency': getattr(settings, 'AI_PROVIDER_LATENCY', 0.0),
+        'failure_rate': getattr(settings, 'AI_PROVIDER_FAILURE_RATE', 0.0),
+    }
+    if name == 'gemini':
+        kwargs['api_key'] = settings.GEMINI_API_KEY
+    return PROVIDERS[name](**kwargs)
+
+
+def get_provider():
+    """Provider ที่ใช้อยู่ (สร้างครั้งแรกที่เรียก)"""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = build_provider()
+        return _provider
+
+
+def set_provider(provider):
+    """เปลี่ยน Provider (เช่น ใช้ FakeProvider ตอน Load test) คืนค่า Provider เดิม"""
+    global _provider
+    with _provider_lock:
+        previous, _provider = _provider, provider
+    return previous
@@ -0,0 +1,29 @@
+# core/management/commands/backfill_progress.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import CustomUser
+from core.progress import rebuild_progress
+
+
+class Command(BaseCommand):
+    help = 'คำนวณตารางสรุปความก้าวหน้า (ProgressAnalytic) ใหม่จากประวัติ Session ทั้งหมด'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='อีเมลของผู้ใช้ที่ต้องการคำนวณใหม่ (ไม่ระบุ = ทุกคน)')
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(email=options['user'])
+            if not users.exists():
+                raise CommandError(f"User not found: {options['user']}")
+
+        total_users = total_rows = 0
+        for user in users.iterator():
+            total_rows += rebuild_progress(user)
+            total_users += 1
+            if total_users % 100 == 0:
+                self.stdout.write(f"  ... {total_users} users")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total_rows} progress rows for {total_users} users"))
@@ -0,0 +1,76 @@
+# core/management/commands/benchmark_calendar_grid.py
+
+import random
+import timeit
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.calendar_grid import DEFAULT_HOURS, build_calendar_grid
+from core.models import StudySession, Subject
+
+
+def legacy_calendar_grid(sessions, week_dates, hours=DEFAULT_HOURS):
+    """วิธีเดิมใน homepage_view: วนทุกชั่วโมง x ทุกวัน x ทุก Session (เก็บไว้เทียบผล)"""
+    calendar_grid = []
+    for hour in hours:
+        row = {'hour': f"{hour:02d}:00", 'days': []}
+        for day in week_dates:
+            sessions_in_slot = []
+            for s in sessions:
+                local_start = timezone.localtime(s.start_time)
+                if local_start.date() == day and local_start.hour == hour:
+                    sessions_in_slot.append(s)
+            row['days'].append({'date': day, 'sessions': sessions_in_slot})
+        calendar_grid.append(row)
+    return calendar_grid
+
+
+def synthetic_week(size, start_of_week, seed=0):
+    """สร้าง Session จำลอง (ไม่บันทึกลง DB) กระจายทั่วสัปดาห์ ความยาว 30-180 นาที"""
+    rng = random.Random(seed)
+    subjects = [Subject(name=f"Subject {i}") for i in range(8)]
+    week_start = timezone.make_aware(datetime.combine(start_of_week, datetime.min.time()))
+    sessions = []
+    for _ in range(size):
+        start = week_start + timedelta(minutes=rng.randrange(0, 7 * 24 * 60, 15))
+        sessions.append(StudySession(
+            subject=rng.choice(subjects),
+            start_time=start,
+            end_time=start + timedelta(minutes=rng.choice([30, 60, 90, 120, 180])),
+        ))
+    return sessions
+
+
+class Command(BaseCommand):
+    help = 'วัดเวลาการสร้างตารางปฏิทินหน้าแรก (วิธีเดิม vs วิธีใหม่) ด้วยข้อมูลจำลอง'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,50,100,250,500', help='จำนวน Session ต่อสัปดาห์ (คั่นด้วย ,)')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        start_of_week = today - timedelta(days=int(today.strftime("%w")))
+        week_dates = [start_of_week + timedelta(days=i) for i in range(7)]
+
+        self.stdout.write(f"{'sessions':>9} {'legacy (ms)':>12} {'bucketed (ms)':>14} {'speedup':>8}")
+        for size in [int(x) for x in options['sizes'].split(',')]:
+            sessions = synthetic_week(size, start_of_week, seed=size)
+
+            # ตรวจว่าช่องเริ่มต้นของทั้งสองวิธีตรงกัน
+            legacy = legacy_calendar_grid(sessions, week_dates)
+            bucketed = build_calendar_grid(sessions, week_dates)
+            for old_row, new_row in zip(legacy, bucketed):
+                for old_day, new_day in zip(old_row['days'], new_row['days']):
+                    assert old_day['sessions'] == new_day['sessions']
+
+            legacy_ms = min(timeit.repeat(
+                lambda: legacy_calendar_grid(sessions, week_dates), number=1, repeat=options['repeat']
+            )) * 1000
+            bucketed_ms = min(timeit.repeat(
+                lambda: build_calendar_grid(sessions, week_dates), number=1, repeat=options['repeat']
+            )) * 1000
+            self.stdout.write(
+                f"{size:>9} {legacy_ms:>12.2f} {bucketed_ms:>14.2f} {legacy_ms / bucketed_ms:>7.1f}x"
+            )
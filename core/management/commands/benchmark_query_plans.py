@@ -0,0 +1,125 @@
+# core/management/commands/benchmark_query_plans.py
+
+import random
+import timeit
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import CustomUser, Notification, StudySession, Subject
+
+# Index ที่เพิ่มใน 0023_query_indexes (ใช้ลบชั่วคราวเพื่อดูแผนแบบ "ก่อน")
+QUERY_INDEXES = [
+    (StudySession, 'session_user_start_idx'),
+    (StudySession, 'session_user_pending_idx'),
+    (StudySession, 'session_user_unsynced_idx'),
+    (Subject, 'subject_user_exam_idx'),
+    (Notification, 'notif_recipient_created_idx'),
+    (Notification, 'notif_recipient_unread_idx'),
+]
+
+
+def seed(users, sessions, seed_value=0):
+    """สร้างข้อมูลจำลอง: Session กระจาย ±180 วันจากวันนี้ ให้ผู้ใช้หลายคน"""
+    rng = random.Random(seed_value)
+    now = timezone.now()
+
+    user_objs = CustomUser.objects.bulk_create([
+        CustomUser(username=f"bench_{i}", email=f"bench_{i}@example.com", password='!')
+        for i in range(users)
+    ])
+    subjects = Subject.objects.bulk_create([
+        Subject(user=u, name=f"Subject {j}", exam_date=now + timedelta(days=rng.randint(-60, 120)))
+        for u in user_objs for j in range(5)
+    ])
+    subjects_by_user = {}
+    for s in subjects:
+        subjects_by_user.setdefault(s.user_id, []).append(s)
+
+    batch = []
+    for i in range(sessions):
+        user = user_objs[i % users]
+        start = now + timedelta(minutes=rng.randrange(-180 * 24 * 60, 180 * 24 * 60, 15))
+        batch.append(StudySession(
+            user=user,
+            subject=rng.choice(subjects_by_user[user.pk]),
+            start_time=start,
+            end_time=start + timedelta(hours=1),
+            is_completed=start < now and rng.random() < 0.8,
+            is_synced=rng.random() < 0.9,
+        ))
+        if len(batch) >= 5000:
+            StudySession.objects.bulk_create(batch)
+            batch = []
+    StudySession.objects.bulk_create(batch)
+
+    Notification.objects.bulk_create([
+        Notification(recipient=u, message='bench', is_read=rng.random() < 0.9)
+        for u in user_objs for _ in range(50)
+    ])
+    return user_objs[0]
+
+
+def hot_queries(user):
+    """Query ที่ใช้บ่อยในหน้าเว็บ (ชื่อ, QuerySet)"""
+    today = timezone.localdate()
+    day_start = timezone.make_aware(datetime.combine(today, datetime.min.time()))
+    week_start = day_start - timedelta(days=int(today.strftime("%w")))
+    return [
+        ('today (legacy __date)', StudySession.objects.filter(user=user, start_time__date=today)),
+        ('today (range)', StudySession.objects.filter(
+            user=user, start_time__gte=day_start, start_time__lt=day_start + timedelta(days=1))),
+        ('week (range)', StudySession.objects.filter(
+            user=user, start_time__lt=week_start + timedelta(days=7), end_time__gt=week_start)),
+        ('pending sessions', StudySession.objects.filter(user=user, is_completed=False).order_by('start_time')),
+        ('unsynced sessions', StudySession.objects.filter(user=user, is_synced=False)),
+        ('upcoming exams', Subject.objects.filter(user=user, exam_date__gte=timezone.now()).order_by('exam_date')),
+        ('unread notifications', Notification.objects.filter(recipient=user, is_read=False)),
+        ('recent notifications', Notification.objects.filter(recipient=user)[:10]),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'เปรียบเทียบแผนการ Query (EXPLAIN) และเวลา ก่อน/หลังเพิ่ม Index บนข้อมูลจำลอง (Rollback ทั้งหมดเมื่อจบ)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=100_000)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--plans', action='store_true', help='แสดง EXPLAIN เต็ม')
+
+    def measure(self, user, repeat):
+        results = {}
+        for name, qs in hot_queries(user):
+            ms = min(timeit.repeat(lambda: list(qs.all()), number=1, repeat=repeat)) * 1000
+            results[name] = (ms, qs.explain())
+        return results
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write(f"Seeding {options['sessions']} sessions for {options['users']} users...")
+            user = seed(options['users'], options['sessions'])
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            after = self.measure(user, options['repeat'])
+
+            # ลบ Index ชั่วคราว (อยู่ใน Transaction เดียวกัน จะถูก Rollback พร้อมข้อมูลจำลอง)
+            with connection.cursor() as cursor:
+                for model, index_name in QUERY_INDEXES:
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(index_name)}")
+                cursor.execute('ANALYZE')
+            before = self.measure(user, options['repeat'])
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'query':<24} {'before (ms)':>12} {'after (ms)':>11} {'speedup':>8}")
+        for name, (before_ms, before_plan) in before.items():
+            after_ms, after_plan = after[name]
+            self.stdout.write(
+                f"{name:<24} {before_ms:>12.2f} {after_ms:>11.2f} {before_ms / after_ms:>7.1f}x"
+            )
+            if options['plans']:
+                self.stdout.write(f"  before: {' | '.join(before_plan.splitlines())}")
+                self.stdout.write(f"  after:  {' | '.join(after_plan.splitlines())}")
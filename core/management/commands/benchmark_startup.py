@@ -0,0 +1,90 @@
+# core/management/commands/benchmark_startup.py
+
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# SDK ที่ต้องไม่ถูกโหลดตอนเริ่ม Worker (โหลดเมื่อใช้ AI/Calendar จริงเท่านั้น)
+HEAVY_MODULES = ('google.generativeai', 'googleapiclient', 'google_auth_oauthlib', 'grpc', 'google.protobuf')
+
+# รันใน Process ใหม่ทุกครั้ง: setup Django แล้วยิง Request แรก (โหลด URLconf/Views)
+STARTUP_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+import django
+django.setup()
+t1 = time.perf_counter()
+from django.test import Client
+Client().get('/', secure=True)
+t2 = time.perf_counter()
+print(json.dumps({
+    'setup_ms': (t1 - t0) * 1000,
+    'first_request_ms': (t2 - t1) * 1000,
+    'modules': sorted(sys.modules),
+}))
+"""
+
+_IMPORTTIME_RE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+def run_startup(importtime=False):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'smart_study_planner.settings'))
+    cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', STARTUP_SCRIPT]
+    proc = subprocess.run(cmd, capture_output=True, text=True, env=env, cwd=settings.BASE_DIR)
+    if proc.returncode != 0:
+        raise CommandError(proc.stderr[-2000:])
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['importtime'] = proc.stderr
+    return result
+
+
+def top_level_imports(importtime_output, limit):
+    """Package ระดับบนสุดที่ใช้เวลา import สะสม (cumulative) มากที่สุด"""
+    totals = {}
+    for self_us, cumulative_us, indent, name in _IMPORTTIME_RE.findall(importtime_output):
+        if len(indent) == 1: # import ชั้นแรก
+            root = name.split('.')[0]
+            totals[root] = totals.get(root, 0) + int(cumulative_us)
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+class Command(BaseCommand):
+    help = 'วัดเวลาเริ่ม Worker (django.setup + Request แรก) และตรวจว่า SDK หนักๆ ไม่ถูก import ตอนเริ่ม'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--budget', type=float, default=1000, help='เวลาสูงสุด (ms) ของ setup + Request แรก (ค่ากลาง)')
+        parser.add_argument('--top', type=int, default=10, help='แสดง Package ที่ import ช้าที่สุด N อันดับ')
+
+    def handle(self, *args, **options):
+        runs = [run_startup() for _ in range(options['repeat'])]
+        setup_ms = statistics.median(r['setup_ms'] for r in runs)
+        first_ms = statistics.median(r['first_request_ms'] for r in runs)
+        total_ms = setup_ms + first_ms
+
+        self.stdout.write(f"django.setup()   {setup_ms:8.1f} ms (median of {len(runs)})")
+        self.stdout.write(f"first request    {first_ms:8.1f} ms")
+        self.stdout.write(f"total            {total_ms:8.1f} ms (budget {options['budget']:.0f} ms)")
+
+        profile = run_startup(importtime=True)
+        self.stdout.write('Slowest top-level imports (python -X importtime, cumulative):')
+        for name, cumulative_us in top_level_imports(profile['importtime'], options['top']):
+            self.stdout.write(f"  {name:<28} {cumulative_us / 1000:8.1f} ms")
+
+        loaded = [
+            prefix for prefix in HEAVY_MODULES
+            if any(m == prefix or m.startswith(prefix + '.') for m in profile['modules'])
+        ]
+        problems = []
+        if loaded:
+            problems.append(f"heavy SDKs imported at startup: {', '.join(loaded)}")
+        if total_ms > options['budget']:
+            problems.append(f"startup took {total_ms:.0f} ms, over the {options['budget']:.0f} ms budget")
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('Startup within budget, no heavy SDKs loaded'))
@@ -0,0 +1,27 @@
+# core/management/commands/build_thumbnails.py
+
+from django.core.management.base import BaseCommand
+
+from core.models import CustomUser
+from core.thumbnails import refresh_profile_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'สร้างรูปย่อของรูปโปรไฟล์ที่อัปโหลดไว้ก่อนมีระบบรูปย่อ'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='สร้างใหม่ทุกคน (ไม่ระบุ = เฉพาะคนที่ยังไม่มีรูปย่อ)')
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True).order_by('pk')
+        if not options['all']:
+            users = users.filter(profile_thumbnails={})
+
+        built = failed = 0
+        for user in users.iterator():
+            if refresh_profile_thumbnails(user):
+                built += 1
+            else:
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Built thumbnails for {built} users, {failed} failed"))
@@ -0,0 +1,43 @@
+# core/management/commands/dedupe_materials.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.blobs import adopt_file, collect_blobs
+from core.models import File
+
+
+class Command(BaseCommand):
+    help = 'ย้ายไฟล์ประกอบการเรียนเก่ามาใช้ Blob (เก็บเนื้อหาซ้ำครั้งเดียว) ลบสำเนาที่ซ้ำ และลบ Blob ที่ไม่มีใครใช้'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='แสดงไฟล์ที่ซ้ำ แต่ไม่แก้ไขอะไร')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        files = File.objects.filter(blob__isnull=True).order_by('uploaded_at')
+        adopted = duplicates = freed = errors = 0
+
+        # dry-run: ทำใน transaction แล้วย้อนกลับทั้งหมด (Blob ที่สร้างไว้ใช้นับสำเนาเท่านั้น)
+        with transaction.atomic():
+            for file_obj in files.iterator():
+                try:
+                    duplicate = adopt_file(file_obj, dry_run=dry_run)
+                except Exception as e:
+                    errors += 1
+                    self.stderr.write(f"  {file_obj.file.name}: {e}")
+                    continue
+                adopted += 1
+                if duplicate:
+                    duplicates += 1
+                    freed += file_obj.size_in_bytes
+                    self.stdout.write(f"  duplicate: {duplicate}")
+            if dry_run:
+                transaction.set_rollback(True)
+
+        collected = 0 if dry_run else collect_blobs()
+        prefix = '[dry-run] ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{adopted} files checked, {duplicates} duplicates "
+            f"({freed / (1024 * 1024):.1f} MB), {collected} unused blobs removed, {errors} errors"
+        ))
@@ -0,0 +1,41 @@
+# core/management/commands/gc_media.py
+
+import datetime
+from django.core.management.base import BaseCommand
+
+from core.blobs import collect_blobs
+from core.media_gc import GRACE_PERIOD, delete_orphans, find_orphans
+from core.uploads import purge_expired_uploads
+
+
+class Command(BaseCommand):
+    help = 'ลบไฟล์ใน Storage (Local หรือ Cloudinary) ที่ไม่มีแถวใดใน DB อ้างถึงแล้ว'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='แสดงไฟล์ที่ลบได้และขนาดรวม แต่ไม่ลบจริง')
+        parser.add_argument(
+            '--grace-hours', type=float, default=GRACE_PERIOD.total_seconds() / 3600,
+            help='ไม่ลบไฟล์ที่ใหม่กว่านี้ (ชั่วโมง) เผื่อกำลังอัปโหลดอยู่',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        grace = datetime.timedelta(hours=options['grace_hours'])
+
+        # ลบแถวที่หมดอายุ/ไม่มีใครใช้ก่อน ไฟล์ของแถวเหล่านั้นจะถูกนับเป็นขยะในรอบเดียวกัน
+        uploads = blobs = 0
+        if not dry_run:
+            uploads = purge_expired_uploads()
+            blobs = collect_blobs()
+
+        orphans = find_orphans(grace=grace)
+        for entry in orphans:
+            self.stdout.write(f"  {entry.name} ({entry.size / 1024:.1f} KB)")
+        deleted = 0 if dry_run else delete_orphans(orphans)
+
+        reclaimable = sum(entry.size for entry in orphans)
+        prefix = '[dry-run] ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{len(orphans)} orphaned files ({reclaimable / (1024 * 1024):.1f} MB), "
+            f"{deleted} deleted, {uploads} expired uploads and {blobs} unused blobs removed"
+        ))
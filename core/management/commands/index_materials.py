@@ -0,0 +1,28 @@
+# core/management/commands/index_materials.py
+
+from django.core.management.base import BaseCommand
+
+from core.materials import index_subject_materials
+from core.models import File
+
+
+class Command(BaseCommand):
+    help = 'อ่านข้อความจากไฟล์ประกอบการเรียนที่ยังไม่เคยอ่าน แบ่ง Chunk และสร้าง Index ของแต่ละวิชา'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subject', help='subject_id ของวิชาที่ต้องการ (ไม่ระบุ = ทุกวิชาที่มีไฟล์ค้างอยู่)')
+
+    def handle(self, *args, **options):
+        if options['subject']:
+            subject_ids = [options['subject']]
+        else:
+            subject_ids = File.objects.filter(is_indexed=False).values_list('subject_id', flat=True).distinct()
+
+        total_files = total_chunks = 0
+        for subject_id in subject_ids:
+            result = index_subject_materials(subject_id)
+            total_files += result['files']
+            total_chunks += result['chunks']
+            self.stdout.write(f"  {subject_id}: {result['files']} files, {result['chunks']} chunks")
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total_files} files ({total_chunks} chunks in subject indexes)"))
@@ -0,0 +1,344 @@
+# core/management/commands/load_test.py
+
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from http.cookiejar import CookieJar
+from unittest import mock
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import close_old_connections
+
+from core.jobs import claim_next_job, run_job
+from core.llm import FakeProvider, set_provider
+from core.models import CustomUser, StudySession
+
+# สัดส่วนการสุ่ม Flow ต่อรอบของผู้ใช้จำลอง
+FLOW_WEIGHTS = {
+    'dashboard': 5,
+    'summary': 2,
+    'quiz': 2,
+    'schedule': 1,
+    'sync': 1,
+}
+
+# ช่วงเวลาที่ผู้ใช้จำลอง poll สถานะงานเบื้องหลัง (เท่ากับหน้าเว็บ)
+JOB_POLL_INTERVAL = 1.0
+
+
+# --- Backend จำลอง (ใช้เฉพาะตอนรัน Server ในตัว) ---
+
+class _StubRequest:
+    def __init__(self, body=None):
+        self.body = body
+
+
+class _StubBatch:
+    def __init__(self, callback, latency):
+        self.callback = callback
+        self.latency = latency
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        time.sleep(self.latency) # 1 Batch = 1 HTTP round trip
+        for request_id, request in self.requests:
+            self.callback(request_id, {'id': uuid.uuid4().hex}, None)
+
+
+class StubCalendarService:
+    """แทน Google Calendar service: รองรับ events().insert/update/delete และ Batch"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def events(self):
+        return self
+
+    def insert(self, calendarId=None, body=None):
+        return _StubRequest(body)
+
+    def update(self, calendarId=None, eventId=None, body=None):
+        return _StubRequest(body)
+
+    def delete(self, calendarId=None, eventId=None):
+        return _StubRequest()
+
+    def new_batch_http_request(self, callback=None):
+        return _StubBatch(callback, self.latency)
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    """ไม่ตาม Redirect อัตโนมัติ (วัดเวลาเฉพาะ Endpoint ที่เรียก)"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+# --- ผู้ใช้จำลอง ---
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, label, seconds, ok):
+        with self.lock:
+            self.latencies.setdefault(label, []).append(seconds)
+            if not ok:
+                self.errors[label] = self.errors.get(label, 0) + 1
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class VirtualUser:
+    def __init__(self, base_url, email, password, stats, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.email = email
+        self.password = password
+        self.stats = stats
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), _NoRedirect)
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, label, path, data=None, json_body=None):
+        headers = {'X-CSRFToken': self.csrf_token(), 'Referer': self.base_url + '/'}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            body = urlencode(data).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        request = Request(self.base_url + path, data=body, headers=headers)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                status, content = response.status, response.read()
+        except HTTPError as e:
+            status, content = e.code, e.read()
+        except OSError:
+            status, content = 0, b''
+        elapsed = time.perf_counter() - started
+
+        ok = 0 < status < 400
+        if ok and path.startswith('/api/'):
+            # API ตอบ 200 เสมอ ต้องดู success ใน JSON
+            try:
+                ok = bool(json.loads(content).get('success'))
+            except ValueError:
+                ok = False
+        self.stats.record(label, elapsed, ok)
+        return status, content
+
+    def login(self):
+        self.request('login_page', '/login/')
+        status, _ = self.request('login', '/login/', data={
+            'username': self.email, 'password': self.password,
+            'csrfmiddlewaretoken': self.csrf_token(),
+        })
+        return status == 302
+
+    def wait_for_job(self, job_id):
+        """poll job_status จนงานเสร็จ/ล้มเหลว (USE_BACKGROUND_JOBS) คืนค่า result หรือ None"""
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            _, content = self.request('job_status', f"/api/job-status/{job_id}/")
+            try:
+                data = json.loads(content)
+            except ValueError:
+                data = {}
+            if data.get('status') in ('done', 'failed') or not data.get('success'):
+                # เวลารอทั้งหมดจนได้ข้อสอบ (รวมเวลาในคิวและเวลา AI)
+                self.stats.record('quiz_job', time.perf_counter() - started, data.get('status') == 'done')
+                return data.get('result')
+            time.sleep(JOB_POLL_INTERVAL)
+        self.stats.record('quiz_job', time.perf_counter() - started, False)
+        return None
+
+    def run_flow(self, flow, rng, session_ids):
+        if flow == 'dashboard':
+            self.request('home_page', '/home/')
+        elif flow == 'summary':
+            if session_ids['completed']:
+                self.request('study_summary', f"/summary/{rng.choice(session_ids['completed'])}/")
+            self.request('summary_history', '/my-summaries/')
+        elif flow == 'quiz':
+            if not session_ids['completed']:
+                return
+            session_id = rng.choice(session_ids['completed'])
+            status, content = self.request('get_session_quiz', f"/api/get-quiz/{session_id}/")
+            try:
+                data = json.loads(content)
+            except ValueError:
+                data = {}
+            if data.get('job_id') and not data.get('quiz'):
+                # มี Worker: ได้แค่ job_id กลับมา ต้องรอให้งานเสร็จก่อนถึงจะส่งคำตอบได้
+                data = self.wait_for_job(data['job_id']) or {}
+            quiz = data.get('quiz') or []
+            if quiz:
+                self.request('submit_quiz', '/api/submit-quiz/', json_body={
+                    'session_id': session_id,
+                    'quiz_id': data.get('quiz_id'),
+                    'answers': [rng.randrange(len(q['options'])) for q in quiz],
+                })
+        elif flow == 'schedule':
+            status, content = self.request('study_settings', '/study-settings/')
+            match = re.search(rb'name="csrfmiddlewaretoken" value="([^"]+)"', content)
+            self.request('study_settings_post', '/study-settings/', data={
+                'session_duration': 60, 'break_duration': 10, 'notifications_enabled': 'on',
+                'csrfmiddlewaretoken': match.group(1).decode() if match else self.csrf_token(),
+            })
+        elif flow == 'sync':
+            self.request('sync_calendar', '/sync-calendar/')
+
+
+class Command(BaseCommand):
+    help = (
+        'ทดสอบโหลดผ่าน HTTP: ผู้ใช้จำลองหลายคน (จาก seed_data) เรียกหน้าแรก จัดตาราง สรุป และข้อสอบ '
+        'แล้วรายงาน p50/p95/p99 และ req/s ต่อ Endpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Server ที่รันอยู่แล้ว (ต้องใช้ DB เดียวกัน) ถ้าไม่ระบุจะเปิด Server ในตัวพร้อม AI/Calendar จำลอง')
+        parser.add_argument('--users', type=int, default=10, help='จำนวนผู้ใช้จำลองที่ทำงานพร้อมกัน')
+        parser.add_argument('--duration', type=float, default=30, help='ระยะเวลาทดสอบ (วินาที)')
+        parser.add_argument('--prefix', default='loadtest')
+        parser.add_argument('--password', default='loadtest-pass')
+        parser.add_argument('--ai-latency', type=float, default=0.5, help='เวลาตอบของ AI จำลอง (วินาที)')
+        parser.add_argument('--ai-failure-rate', type=float, default=0.0, help='สัดส่วนที่ AI จำลองตอบผิดพลาด (0-1)')
+        parser.add_argument('--calendar-latency', type=float, default=0.2, help='เวลาต่อ Batch ของ Calendar จำลอง (วินาที)')
+        parser.add_argument('--timeout', type=float, default=60)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        accounts = list(
+            CustomUser.objects.filter(username__startswith=options['prefix'])
+            .order_by('username').values_list('pk', 'email')[:options['users']]
+        )
+        if not accounts:
+            raise CommandError(f"No '{options['prefix']}*' users found. Run: python manage.py seed_data")
+
+        if not options['url'] and not settings.DEBUG:
+            # Production จะ redirect ไป HTTPS และใช้ Secure cookie ซึ่ง Server ในตัวไม่รองรับ
+            raise CommandError('Run with DEBUG=True to use the built-in server, or pass --url')
+
+        with ExitStack() as stack:
+            base_url = options['url']
+            if not base_url:
+                base_url = self.start_server(stack, options)
+            self.stdout.write(f"Target {base_url} with {len(accounts)} users for {options['duration']}s")
+            stats, elapsed = self.run_users(base_url, accounts, options)
+
+        self.report(stats, elapsed)
+
+    def start_server(self, stack, options):
+        """เปิด Server ในตัว (Thread) โดยแทน Gemini และ Google Calendar ด้วยตัวจำลอง"""
+        previous = set_provider(FakeProvider(latency=options['ai_latency'], failure_rate=options['ai_failure_rate']))
+        stack.callback(set_provider, previous)
+        calendar = StubCalendarService(options['calendar_latency'])
+        stack.enter_context(mock.patch('core.google_calendar.get_calendar_service', lambda user: calendar))
+
+        server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietRequestHandler)
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        stack.callback(server.server_close)
+        stack.callback(server.shutdown)
+
+        if settings.USE_BACKGROUND_JOBS:
+            # Worker ในตัว (ใช้ AI จำลองตัวเดียวกัน) ไม่งั้นงานค้างในคิวและการ poll ไม่มีวันจบ
+            stopped = threading.Event()
+            worker = threading.Thread(target=self.run_worker, args=(stopped,), daemon=True)
+            worker.start()
+            stack.callback(worker.join)
+            stack.callback(stopped.set)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def run_worker(self, stopped):
+        while not stopped.is_set():
+            close_old_connections()
+            job = claim_next_job()
+            if job is None:
+                stopped.wait(JOB_POLL_INTERVAL / 4)
+            else:
+                run_job(job)
+        close_old_connections()
+
+    def run_users(self, base_url, accounts, options):
+        stats = Stats()
+        deadline = time.monotonic() + options['duration']
+        flows = list(FLOW_WEIGHTS)
+        weights = [FLOW_WEIGHTS[f] for f in flows]
+
+        def worker(index, user_id, email):
+            rng = random.Random(options['seed'] + index)
+            session_ids = {
+                'completed': [str(pk) for pk in StudySession.objects.filter(
+                    user_id=user_id, is_completed=True).values_list('pk', flat=True)[:50]],
+            }
+            user = VirtualUser(base_url, email, options['password'], stats, options['timeout'])
+            if not user.login():
+                self.stderr.write(f"Login failed for {email}")
+                return
+            while time.monotonic() < deadline:
+                user.run_flow(rng.choices(flows, weights)[0], rng, session_ids)
+
+        started = time.monotonic()
+        threads = [
+            threading.Thread(target=worker, args=(i, user_id, email))
+            for i, (user_id, email) in enumerate(accounts)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return stats, time.monotonic() - started
+
+    def report(self, stats, elapsed):
+        self.stdout.write(
+            f"{'endpoint':<22} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>7}"
+        )
+        total = 0
+        for label in sorted(stats.latencies):
+            values = sorted(stats.latencies[label])
+            if label != 'quiz_job': # เวลารองาน ไม่ใช่ Request
+                total += len(values)
+            self.stdout.write(
+                f"{label:<22} {len(values):>6} {stats.errors.get(label, 0):>6} "
+                f"{percentile(values, 50) * 1000:>8.1f} {percentile(values, 95) * 1000:>8.1f} "
+                f"{percentile(values, 99) * 1000:>8.1f} {len(values) / elapsed:>7.1f}"
+            )
+        self.stdout.write(f"Total {total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
@@ -0,0 +1,35 @@
+# core/management/commands/run_jobs.py
+
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Worker สำหรับรันงาน AI ที่อยู่ในคิว (BackgroundJob)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='รันงานที่ค้างในคิวจนหมดแล้วจบการทำงาน')
+        parser.add_argument('--sleep', type=float, default=1.0, help='เวลารอ (วินาที) เมื่อคิวว่าง')
+
+    def handle(self, *args, **options):
+        self.stdout.write('--- Job worker started ---')
+        processed = 0
+        while True:
+            close_old_connections()
+            requeue_stale_jobs()
+
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            run_job(job)
+            processed += 1
+            self.stdout.write(f"[{job.status}] {job.job_type} {job.job_id}")
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} job(s)'))
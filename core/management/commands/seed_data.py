@@ -0,0 +1,182 @@
+# core/management/commands/seed_data.py
+
+import random
+from datetime import datetime, timedelta
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import (
+    CustomUser, GeneratedQuiz, Notification, Question, QuizResult, StudySession, StudySummary, Subject,
+    UserAvailability, UserSettings,
+)
+from core.progress import rebuild_progress
+from core.quizzes import build_questions, grade, quiz_content_hash
+
+SUBJECT_NAMES = [
+    'คณิตศาสตร์', 'ฟิสิกส์', 'เคมี', 'ชีววิทยา', 'ภาษาอังกฤษ', 'สังคมศึกษา',
+    'Data Structures', 'Database Systems', 'Computer Networks', 'Statistics',
+]
+
+# ช่วงเวลาว่างที่พบบ่อย (ชั่วโมงเริ่ม, ชั่วโมงจบ)
+AVAILABILITY_PATTERNS = [
+    (18, 22), # หลังเลิกเรียน
+    (19, 23),
+    (8, 12),  # ช่วงเช้า
+    (13, 17), # ช่วงบ่าย
+]
+
+SUMMARY_HTML = (
+    "<ul><li><strong>ประเด็นหลัก:</strong> สรุปเนื้อหา {topic}</li>"
+    "<li><strong>ข้อควรจำ:</strong> ทบทวนโจทย์ตัวอย่าง</li></ul><p>สู้ๆ นะ!</p>"
+)
+
+
+def make_quiz(topic, rng):
+    return [
+        {
+            'question': f"{topic} ข้อที่ {i + 1}?",
+            'options': ['ก', 'ข', 'ค', 'ง'],
+            'correct_index': rng.randrange(4),
+        }
+        for i in range(5)
+    ]
+
+
+def seed_user(user, rng, months, now, bank, quiz_sets):
+    """
+    สร้างข้อมูลของผู้ใช้ 1 คน คืนค่า dict รายการที่รอ bulk_create
+    bank / quiz_sets: dict {content_hash: Question / GeneratedQuiz} ใช้ร่วมกันทุกคน (ข้อ/ชุดที่ซ้ำกันเก็บครั้งเดียว)
+    """
+    rows = {'availability': [], 'subjects': [], 'sessions': [], 'summaries': [], 'quizzes': [], 'notifications': []}
+
+    # ตารางเวลาว่าง: วันธรรมดาใช้รูปแบบหนึ่ง เสาร์-อาทิตย์ว่างทั้งบ่าย
+    start_hour, end_hour = rng.choice(AVAILABILITY_PATTERNS)
+    hours_by_day = {}
+    for day in range(7):
+        hours = range(13, 19) if day >= 5 else range(start_hour, end_hour)
+        hours_by_day[day] = list(hours)
+        rows['availability'] += [UserAvailability(user=user, day_of_week=day, hour=h) for h in hours]
+
+    # วิชา 3-6 วิชา สอบภายใน 1-10 สัปดาห์ข้างหน้า (บางวิชาสอบไปแล้ว)
+    subjects = [
+        Subject(
+            user=user, name=name,
+            difficulty=rng.randint(1, 3), importance=rng.randint(1, 3),
+            exam_date=now + timedelta(days=rng.randint(-14, 70)),
+        )
+        for name in rng.sample(SUBJECT_NAMES, rng.randint(3, 6))
+    ]
+    rows['subjects'] = subjects
+
+    # ประวัติ Session ย้อนหลัง N เดือน จนถึงอีก 5 วันข้างหน้า (1-2 Session ต่อวัน)
+    day = (now - timedelta(days=30 * months)).date()
+    counter = {}
+    while day <= (now + timedelta(days=5)).date():
+        hours = hours_by_day[day.weekday()]
+        for hour in rng.sample(hours, min(len(hours), rng.randint(1, 2))):
+            subject = rng.choice(subjects)
+            counter[subject.name] = counter.get(subject.name, 0) + 1
+            start = timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=hour)
+            session = StudySession(
+                user=user, subject=subject,
+                start_time=start, end_time=start + timedelta(minutes=60),
+                topic=f"ทบทวน {subject.name} (ครั้งที่ {counter[subject.name]})",
+                is_completed=start < now and rng.random() < 0.75,
+                is_synced=rng.random() < 0.5,
+            )
+            rows['sessions'].append(session)
+
+            # Session ที่เรียนจบแล้ว บางส่วนมีสรุป/ผลสอบ
+            if session.is_completed and rng.random() < 0.4:
+                rows['summaries'].append(StudySummary(
+                    user=user, session=session, subject=subject,
+                    content=SUMMARY_HTML.format(topic=session.topic),
+                ))
+            if session.is_completed and rng.random() < 0.3:
+                built = build_questions(subject.name, session.topic, make_quiz(session.topic, rng))
+                questions = [bank.setdefault(h, q) for h, q in built.items()]
+                question_ids = [str(q.question_id) for q in questions]
+                content_hash = quiz_content_hash(question_ids)
+                quiz = quiz_sets.setdefault(content_hash, GeneratedQuiz(content_hash=content_hash, question_ids=question_ids))
+                score, answers = grade([q.as_dict() for q in questions], [rng.randrange(4) for _ in questions])
+                rows['quizzes'].append(QuizResult(
+                    user=user, session=session, quiz=quiz, user_answers=answers,
+                    score=score, total_questions=len(questions),
+                ))
+        day += timedelta(days=1)
+
+    rows['notifications'] = [
+        Notification(
+            recipient=user, message=f"แจ้งเตือนทดสอบ #{i + 1}",
+            link='/home/', is_read=rng.random() < 0.7,
+            notification_type=rng.choice(['info', 'success', 'warning']),
+        )
+        for i in range(rng.randint(5, 30))
+    ]
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'สร้างผู้ใช้จำลองพร้อมวิชา เวลาว่าง ประวัติ Session สรุป ผลสอบ และแจ้งเตือน (สำหรับทดสอบโหลด)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--months', type=int, default=3, help='ประวัติ Session ย้อนหลังกี่เดือน')
+        parser.add_argument('--prefix', default='loadtest', help='ชื่อผู้ใช้จะเป็น <prefix><n> อีเมล <prefix><n>@example.com')
+        parser.add_argument('--password', default='loadtest-pass')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true', help='ลบผู้ใช้ที่ขึ้นต้นด้วย prefix เดิมก่อน')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+
+        if options['clear']:
+            deleted, _ = CustomUser.objects.filter(username__startswith=prefix).delete()
+            self.stdout.write(f"Deleted {deleted} existing rows for '{prefix}*'")
+
+        # Hash รหัสผ่านครั้งเดียวแล้วใช้ซ้ำ (PBKDF2 ช้าเกินจะทำทุกคน)
+        password = make_password(options['password'])
+        existing = set(CustomUser.objects.filter(username__startswith=prefix).values_list('username', flat=True))
+        users = [
+            CustomUser(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com", password=password)
+            for i in range(options['users'])
+            if f"{prefix}{i}" not in existing
+        ]
+
+        totals = {}
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(users)
+            UserSettings.objects.bulk_create([UserSettings(user=u) for u in users])
+
+            batches = {}
+            bank = {q.content_hash: q for q in Question.objects.all()}
+            quiz_sets = {q.content_hash: q for q in GeneratedQuiz.objects.only('quiz_id', 'content_hash')}
+            existing_bank, existing_quiz_sets = set(bank), set(quiz_sets)
+            for user in users:
+                for key, rows in seed_user(user, rng, options['months'], now, bank, quiz_sets).items():
+                    batches.setdefault(key, []).extend(rows)
+            batches['questions'] = [q for h, q in bank.items() if h not in existing_bank]
+            batches['quiz_sets'] = [q for h, q in quiz_sets.items() if h not in existing_quiz_sets]
+
+            # ลำดับสำคัญ: วิชา -> Session -> สรุป -> คลังข้อสอบ -> ชุดข้อสอบ -> ผลสอบ (FK)
+            models = [
+                ('availability', UserAvailability), ('subjects', Subject), ('sessions', StudySession),
+                ('summaries', StudySummary), ('questions', Question), ('quiz_sets', GeneratedQuiz),
+                ('quizzes', QuizResult), ('notifications', Notification),
+            ]
+            for key, model in models:
+                model.objects.bulk_create(batches.get(key, []), batch_size=2000)
+                totals[key] = len(batches.get(key, []))
+
+            # สรุปความก้าวหน้าคำนวณจาก Session ที่เพิ่งสร้าง (bulk_create ไม่ผ่าน update_progress)
+            totals['progress rows'] = sum(rebuild_progress(user) for user in users)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(users)} users ({len(existing)} already existed): "
+            + ', '.join(f"{count} {key}" for key, count in totals.items())
+        ))
+        self.stdout.write(f"Login with {prefix}<n>@example.com / {options['password']}")
@@ -0,0 +1,215 @@
+# core/materials.py
+
+import html
+import io
+import math
+import os
+import re
+import zipfile
+from collections import Counter
+from django.db import transaction
+
+from .models import File, FileChunk, SubjectIndex
+
+CHUNK_CHARS = 1200      # ความยาวโดยประมาณของ 1 Chunk (ตัวอักษร)
+CONTEXT_CHUNKS = 3      # จำนวน Chunk สูงสุดที่ใส่ใน prompt
+CONTEXT_CHARS = 3000    # ความยาวรวมสูงสุดของเนื้อหาที่ใส่ใน prompt (คุมจำนวน Token/เวลาตอบ)
+BM25_K1, BM25_B = 1.5, 0.75
+# ขนาด XML หลังแตก Zip สูงสุดที่ยอมอ่านจาก .docx/.pptx (รวมทุกสไลด์) กันไฟล์ Zip bomb
+# ไฟล์ 10MB บีบอัดได้หลายร้อยเท่า ถ้า read() ตรงๆ จะกิน Memory ของ Worker หมด
+MAX_XML_BYTES = 50 * 1024 * 1024
+
+# ภาษาไทยไม่เว้นวรรคระหว่างคำ จึงตัดเป็นคู่ตัวอักษร (Bigram) ส่วนภาษาอังกฤษ/ตัวเลขใช้ทั้งคำ
+_THAI_RUN = re.compile(r'[\u0e00-\u0e7f]+')
+_WORD = re.compile(r'[a-z0-9]{2,}')
+_DOCX_PARAGRAPH = re.compile(r'</w:p>')
+_DOCX_TEXT = re.compile(r'<w:t(?:\s[^>]*)?>(.*?)</w:t>', re.DOTALL)
+_PPTX_PARAGRAPH = re.compile(r'</a:p>')
+_PPTX_TEXT = re.compile(r'<a:t(?:\s[^>]*)?>(.*?)</a:t>', re.DOTALL)
+_SLIDE_NUMBER = re.compile(r'ppt/slides/slide(\d+)\.xml$')
+
+
+def tokenize(text):
+    text = text.lower()
+    terms = _WORD.findall(text)
+    for run in _THAI_RUN.findall(text):
+        terms += [run[i:i + 2] for i in range(len(run) - 1)] if len(run) > 1 else [run]
+    return terms
+
+
+# --- ดึงข้อความจากไฟล์ ---
+
+def _xml_paragraphs(xml, paragraph_re, text_re):
+    return [
+        html.unescape(''.join(text_re.findall(part)))
+        for part in paragraph_re.split(xml)
+    ]
+
+
+def _extract_txt(data):
+    for encoding in ('utf-8-sig', 'cp874'): # cp874 = ภาษาไทยบน Windows
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='replace')
+
+
+def _check_xml_size(members):
+    """
+    ตรวจขนาดหลังแตกไฟล์ (ZipInfo.file_size) ก่อน read() เกิน MAX_XML_BYTES = ValueError (ข้ามไฟล์นี้)
+    zipfile อ่านไม่เกิน file_size ที่ระบุไว้ Header ปลอมขนาดก็อ่านได้ไม่เกินนี้
+    """
+    total = sum(info.file_size for info in members)
+    if total > MAX_XML_BYTES:
+        raise ValueError(f"XML ในไฟล์มีขนาด {total} bytes เกิน {MAX_XML_BYTES} bytes")
+
+
+def _extract_docx(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        info = archive.getinfo('word/document.xml')
+        _check_xml_size([info])
+        xml = archive.read(info).decode('utf-8')
+    return '\n'.join(_xml_paragraphs(xml, _DOCX_PARAGRAPH, _DOCX_TEXT))
+
+
+def _extract_pptx(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        slides = sorted(
+            (int(match.group(1)), name)
+            for name in archive.namelist() if (match := _SLIDE_NUMBER.match(name))
+        )
+        _check_xml_size([archive.getinfo(name) for _, name in slides])
+        return '\n\n'.join(
+            '\n'.join(_xml_paragraphs(archive.read(name).decode('utf-8'), _PPTX_PARAGRAPH, _PPTX_TEXT))
+            for _, name in slides
+        )
+
+
+def _extract_pdf(data):
+    try:
+        from pypdf import PdfReader # import เมื่อมีไฟล์ PDF จริงเท่านั้น (ไม่ติดตั้งก็ยังใช้ไฟล์ชนิดอื่นได้)
+    except ImportError:
+        print("Warning: ไม่ได้ติดตั้ง pypdf ข้ามการอ่านไฟล์ PDF")
+        return ''
+    reader = PdfReader(io.BytesIO(data))
+    return '\n\n'.join(page.extract_text() or '' for page in reader.pages)
+
+
+EXTRACTORS = {
+    '.txt': _extract_txt,
+    '.docx': _extract_docx,
+    '.pptx': _extract_pptx,
+    '.pdf': _extract_pdf,
+}
+
+
+def extract_text(file_obj):
+    """อ่านข้อความทั้งหมดจากไฟล์ที่อัปโหลด (ชนิดที่ไม่รองรับหรืออ่านไม่ได้ คืนค่า '')"""
+    extractor = EXTRACTORS.get(os.path.splitext(file_obj.file_name)[1].lower())
+    if extractor is None:
+        return ''
+    try:
+        with file_obj.file.open('rb') as f:
+            return extractor(f.read())
+    except Exception as e:
+        print(f"Error extracting text from {file_obj.file_name}: {e}")
+        return ''
+
+
+def split_chunks(text, size=CHUNK_CHARS):
+    """แบ่งข้อความเป็นช่วงละประมาณ size ตัวอักษร โดยตัดที่ย่อหน้าก่อน (ย่อหน้าที่ยาวเกินค่อยตัดกลางย่อหน้า)"""
+    chunks, current = [], ''
+    for paragraph in re.split(r'\n\s*\n|\n', text):
+        paragraph = ' '.join(paragraph.split())
+        if not paragraph:
+            continue
+        while len(paragraph) > size:
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(paragraph[:size])
+            paragraph = paragraph[size:]
+        if current and len(current) + len(paragraph) + 1 > size:
+            chunks.append(current)
+            current = ''
+        current = f"{current}\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# --- Index ---
+
+def rebuild_subject_index(subject_id):
+    """สร้าง Inverted Index ของวิชาใหม่จาก Chunk ที่มีอยู่ (ไม่ต้องอ่านไฟล์ซ้ำ)"""
+    chunk_ids, lengths, postings = [], [], {}
+    for chunk_id, text in FileChunk.objects.filter(subject_id=subject_id).values_list('chunk_id', 'text'):
+        terms = Counter(tokenize(text))
+        position = len(chunk_ids)
+        chunk_ids.append(str(chunk_id))
+        lengths.append(sum(terms.values()))
+        for term, count in terms.items():
+            postings.setdefault(term, []).append([position, count])
+
+    SubjectIndex.objects.update_or_create(
+        subject_id=subject_id,
+        defaults={'chunk_ids': chunk_ids, 'lengths': lengths, 'postings': postings},
+    )
+    return len(chunk_ids)
+
+
+def index_subject_materials(subject_id):
+    """ดึงข้อความจากไฟล์ของวิชาที่ยังไม่เคยอ่าน แบ่ง Chunk แล้วสร้าง Index ของวิชาใหม่"""
+    files = list(File.objects.filter(subject_id=subject_id, is_indexed=False))
+    for file_obj in files:
+        chunks = [
+            FileChunk(file=file_obj, subject_id=subject_id, position=i, text=text)
+            for i, text in enumerate(split_chunks(extract_text(file_obj)))
+        ]
+        with transaction.atomic():
+            FileChunk.objects.filter(file=file_obj).delete()
+            FileChunk.objects.bulk_create(chunks)
+            File.objects.filter(pk=file_obj.pk).update(is_indexed=True)
+    return {'files': len(files), 'chunks': rebuild_subject_index(subject_id)}
+
+
+# --- ค้นหา ---
+
+def search_chunks(subject_id, query, limit=CONTEXT_CHUNKS):
+    """หา Chunk ที่เกี่ยวกับ query มากที่สุด (BM25) คืนค่า List ของ chunk_id เรียงจากคะแนนสูงสุด"""
+    index = SubjectIndex.objects.filter(subject_id=subject_id).first()
+    if index is None or not index.chunk_ids:
+        return []
+
+    total = len(index.chunk_ids)
+    avg_length = (sum(index.lengths) / total) or 1
+    scores = {}
+    for term in set(tokenize(query)):
+        postings = index.postings.get(term)
+        if not postings:
+            continue
+        idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+        for position, count in postings:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * index.lengths[position] / avg_length)
+            scores[position] = scores.get(position, 0) + idf * count * (BM25_K1 + 1) / (count + norm)
+
+    best = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [index.chunk_ids[position] for position in best]
+
+
+def material_context(subject_id, query, limit=CONTEXT_CHUNKS, max_chars=CONTEXT_CHARS):
+    """เนื้อหาจากไฟล์ของผู้ใช้ที่เกี่ยวกับ query (ไม่เกิน max_chars) สำหรับใส่ใน prompt คืนค่า List ของข้อความ"""
+    # ไฟล์ที่ยังไม่ถูกอ่าน (งาน index_materials ยังไม่รัน/หายไป) อ่านตอนใช้งานครั้งแรก
+    if File.objects.filter(subject_id=subject_id, is_indexed=False).exists():
+        index_subject_materials(subject_id)
+    chunk_ids = search_chunks(subject_id, query, limit)
+    texts = {str(pk): chunk.text for pk, chunk in FileChunk.objects.in_bulk(chunk_ids).items()}
+    context, used = [], 0
+    for chunk_id in chunk_ids:
+        text = texts.get(chunk_id, '')
+        if not text or used + len(text) > max_chars:
+            continue
+        context.append(text)
+        used += len(text)
+    return context
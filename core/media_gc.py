@@ -0,0 +1,117 @@
+# core/media_gc.py
+
+import datetime
+import os
+from collections import namedtuple
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .models import Blob, CustomUser, File, Subject, UploadSession
+
+# โฟลเดอร์ใน Storage ที่ไฟล์ทุกไฟล์ต้องมีแถวใน DB อ้างถึง
+MEDIA_DIRS = ('subject_materials/', 'subject_files/', 'profile_pics/', 'uploads/')
+# ไฟล์ที่ใหม่กว่านี้ไม่นับเป็นขยะ (อาจกำลังอัปโหลดอยู่ แถวใน DB ยังไม่ Commit)
+GRACE_PERIOD = datetime.timedelta(hours=1)
+CLOUDINARY_PAGE_SIZE = 500      # สูงสุดต่อการเรียก resources() 1 ครั้ง
+CLOUDINARY_DELETE_BATCH = 100   # สูงสุดต่อการเรียก delete_resources() 1 ครั้ง
+
+MediaEntry = namedtuple('MediaEntry', ['name', 'size', 'modified', 'resource_type'])
+
+
+def referenced_names():
+    """ชื่อไฟล์ทั้งหมดที่ DB อ้างถึง (อ่านทีละคอลัมน์ ไม่โหลด Object) รวมส่วนของการอัปโหลดที่ยังค้างอยู่"""
+    names = set()
+    for queryset in (
+        File.objects.values_list('file', flat=True),
+        Blob.objects.values_list('file', flat=True),
+        Subject.objects.exclude(file='').values_list('file', flat=True),
+        CustomUser.objects.exclude(profile_picture='').values_list('profile_picture', flat=True),
+    ):
+        names.update(name for name in queryset.iterator(chunk_size=2000) if name)
+    for mapping in (
+        CustomUser.objects.exclude(profile_thumbnails={}).values_list('profile_thumbnails', flat=True),
+        UploadSession.objects.values_list('parts', flat=True),
+    ):
+        for names_by_key in mapping.iterator(chunk_size=2000):
+            names.update(names_by_key.values())
+    return names
+
+
+def _is_cloudinary(storage):
+    # ใช้ __class__ ไม่ใช่ type(): default_storage เป็น LazyObject ที่ห่อ Storage จริงไว้
+    return storage.__class__.__module__.startswith('cloudinary_storage')
+
+
+def _list_local(storage, directory):
+    root = storage.path(directory)
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            stat = os.stat(path)
+            name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+            modified = datetime.datetime.fromtimestamp(stat.st_mtime, tz=datetime.timezone.utc)
+            yield MediaEntry(name, stat.st_size, modified, None)
+
+
+def _list_cloudinary(storage, directory):
+    import cloudinary.api # import เมื่อใช้ Cloudinary จริงเท่านั้น
+
+    prefix = storage._prepend_prefix(directory)
+    for resource_type in ('image', 'raw', 'video'):
+        next_cursor = None
+        while True:
+            options = {'type': 'upload', 'prefix': prefix, 'resource_type': resource_type,
+                       'max_results': CLOUDINARY_PAGE_SIZE, 'tags': True}
+            if next_cursor:
+                options['next_cursor'] = next_cursor
+            response = cloudinary.api.resources(**options)
+            for resource in response['resources']:
+                # ข้ามไฟล์ที่ไม่ได้อัปโหลดผ่าน Storage ของเว็บนี้ (เช่น Static หรือไฟล์ที่อัปโหลดเองใน Console)
+                if storage.TAG not in resource.get('tags', []):
+                    continue
+                modified = datetime.datetime.fromisoformat(resource['created_at'].replace('Z', '+00:00'))
+                yield MediaEntry(resource['public_id'], resource['bytes'], modified, resource_type)
+            next_cursor = response.get('next_cursor')
+            if not next_cursor:
+                break
+
+
+def list_media(storage=default_storage, directories=MEDIA_DIRS):
+    """ไล่ทุกไฟล์ใน Storage ใต้ directories (Cloudinary ดึงทีละ 500 ไฟล์พร้อมขนาด ไม่ต้องถามทีละไฟล์)"""
+    lister = _list_cloudinary if _is_cloudinary(storage) else _list_local
+    for directory in directories:
+        yield from lister(storage, directory)
+
+
+def find_orphans(storage=default_storage, directories=MEDIA_DIRS, grace=GRACE_PERIOD):
+    """ไฟล์ใน Storage ที่ไม่มีแถวใดใน DB อ้างถึง คืนค่า List ของ MediaEntry"""
+    names = referenced_names()
+    cutoff = timezone.now() - grace
+    return [
+        entry for entry in list_media(storage, directories)
+        if entry.name not in names and entry.modified < cutoff
+    ]
+
+
+def delete_orphans(orphans, storage=default_storage):
+    """ลบไฟล์ขยะออกจาก Storage (Cloudinary ลบทีละ 100 ไฟล์ต่อการเรียก) คืนค่าจำนวนที่ลบ"""
+    if not _is_cloudinary(storage):
+        for entry in orphans:
+            storage.delete(entry.name)
+        # โฟลเดอร์ของการอัปโหลดที่ถูกลบไปแล้วจะว่าง ลบทิ้งด้วย
+        for dirpath, dirnames, filenames in os.walk(storage.path('uploads/'), topdown=False):
+            if not dirnames and not filenames and dirpath != storage.path('uploads/'):
+                os.rmdir(dirpath)
+        return len(orphans)
+
+    import cloudinary.api
+
+    by_type = {}
+    for entry in orphans:
+        by_type.setdefault(entry.resource_type, []).append(entry.name)
+    for resource_type, public_ids in by_type.items():
+        for start in range(0, len(public_ids), CLOUDINARY_DELETE_BATCH):
+            cloudinary.api.delete_resources(
+                public_ids[start:start + CLOUDINARY_DELETE_BATCH], resource_type=resource_type, invalidate=True,
+            )
+    return len(orphans)
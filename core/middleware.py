@@ -0,0 +1,34 @@
+# core/middleware.py
+
+from django.conf import settings
+
+from .query_inspector import QueryRecorder
+
+
+class QueryCountMiddleware:
+    """
+    นับจำนวน Query ต่อ Request (เปิดด้วย QUERY_INSPECTOR, ค่าเริ่มต้นตาม DEBUG)
+    - ใส่ Header X-Query-Count ให้ดูได้จาก DevTools
+    - แจ้งเตือนใน Console เมื่อเกิน Budget ของ View หรือพบ Query ซ้ำแบบ N+1
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_INSPECTOR', settings.DEBUG)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        response['X-Query-Count'] = str(recorder.count)
+        if recorder.job_queries:
+            response['X-Job-Query-Count'] = str(len(recorder.job_queries))
+        match = request.resolver_match
+        # ตรวจเฉพาะ View ของแอป core (ไม่รวม admin/static)
+        if match and match.url_name and match.func.__module__.startswith('core.'):
+            for problem in recorder.report(match.url_name):
+                print(f"[QueryInspector] {request.method} {request.path}: {problem}")
+        return response
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersettings',
+            name='fresh_quizzes',
+            field=models.BooleanField(default=False, verbose_name='ออกข้อสอบใหม่ทุกครั้ง'),
+        ),
+        migrations.CreateModel(
+            name='AICacheEntry',
+            fields=[
+                ('cache_key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('model_name', models.CharField(max_length=100)),
+                ('value', models.JSONField()),
+                ('hit_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'ai_cache_entries',
+                'indexes': [models.Index(fields=['last_used_at'], name='ai_cache_en_last_us_f1ca20_idx'), models.Index(fields=['expires_at'], name='ai_cache_en_expires_a96390_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_aicacheentry_usersettings_fresh_quizzes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIGenerationLock',
+            fields=[
+                ('lock_key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'ai_generation_locks',
+            },
+        ),
+    ]
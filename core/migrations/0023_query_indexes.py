@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_aigenerationlock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', '-created_at'], name='notif_recipient_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['recipient'], name='notif_recipient_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizresult',
+            index=models.Index(fields=['user', '-created_at'], name='quizresult_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(fields=['user', 'start_time'], name='session_user_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(condition=models.Q(('is_completed', False)), fields=['user', 'start_time'], name='session_user_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(condition=models.Q(('is_synced', False)), fields=['user'], name='session_user_unsynced_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studysummary',
+            index=models.Index(fields=['user', '-created_at'], name='summary_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subject',
+            index=models.Index(fields=['user', 'exam_date'], name='subject_user_exam_idx'),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:10
+
+import hashlib
+import json
+import uuid
+from django.db import migrations, models
+
+
+def _hash(value):
+    canonical = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _key(text):
+    return ' '.join((text or '').split()).lower()[:255]
+
+
+def move_quizzes_to_bank(apps, schema_editor):
+    """ย้ายโจทย์ของชุดข้อสอบเดิมเข้าคลัง แล้วให้ชุดข้อสอบเก็บแค่ question_ids"""
+    GeneratedQuiz = apps.get_model('core', 'GeneratedQuiz')
+    Question = apps.get_model('core', 'Question')
+    QuizResult = apps.get_model('core', 'QuizResult')
+
+    for quiz in GeneratedQuiz.objects.all():
+        # ชุดเดิมไม่ได้เก็บวิชา/หัวข้อไว้ ใช้ของ Session ที่เคยสอบชุดนี้ (ถ้ามี)
+        result = QuizResult.objects.filter(quiz=quiz).select_related('session__subject').first()
+        subject_key = _key(result.session.subject.name) if result else ''
+        topic_key = _key(result.session.topic) if result else ''
+
+        question_ids = []
+        for q in quiz.questions:
+            content_hash = _hash({
+                'question': ' '.join(q['question'].split()),
+                'options': q['options'],
+                'correct_index': int(q['correct_index']),
+            })
+            question, _ = Question.objects.get_or_create(content_hash=content_hash, defaults={
+                'subject_key': subject_key, 'topic_key': topic_key,
+                'question': q['question'], 'options': q['options'], 'correct_index': int(q['correct_index']),
+            })
+            question_ids.append(str(question.question_id))
+        quiz.question_ids = question_ids
+        quiz.save(update_fields=['question_ids'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_generatedquiz'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Question',
+            fields=[
+                ('question_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('subject_key', models.CharField(max_length=255)),
+                ('topic_key', models.CharField(max_length=255)),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('question', models.TextField()),
+                ('options', models.JSONField()),
+                ('correct_index', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'question_bank',
+                'indexes': [models.Index(fields=['subject_key', 'topic_key'], name='question_bank_key_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='generatedquiz',
+            name='question_ids',
+            field=models.JSONField(null=True),
+        ),
+        migrations.RunPython(move_quizzes_to_bank, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='generatedquiz',
+            name='questions',
+        ),
+        migrations.AlterField(
+            model_name='generatedquiz',
+            name='question_ids',
+            field=models.JSONField(),
+        ),
+        migrations.AlterField(
+            model_name='backgroundjob',
+            name='job_type',
+            field=models.CharField(choices=[('schedule', 'สร้างตารางเรียน'), ('summary', 'สรุปเนื้อหา'), ('quiz', 'ออกข้อสอบ'), ('refill_bank', 'เติมคลังข้อสอบ')], max_length=20),
+        ),
+    ]
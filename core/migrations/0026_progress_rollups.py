@@ -0,0 +1,124 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:11
+
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+COUNTERS = ('sessions_planned', 'sessions_completed', 'time_spent_planned', 'time_spent_actual')
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def backfill_progress(apps, schema_editor):
+    """
+    คำนวณแถวสรุปของผู้ใช้ทุกคนจากประวัติ Session (เหมือน core.progress.rebuild_progress)
+    ไม่งั้นผู้ใช้เก่าจะมีแถวรวมที่นับเฉพาะ Session ที่เปลี่ยนหลัง Deploy
+    """
+    CustomUser = apps.get_model('core', 'CustomUser')
+    ProgressAnalytic = apps.get_model('core', 'ProgressAnalytic')
+    StudySession = apps.get_model('core', 'StudySession')
+    today = timezone.localdate()
+
+    for user_id in CustomUser.objects.values_list('pk', flat=True).iterator():
+        rows = {(None, None): dict.fromkeys(COUNTERS, 0)}
+        sessions = StudySession.objects.filter(user_id=user_id).values_list('subject_id', 'start_time', 'end_time', 'is_completed')
+        for subject_id, start, end, is_completed in sessions.iterator():
+            minutes = int((end - start).total_seconds() // 60)
+            day = timezone.localdate(start)
+            for key in ((subject_id, day), (subject_id, None), (None, day), (None, None)):
+                values = rows.setdefault(key, dict.fromkeys(COUNTERS, 0))
+                values['sessions_planned'] += 1
+                values['time_spent_planned'] += minutes
+                if is_completed:
+                    values['sessions_completed'] += 1
+                    values['time_spent_actual'] += minutes
+
+        streaks = {}
+        for (subject_id, day), values in sorted(rows.items(), key=lambda item: (str(item[0][0]), item[0][1] or datetime.date.min)):
+            if day is None:
+                continue
+            prev_day, prev_streak = streaks.get(subject_id, (None, 0))
+            if not values['sessions_completed']:
+                values['study_streak_count'] = 0
+                continue
+            values['study_streak_count'] = prev_streak + 1 if prev_day == day - ONE_DAY else 1
+            streaks[subject_id] = (day, values['study_streak_count'])
+        for subject_id, (last_day, streak) in streaks.items():
+            rows[(subject_id, None)]['study_streak_count'] = streak if last_day >= today - ONE_DAY else 0
+
+        ProgressAnalytic.objects.filter(user_id=user_id).delete()
+        ProgressAnalytic.objects.bulk_create([
+            ProgressAnalytic(
+                user_id=user_id, subject_id=subject_id, date=day,
+                completion_percentage=values['sessions_completed'] / values['sessions_planned'] * 100 if values['sessions_planned'] else 0.0,
+                **values,
+            )
+            for (subject_id, day), values in rows.items()
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_question_bank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='progressanalytic',
+            name='sessions_completed',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='progressanalytic',
+            name='sessions_planned',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='progressanalytic',
+            name='completion_percentage',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AlterField(
+            model_name='progressanalytic',
+            name='date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='progressanalytic',
+            name='study_streak_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='progressanalytic',
+            name='subject',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.subject'),
+        ),
+        migrations.AlterField(
+            model_name='progressanalytic',
+            name='time_spent_actual',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='progressanalytic',
+            name='time_spent_planned',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='progressanalytic',
+            constraint=models.UniqueConstraint(condition=models.Q(('date__isnull', False), ('subject__isnull', False)), fields=('user', 'subject', 'date'), name='progress_subject_day_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='progressanalytic',
+            constraint=models.UniqueConstraint(condition=models.Q(('date__isnull', True), ('subject__isnull', False)), fields=('user', 'subject'), name='progress_subject_total_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='progressanalytic',
+            constraint=models.UniqueConstraint(condition=models.Q(('date__isnull', False), ('subject__isnull', True)), fields=('user', 'date'), name='progress_user_day_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='progressanalytic',
+            constraint=models.UniqueConstraint(condition=models.Q(('date__isnull', True), ('subject__isnull', True)), fields=('user',), name='progress_user_total_uniq'),
+        ),
+        migrations.RunPython(backfill_progress, migrations.RunPython.noop),
+    ]
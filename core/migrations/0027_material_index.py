@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:14
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_progress_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubjectIndex',
+            fields=[
+                ('subject', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='material_index', serialize=False, to='core.subject')),
+                ('chunk_ids', models.JSONField(default=list)),
+                ('lengths', models.JSONField(default=list)),
+                ('postings', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'subject_indexes',
+            },
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='is_indexed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='backgroundjob',
+            name='job_type',
+            field=models.CharField(choices=[('schedule', 'สร้างตารางเรียน'), ('summary', 'สรุปเนื้อหา'), ('quiz', 'ออกข้อสอบ'), ('refill_bank', 'เติมคลังข้อสอบ'), ('index_materials', 'อ่านไฟล์ประกอบการเรียน')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='FileChunk',
+            fields=[
+                ('chunk_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('position', models.IntegerField()),
+                ('text', models.TextField()),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='core.file')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='material_chunks', to='core.subject')),
+            ],
+            options={
+                'db_table': 'file_chunks',
+                'ordering': ['file', 'position'],
+            },
+        ),
+    ]
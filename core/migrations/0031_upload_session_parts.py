@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_profile_thumbnails'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='uploadsession',
+            name='received',
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='parts',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:20
+
+import re
+from django.db import migrations
+
+_ROUND_SUFFIX = re.compile(r'\s*\(ครั้งที่\s*\d+\)\s*$')
+
+
+def merge_round_topics(apps, schema_editor):
+    """ย้ายข้อสอบในคลังของ "ทบทวน <วิชา> (ครั้งที่ N)" ทุกรอบไปรวมที่คลังของหัวข้อที่ไม่มีตัวนับรอบ"""
+    Question = apps.get_model('core', 'Question')
+    renamed = {}
+    for question_id, topic_key in Question.objects.filter(topic_key__contains='(ครั้งที่').values_list('question_id', 'topic_key'):
+        new_key = ' '.join(_ROUND_SUFFIX.sub('', topic_key).split())
+        if new_key != topic_key:
+            renamed.setdefault(new_key, []).append(question_id)
+    for new_key, question_ids in renamed.items():
+        Question.objects.filter(question_id__in=question_ids).update(topic_key=new_key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_upload_session_parts'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_round_topics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:05
+
+from importlib import import_module
+from django.db import migrations
+
+# ชื่อไฟล์ Migration ขึ้นต้นด้วยตัวเลข import ตรงๆ ไม่ได้
+backfill_progress = import_module('core.migrations.0026_progress_rollups').backfill_progress
+
+
+class Migration(migrations.Migration):
+    """
+    DB ที่รัน 0026 ไปก่อนมีการ Backfill ในไฟล์นั้น อาจมีแถวรวมที่นับเฉพาะส่วนต่าง คำนวณใหม่ทุกคนอีกครั้ง
+    (DB ใหม่รันซ้ำได้ ผลเหมือนเดิม)
+    """
+
+    dependencies = [
+        ('core', '0032_question_topic_key_rounds'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def issue_served_quizzes(apps, schema_editor):
+    """ชุดข้อสอบที่ออกไปแล้วก่อนมีตารางนี้ (ดูจากงาน quiz ที่เสร็จแล้ว) ยังส่งคำตอบได้"""
+    BackgroundJob = apps.get_model('core', 'BackgroundJob')
+    GeneratedQuiz = apps.get_model('core', 'GeneratedQuiz')
+    IssuedQuiz = apps.get_model('core', 'IssuedQuiz')
+    StudySession = apps.get_model('core', 'StudySession')
+
+    served = {
+        (job.user_id, job.payload.get('session_id'), job.result.get('quiz_id'))
+        for job in BackgroundJob.objects.filter(job_type='quiz', status='done').only('user_id', 'payload', 'result')
+        if isinstance(job.payload, dict) and isinstance(job.result, dict)
+    }
+    session_ids = {str(pk) for pk in StudySession.objects.filter(
+        session_id__in=[session_id for _, session_id, _ in served if session_id]
+    ).values_list('pk', flat=True)}
+    quiz_ids = {str(pk) for pk in GeneratedQuiz.objects.filter(
+        quiz_id__in=[quiz_id for _, _, quiz_id in served if quiz_id]
+    ).values_list('pk', flat=True)}
+    IssuedQuiz.objects.bulk_create([
+        IssuedQuiz(user_id=user_id, session_id=session_id, quiz_id=quiz_id)
+        for user_id, session_id, quiz_id in served
+        if session_id in session_ids and quiz_id in quiz_ids
+    ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_backfill_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IssuedQuiz',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('issued_at', models.DateTimeField(auto_now_add=True)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='issues', to='core.generatedquiz')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='issued_quizzes', to='core.studysession')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'issued_quizzes',
+                'constraints': [models.UniqueConstraint(fields=('user', 'session', 'quiz'), name='issued_quiz_uniq')],
+            },
+        ),
+        migrations.RunPython(issue_served_quizzes, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,9 @@
 # core/models.py
 
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import AbstractUser
+from django.utils.functional import cached_property
 import uuid
 
 # ตารางผู้ใช้ (Users)
@@ -9,6 +11,8 @@ class CustomUser(AbstractUser):
     email = models.EmailField(unique=True) # เพิ่มบรรทัดนี้
     # ✅ เพิ่ม: รูปโปรไฟล์ (เก็บไฟล์จริง)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    # รูปย่อของรูปโปรไฟล์ {ขนาด(px): ชื่อไฟล์} สร้างตอนอัปโหลด (ดู core/thumbnails.py)
+    profile_thumbnails = models.JSONField(default=dict, blank=True)
     class Meta:
         db_table = 'users'
 
@@ -21,6 +25,8 @@ class UserSettings(models.Model):
     # ✅ เพิ่ม: ข้อมูลโปรไฟล์เพิ่มเติม
     bio = models.CharField(max_length=255, blank=True, null=True, verbose_name="คติประจำใจ")
     academic_goal = models.CharField(max_length=255, blank=True, null=True, verbose_name="เป้าหมายการเรียน (เช่น GPA 4.00)")
+    # ✅ เพิ่ม: ไม่ใช้ข้อสอบที่เคยสร้างไว้ (Cache) ให้ AI ออกข้อสอบใหม่ทุกครั้ง
+    fresh_quizzes = models.BooleanField(default=False, verbose_name="ออกข้อสอบใหม่ทุกครั้ง")
 
     def __str__(self):
         return f"Settings for {self.user.username}"
@@ -52,17 +58,33 @@ class Subject(models.Model):
 
     class Meta:
         db_table = 'subjects'
+        indexes = [
+            models.Index(fields=['user', 'exam_date'], name='subject_user_exam_idx'), # วันสอบที่ใกล้เข้ามา
+        ]
 
     def __str__(self):
         return self.name
 
+# ตารางไฟล์จริงแบบไม่ซ้ำ (Blobs) เนื้อหาเดียวกันเก็บใน Storage ครั้งเดียว หลาย File ใช้ร่วมกันได้
+class Blob(models.Model):
+    content_hash = models.CharField(max_length=64, primary_key=True) # sha256 ของเนื้อหาไฟล์
+    file = models.FileField(upload_to='subject_materials/')
+    size_in_bytes = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0) # จำนวน File ที่ใช้ Blob นี้อยู่ (เหลือ 0 = ลบออกจาก Storage ได้)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'blobs'
+
 # ตารางไฟล์ (Files)
 class File(models.Model):
     file_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     subject = models.ForeignKey('Subject', on_delete=models.CASCADE, related_name='subject_files')
     
     # เปลี่ยนจาก URLField เป็น FileField เพื่อเก็บไฟล์จริง
+    # (ไฟล์ที่มี blob ชี้ไปที่ไฟล์เดียวกับ blob.file ไฟล์เก่าก่อนมี Blob ยังเป็นของตัวเอง)
     file = models.FileField(upload_to='subject_materials/') 
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, related_name='files')
     
     file_name = models.CharField(max_length=255)
     file_type = models.CharField(max_length=255)
@@ -71,11 +93,56 @@ class File(models.Model):
     # เพิ่มลำดับ
     order = models.PositiveIntegerField(default=1) 
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    is_indexed = models.BooleanField(default=False) # ดึงข้อความ + แบ่ง Chunk แล้ว (ทำครั้งเดียวต่อไฟล์)
 
     class Meta:
         db_table = 'files'
         ordering = ['order'] # สั่งให้เรียงตามลำดับเสมอ
 
+# ตารางการอัปโหลดแบบแบ่งส่วน (UploadSessions) ส่วนที่ได้รับแล้วเก็บใน Storage ทันที เน็ตหลุดก็อัปโหลดต่อได้
+class UploadSession(models.Model):
+    upload_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    subject = models.ForeignKey('Subject', on_delete=models.CASCADE, related_name='upload_sessions')
+    file_name = models.CharField(max_length=255)
+    file_type = models.CharField(max_length=255)
+    size_in_bytes = models.BigIntegerField()
+    chunk_size = models.IntegerField()
+    # ส่วนที่ได้รับแล้ว {index: ชื่อไฟล์ใน Storage} (Storage บางตัวเช่น Cloudinary ตั้งชื่อเอง ต้องเก็บชื่อจริงไว้)
+    parts = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'upload_sessions'
+
+    @property
+    def total_chunks(self):
+        return max(1, -(-self.size_in_bytes // self.chunk_size))
+
+# ตารางข้อความจากไฟล์ประกอบการเรียน แบ่งเป็นช่วงๆ (FileChunks) สำหรับใส่ใน prompt เฉพาะส่วนที่เกี่ยวข้อง
+class FileChunk(models.Model):
+    chunk_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='chunks')
+    subject = models.ForeignKey('Subject', on_delete=models.CASCADE, related_name='material_chunks')
+    position = models.IntegerField() # ลำดับของ Chunk ในไฟล์
+    text = models.TextField()
+
+    class Meta:
+        db_table = 'file_chunks'
+        ordering = ['file', 'position']
+
+# ตาราง Inverted Index ของเอกสารทั้งวิชา (คำ -> Chunk ที่มีคำนั้น) เก็บเป็น JSON แถวเดียวต่อวิชา
+class SubjectIndex(models.Model):
+    subject = models.OneToOneField('Subject', on_delete=models.CASCADE, primary_key=True, related_name='material_index')
+    chunk_ids = models.JSONField(default=list) # ตำแหน่งใน List นี้ใช้แทน Chunk ใน postings
+    lengths = models.JSONField(default=list)   # จำนวนคำของแต่ละ Chunk
+    postings = models.JSONField(default=dict)  # {คำ: [[ตำแหน่ง Chunk, จำนวนครั้ง], ...]}
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'subject_indexes'
+
 # ตารางแผนการอ่าน (StudyPlans)
 class StudyPlan(models.Model):
     plan_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -115,19 +182,33 @@ class Quiz(models.Model):
     class Meta:
         db_table = 'quizzes'
 
-# ตารางการวิเคราะห์ความก้าวหน้า (ProgressAnalytics)
+# ตารางการวิเคราะห์ความก้าวหน้า (ProgressAnalytics) สรุปไว้ล่วงหน้า อัปเดตทุกครั้งที่ Session เปลี่ยน
+# 1 ผู้ใช้มีหลายระดับ: subject/date เป็น NULL = รวมทุกวิชา/รวมทุกวัน
+#   (วิชา, วัน) รายวันของวิชา | (วิชา, NULL) รวมของวิชา | (NULL, วัน) รายวันของผู้ใช้ | (NULL, NULL) รวมทั้งหมด
 class ProgressAnalytic(models.Model):
     analytic_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    subject = models.ForeignKey('Subject', on_delete=models.CASCADE)
-    date = models.DateField()
-    time_spent_actual = models.IntegerField()
-    time_spent_planned = models.IntegerField()
-    completion_percentage = models.FloatField()
-    study_streak_count = models.IntegerField()
+    subject = models.ForeignKey('Subject', on_delete=models.CASCADE, null=True, blank=True)
+    date = models.DateField(null=True, blank=True)
+    sessions_planned = models.IntegerField(default=0)
+    sessions_completed = models.IntegerField(default=0)
+    time_spent_actual = models.IntegerField(default=0)  # นาที (Session ที่เรียนจบแล้ว)
+    time_spent_planned = models.IntegerField(default=0) # นาที (ทุก Session ในตาราง)
+    completion_percentage = models.FloatField(default=0.0) # sessions_completed / sessions_planned * 100
+    study_streak_count = models.IntegerField(default=0) # จำนวนวันติดกันที่เรียนจบอย่างน้อย 1 Session
 
     class Meta:
         db_table = 'progress_analytics'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'subject', 'date'], name='progress_subject_day_uniq',
+                                    condition=Q(subject__isnull=False, date__isnull=False)),
+            models.UniqueConstraint(fields=['user', 'subject'], name='progress_subject_total_uniq',
+                                    condition=Q(subject__isnull=False, date__isnull=True)),
+            models.UniqueConstraint(fields=['user', 'date'], name='progress_user_day_uniq',
+                                    condition=Q(subject__isnull=True, date__isnull=False)),
+            models.UniqueConstraint(fields=['user'], name='progress_user_total_uniq',
+                                    condition=Q(subject__isnull=True, date__isnull=True)),
+        ]
 
 # ตารางเก็บเวลาว่างของผู้ใช้
 class UserAvailability(models.Model):
@@ -171,6 +252,13 @@ class StudySession(models.Model):
     class Meta:
         db_table = 'study_sessions'
         ordering = ['start_time']
+        indexes = [
+            # ตารางรายสัปดาห์/วันนี้ (ค้นหาเป็นช่วงเวลา start_time)
+            models.Index(fields=['user', 'start_time'], name='session_user_start_idx'),
+            # Session ที่ยังไม่เสร็จ (สถิติ/จัดตารางใหม่) และที่ยังไม่ซิงค์ขึ้น Google
+            models.Index(fields=['user', 'start_time'], condition=Q(is_completed=False), name='session_user_pending_idx'),
+            models.Index(fields=['user'], condition=Q(is_synced=False), name='session_user_unsynced_idx'),
+        ]
 
     def __str__(self):
         return f"{self.subject.name} ({self.start_time})"
@@ -190,18 +278,83 @@ class StudySummary(models.Model):
     class Meta:
         db_table = 'study_summaries'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='summary_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"Summary: {self.subject.name} - {self.created_at}"
 
+# ตารางคลังข้อสอบ (QuestionBank) แยกตามวิชา/หัวข้อ ข้อเดียวกันเก็บครั้งเดียว
+class Question(models.Model):
+    question_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # กุญแจของคลัง: ชื่อวิชา/หัวข้อที่ปรับเป็นตัวเล็กและตัดช่องว่างซ้ำแล้ว (ผู้ใช้ต่างคนใช้คลังเดียวกัน)
+    subject_key = models.CharField(max_length=255)
+    topic_key = models.CharField(max_length=255)
+    content_hash = models.CharField(max_length=64, unique=True) # sha256 ของโจทย์ + ตัวเลือก + เฉลย
+    question = models.TextField()
+    options = models.JSONField()
+    correct_index = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'question_bank'
+        indexes = [
+            models.Index(fields=['subject_key', 'topic_key'], name='question_bank_key_idx'),
+        ]
+
+    def as_dict(self):
+        return {'question': self.question, 'options': self.options, 'correct_index': self.correct_index}
+
+    def __str__(self):
+        return f"{self.subject_key} / {self.topic_key}: {self.question[:50]}"
+
+# ชุดข้อสอบที่ออกให้ผู้ใช้ (เก็บแค่ ID ของข้อในคลังตามลำดับ)
+class GeneratedQuiz(models.Model):
+    quiz_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    content_hash = models.CharField(max_length=64, unique=True) # sha256 ของลำดับ question_ids
+    question_ids = models.JSONField() # List ของ Question.question_id (str)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'generated_quizzes'
+
+    @cached_property
+    def questions(self):
+        """โจทย์ + ตัวเลือก + เฉลย ตามลำดับในชุด (ไม่ส่งเฉลยให้หน้าเว็บ)"""
+        by_id = {str(q.question_id): q for q in Question.objects.filter(question_id__in=self.question_ids)}
+        return [by_id[qid].as_dict() for qid in self.question_ids if qid in by_id]
+
+    def __str__(self):
+        return f"Quiz {self.content_hash[:12]} ({len(self.question_ids)} questions)"
+
+# ชุดข้อสอบที่ออกให้ Session ของผู้ใช้ (IssuedQuizzes) GeneratedQuiz ใช้ร่วมกันทุกคนไม่มีเจ้าของ
+# ตอนส่งคำตอบตรวจกับตารางนี้ว่าชุดนั้นเคยออกให้ผู้ใช้/Session นี้จริง
+class IssuedQuiz(models.Model):
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    session = models.ForeignKey(StudySession, on_delete=models.CASCADE, related_name='issued_quizzes')
+    quiz = models.ForeignKey(GeneratedQuiz, on_delete=models.CASCADE, related_name='issues')
+    issued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'issued_quizzes'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'session', 'quiz'], name='issued_quiz_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.quiz_id} ({self.session_id})"
+
 # ตารางผลลัพธ์แบบทดสอบ (QuizResults)
 class QuizResult(models.Model):
     result_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     session = models.ForeignKey(StudySession, on_delete=models.CASCADE)
+    # ชุดข้อสอบที่ใช้ (ผลสอบเก่าก่อนมีตารางนี้ยังเก็บโจทย์ไว้ใน questions_data)
+    quiz = models.ForeignKey(GeneratedQuiz, on_delete=models.PROTECT, null=True, blank=True, related_name='results')
     
     # เก็บข้อมูลโจทย์และคำตอบเป็น JSON (เพราะโจทย์เปลี่ยนไปเรื่อยๆ ตาม AI)
-    questions_data = models.JSONField()  # โจทย์ + ตัวเลือก + เฉลย
+    questions_data = models.JSONField(null=True, blank=True)  # โจทย์ + ตัวเลือก + เฉลย (เฉพาะผลสอบเก่า)
     user_answers = models.JSONField()    # คำตอบที่ผู้ใช้เลือก (List of indices)
     
     score = models.IntegerField()
@@ -211,6 +364,13 @@ class QuizResult(models.Model):
     class Meta:
         db_table = 'quiz_results'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='quizresult_user_created_idx'),
+        ]
+
+    @property
+    def questions(self):
+        return self.quiz.questions if self.quiz_id else self.questions_data
 
 # ตารางการแจ้งเตือน (Notifications)
 class Notification(models.Model):
@@ -231,6 +391,11 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at'] # ใหม่สุดขึ้นก่อน
+        indexes = [
+            # กระดิ่งแจ้งเตือน: 10 อันล่าสุด และจำนวนที่ยังไม่อ่าน
+            models.Index(fields=['recipient', '-created_at'], name='notif_recipient_created_idx'),
+            models.Index(fields=['recipient'], condition=Q(is_read=False), name='notif_recipient_unread_idx'),
+        ]
 
     def __str__(self):
         return f"Notification for {self.recipient.username}: {self.message}"
@@ -255,4 +420,70 @@ class Feedback(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"{self.get_category_display()} by {self.user.username}"
\ No newline at end of file
+        return f"{self.get_category_display()} by {self.user.username}"
+
+# ตารางงานเบื้องหลัง (BackgroundJobs) สำหรับงาน AI ที่ใช้เวลานาน
+class BackgroundJob(models.Model):
+    TYPE_CHOICES = [
+        ('schedule', 'สร้างตารางเรียน'),
+        ('summary', 'สรุปเนื้อหา'),
+        ('quiz', 'ออกข้อสอบ'),
+        ('refill_bank', 'เติมคลังข้อสอบ'),
+        ('index_materials', 'อ่านไฟล์ประกอบการเรียน'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    job_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='jobs')
+    job_type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    payload = models.JSONField(default=dict, blank=True) # ข้อมูลที่ต้องใช้ เช่น session_id
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    result = models.JSONField(null=True, blank=True) # ผลลัพธ์ที่ส่งกลับให้หน้าเว็บ
+    error = models.TextField(blank=True, default='')
+    attempts = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'background_jobs'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_job_type_display()} ({self.status}) for {self.user.username}"
+
+# ตาราง Cache ผลลัพธ์จาก AI (key = hash ของชื่อโมเดล + prompt)
+class AICacheEntry(models.Model):
+    cache_key = models.CharField(max_length=64, primary_key=True) # sha256 hex
+    model_name = models.CharField(max_length=100)
+    value = models.JSONField() # ผลลัพธ์ที่แปลงแล้ว (ข้อความสรุป หรือ List ข้อสอบ)
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True) # ใช้ทำ LRU
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'ai_cache_entries'
+        indexes = [
+            models.Index(fields=['last_used_at']),
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.model_name}:{self.cache_key[:12]} ({self.hit_count} hits)"
+
+# ตารางล็อกงาน AI ที่กำลังสร้าง (กันหลาย Worker เรียก AI ด้วย prompt เดียวกันพร้อมกัน)
+class AIGenerationLock(models.Model):
+    lock_key = models.CharField(max_length=64, primary_key=True) # key เดียวกับ AICacheEntry
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'ai_generation_locks'
@@ -0,0 +1,38 @@
+# core/notifications.py
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Notification
+
+# จำนวนแจ้งเตือนล่าสุดที่แสดงในกระดิ่ง
+RECENT_LIMIT = 10
+NOTIFICATION_CACHE_TTL = 3600
+
+
+def _cache_key(user_id):
+    return f"notification_summary:{user_id}"
+
+
+def compute_notification_summary(user_id):
+    return {
+        'recent': list(Notification.objects.filter(recipient_id=user_id)[:RECENT_LIMIT]),
+        'unread_count': Notification.objects.filter(recipient_id=user_id, is_read=False).count(),
+    }
+
+
+def invalidate_notification_summary(user_id):
+    """
+    ลบสรุปแจ้งเตือนของผู้ใช้ออกจาก Cache กลาง (เรียกเมื่อแจ้งเตือนเปลี่ยน) หน้าถัดไปจะคำนวณใหม่เอง
+    ลบหลัง Commit: ถ้าลบก่อน อีก Process อาจอ่านข้อมูลเก่าจาก DB แล้วเขียนกลับเข้า Cache
+    """
+    transaction.on_commit(lambda: cache.delete(_cache_key(user_id)))
+
+
+def get_notification_summary(user_id):
+    """คืนค่า {'recent': [...], 'unread_count': n} ของผู้ใช้ จาก Cache ถ้ามี"""
+    summary = cache.get(_cache_key(user_id))
+    if summary is None:
+        summary = compute_notification_summary(user_id)
+        cache.set(_cache_key(user_id), summary, NOTIFICATION_CACHE_TTL)
+    return summary
@@ -0,0 +1,163 @@
+# core/progress.py
+
+import datetime
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import CustomUser, ProgressAnalytic, StudySession
+
+# ค่าที่รวมกันได้ (บวก/ลบแบบ Incremental ได้) ส่วน completion_percentage/study_streak_count คำนวณจากค่าเหล่านี้
+COUNTERS = ('sessions_planned', 'sessions_completed', 'time_spent_planned', 'time_spent_actual')
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def session_bucket(session):
+    """(subject_id, วันที่ตามเวลาท้องถิ่น) ที่ Session นี้ถูกนับ"""
+    return (session.subject_id, timezone.localdate(session.start_time))
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _tally(sessions):
+    """รวมค่าของ Session (subject_id, start, end, is_completed) ตาม (subject_id, วัน)"""
+    totals = {}
+    for subject_id, start, end, is_completed in sessions:
+        values = totals.setdefault((subject_id, timezone.localdate(start)), dict.fromkeys(COUNTERS, 0))
+        minutes = int((end - start).total_seconds() // 60)
+        values['sessions_planned'] += 1
+        values['time_spent_planned'] += minutes
+        if is_completed:
+            values['sessions_completed'] += 1
+            values['time_spent_actual'] += minutes
+    return totals
+
+
+def _add(rows, user_id, key, delta):
+    """บวก delta เข้าแถว key=(subject_id, date) (สร้างแถวใหม่ถ้ายังไม่มี)"""
+    row = rows.get(key)
+    if row is None:
+        row = rows[key] = ProgressAnalytic(user_id=user_id, subject_id=key[0], date=key[1])
+    for field in COUNTERS:
+        setattr(row, field, getattr(row, field) + delta[field])
+    row.completion_percentage = row.sessions_completed / row.sessions_planned * 100 if row.sessions_planned else 0.0
+
+
+def _refresh_streaks(rows, since):
+    """
+    คำนวณ study_streak_count ของแถวรายวันตั้งแต่วัน since (ใช้แถวของวันก่อนหน้าเป็นจุดตั้งต้น)
+    แถวรวม (date=NULL) เก็บ streak ปัจจุบัน = streak ของวันล่าสุดที่ได้เรียน ถ้าวันนั้นเป็นวันนี้/เมื่อวาน ไม่งั้น 0
+    rows ต้องมีแถวรายวันล่าสุดที่เรียนจบของแต่ละวิชา (ถ้ามี) ไม่งั้นจะนับว่าไม่เคยเรียน
+    """
+    today = timezone.localdate()
+    for grain in {subject_id for subject_id, _ in rows}:
+        daily = sorted((row for (subject_id, day), row in rows.items() if subject_id == grain and day), key=lambda r: r.date)
+        prev = latest = None
+        for row in daily:
+            if row.date >= since:
+                if not row.sessions_completed:
+                    row.study_streak_count = 0
+                elif prev and prev.sessions_completed and prev.date == row.date - ONE_DAY:
+                    row.study_streak_count = prev.study_streak_count + 1
+                else:
+                    row.study_streak_count = 1
+            if row.sessions_completed:
+                latest = row
+            prev = row
+        if (grain, None) in rows:
+            current = latest is not None and latest.date >= today - ONE_DAY
+            rows[(grain, None)].study_streak_count = latest.study_streak_count if current else 0
+
+
+def update_progress(user_id, buckets):
+    """
+    อัปเดตสรุปความก้าวหน้าแบบ Incremental หลัง Session ในกลุ่ม buckets {(subject_id, วัน)} เปลี่ยน
+    นับ Session ใหม่เฉพาะวันที่เกี่ยวข้อง แล้วนำส่วนต่างไปบวกแถวรวมของวิชา/ของวัน/ของผู้ใช้
+    """
+    buckets = set(buckets)
+    if not buckets:
+        return
+    if not ProgressAnalytic.objects.filter(user_id=user_id, subject=None, date=None).exists():
+        # ยังไม่เคยคำนวณสรุป (ผู้ใช้เก่าที่มี Session อยู่แล้ว) บวกแค่ส่วนต่างจะได้ยอดรวมผิด คำนวณใหม่ทั้งหมดแทน
+        rebuild_progress(user_id)
+        return
+    days = sorted(day for _, day in buckets)
+    fresh = _tally(StudySession.objects.filter(
+        user_id=user_id, start_time__gte=_day_start(days[0]), start_time__lt=_day_start(days[-1] + ONE_DAY)
+    ).values_list('subject_id', 'start_time', 'end_time', 'is_completed'))
+
+    with transaction.atomic():
+        # แถวรวม + แถวรายวันตั้งแต่วันก่อนหน้าวันแรกที่เปลี่ยน (ใช้ต่อ streak)
+        # + วันล่าสุดที่เรียนจบก่อนช่วงนั้นของแต่ละวิชา (ถ้าในช่วงไม่มีวันที่เรียนจบเลย streak ปัจจุบันนับจากวันนั้น)
+        window = Q(date__isnull=True) | Q(date__gte=days[0] - ONE_DAY)
+        for last in ProgressAnalytic.objects.filter(
+            user_id=user_id, date__lt=days[0] - ONE_DAY, sessions_completed__gt=0
+        ).values('subject_id').annotate(last_date=Max('date')):
+            window |= Q(subject_id=last['subject_id'], date=last['last_date'])
+        rows = {
+            (row.subject_id, row.date): row
+            for row in ProgressAnalytic.objects.select_for_update().filter(user_id=user_id).filter(window)
+        }
+        before = {key: tuple(getattr(row, f) for f in COUNTERS) for key, row in rows.items()}
+
+        for subject_id, day in buckets:
+            row = rows.get((subject_id, day))
+            new = fresh.get((subject_id, day), dict.fromkeys(COUNTERS, 0))
+            delta = {field: new[field] - (getattr(row, field) if row else 0) for field in COUNTERS}
+            if any(delta.values()):
+                for key in ((subject_id, day), (subject_id, None), (None, day), (None, None)):
+                    _add(rows, user_id, key, delta)
+
+        streaks_before = {key: row.study_streak_count for key, row in rows.items()}
+        _refresh_streaks(rows, days[0])
+
+        to_create, to_update, to_delete = [], [], []
+        for key, row in rows.items():
+            if key[1] and not row.sessions_planned:
+                # วันที่ไม่มี Session เหลือแล้วไม่ต้องเก็บแถว
+                if not row._state.adding:
+                    to_delete.append(row.pk)
+            elif row._state.adding:
+                to_create.append(row)
+            elif before[key] != tuple(getattr(row, f) for f in COUNTERS) or streaks_before[key] != row.study_streak_count:
+                to_update.append(row)
+
+        ProgressAnalytic.objects.bulk_create(to_create)
+        ProgressAnalytic.objects.bulk_update(to_update, COUNTERS + ('completion_percentage', 'study_streak_count'))
+        if to_delete:
+            ProgressAnalytic.objects.filter(pk__in=to_delete).delete()
+
+
+def rebuild_progress(user):
+    """
+    คำนวณสรุปความก้าวหน้าของผู้ใช้ใหม่ทั้งหมดจากประวัติ Session (ใช้ตอน Backfill หรือหลังลบวิชา)
+    user เป็น CustomUser หรือ user_id ก็ได้
+    """
+    user_id = getattr(user, 'pk', user)
+    with transaction.atomic():
+        # ล็อกแถวผู้ใช้ 2 Request ที่ Rebuild พร้อมกันจะไม่สร้างแถวรวมซ้ำ
+        list(CustomUser.objects.select_for_update().filter(pk=user_id).values_list('pk', flat=True))
+        tally = _tally(StudySession.objects.filter(user_id=user_id).values_list('subject_id', 'start_time', 'end_time', 'is_completed'))
+
+        rows = {}
+        _add(rows, user_id, (None, None), dict.fromkeys(COUNTERS, 0)) # มีแถวรวมเสมอ (แม้ยังไม่มี Session)
+        for (subject_id, day), values in tally.items():
+            for key in ((subject_id, day), (subject_id, None), (None, day), (None, None)):
+                _add(rows, user_id, key, values)
+        _refresh_streaks(rows, datetime.date.min)
+
+        ProgressAnalytic.objects.filter(user_id=user_id).delete()
+        ProgressAnalytic.objects.bulk_create(rows.values())
+    return len(rows)
+
+
+def get_progress(user, subject=None, day=None):
+    """แถวสรุป 1 แถว (subject/day เป็น None = รวมทั้งหมด) ถ้ายังไม่เคยคำนวณจะ Backfill ผู้ใช้คนนี้ก่อน"""
+    lookup = {'user': user, 'subject': subject, 'date': day}
+    row = ProgressAnalytic.objects.filter(**lookup).first()
+    if row is None and not ProgressAnalytic.objects.filter(user=user, subject=None, date=None).exists():
+        rebuild_progress(user)
+        row = ProgressAnalytic.objects.filter(**lookup).first()
+    return row or ProgressAnalytic(**lookup)
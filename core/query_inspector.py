@@ -0,0 +1,185 @@
+# core/query_inspector.py
+
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from django.conf import settings
+from urllib.parse import urlsplit
+from django.db import connections
+from django.urls import resolve
+
+# Query รูปแบบเดียวกันซ้ำตั้งแต่กี่ครั้งขึ้นไป ถือว่าน่าจะเป็น N+1
+N_PLUS_ONE_THRESHOLD = 3
+
+# จำนวน Query สูงสุดต่อ Request ของแต่ละ View (ตามชื่อใน core/urls.py)
+# นับรวม Session + User ของ Django Auth และ Context Processor แจ้งเตือนแล้ว (หน้าแรกนับกรณี Cache แจ้งเตือนว่าง)
+# ไม่นับคำสั่งควบคุม Transaction และงานเบื้องหลังที่รันทันทีใน Request ตอนไม่ได้เปิด Worker (ดู inline_job) เพื่อให้ตัวเลขเท่ากันทั้ง 2 โหมด
+QUERY_BUDGETS = {
+    'landing_page': 3,
+    'register': 8,
+    'login': 6,
+    'google_login_start': 2,
+    'google_login_callback': 10,
+    'home_page': 17,
+    'add_subject': 12,
+    'delete_subject': 26,
+    'delete_file': 10,
+    'reorder_files': 8,
+    'start_upload': 8,
+    'upload_status': 6,
+    'upload_chunk': 8,
+    'complete_upload': 16,
+    'set_schedule': 14,
+    'study_settings': 14,
+    'toggle_session_complete': 10,
+    'start_studying': 5,
+    'finished_studying': 5,
+    'complete_session': 10,
+    'edit_profile': 10,
+    'get_session_summary': 14,
+    'study_summary': 14,
+    'summary_history': 4,
+    'get_session_quiz': 16,
+    'submit_quiz': 8,
+    'quiz_result': 4,
+    'quiz_solution': 4,
+    'job_status': 4,
+    'logout': 4,
+    'google_auth_start': 2,
+    'google_auth_callback': 8,
+    'sync_calendar': 10,
+    'mark_notification_read': 8,
+    'submit_feedback': 6,
+}
+
+_WHITESPACE_RE = re.compile(r'\s+')
+# คำสั่งควบคุม Transaction ซ้ำได้ตามธรรมชาติ (atomic() ทุกครั้ง) ไม่ใช่ N+1
+_TRANSACTION_RE = re.compile(r'^\s*(?:BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|START TRANSACTION)\b', re.IGNORECASE)
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def normalize_sql(sql):
+    """
+    ตัดค่าที่เปลี่ยนทุกแถว (ตัวเลข/สตริง/ความยาว IN list) ออก เหลือแต่ "รูปแบบ" ของ Query
+    คำสั่งควบคุม Transaction คืนค่า None (ไม่ใช้ตรวจ N+1)
+    """
+    if _TRANSACTION_RE.match(sql):
+        return None
+    sql = _LITERAL_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def get_budget(url_name):
+    """Budget ของ View (แก้ทับได้ด้วย settings.QUERY_BUDGETS)"""
+    overrides = getattr(settings, 'QUERY_BUDGETS', {})
+    return overrides.get(url_name, QUERY_BUDGETS.get(url_name))
+
+
+def core_url_names():
+    """ชื่อ URL ทั้งหมดของแอป core"""
+    from core import urls
+    return [p.name for p in urls.urlpatterns if p.name]
+
+
+def missing_budgets():
+    """ชื่อ URL ใน core/urls.py ที่ยังไม่ได้กำหนด Budget"""
+    return [name for name in core_url_names() if get_budget(name) is None]
+
+
+_state = threading.local()
+
+
+@contextmanager
+def inline_job():
+    """
+    Query ในบล็อกนี้เป็นของงานเบื้องหลังที่รันทันทีใน Request (ไม่ได้เปิด Worker)
+    QueryRecorder แยกเก็บไว้ใน job_queries ไม่นับรวมกับ Budget ของ View
+    """
+    depth = getattr(_state, 'inline_jobs', 0)
+    _state.inline_jobs = depth + 1
+    try:
+        yield
+    finally:
+        _state.inline_jobs = depth
+
+
+class QueryRecorder:
+    """
+    บันทึก Query ทุกตัวที่ถูกรันในบล็อก with (ใช้ได้ทั้งตอน DEBUG=False)
+
+        with QueryRecorder() as recorder:
+            ...
+        recorder.count, recorder.n_plus_one_suspects()
+    """
+
+    def __init__(self, using=None):
+        self.connection = connections[using or 'default']
+        self.queries = []
+        self.job_queries = []
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        if _TRANSACTION_RE.match(sql):
+            # SAVEPOINT/RELEASE ของ atomic() ไม่นับ (ใน Test กลายเป็น SAVEPOINT แต่ของจริงเป็น BEGIN/COMMIT จำนวนไม่เท่ากัน)
+            pass
+        elif getattr(_state, 'inline_jobs', 0):
+            self.job_queries.append(sql)
+        else:
+            self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._wrapper.__exit__(exc_type, exc_value, traceback)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def n_plus_one_suspects(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """คืนค่า {รูปแบบ Query: จำนวนครั้ง} ที่ซ้ำกันเกิน threshold"""
+        shapes = Counter(normalize_sql(sql) for sql in self.queries)
+        return {shape: n for shape, n in shapes.items() if shape is not None and n >= threshold}
+
+    def report(self, url_name):
+        """รายการปัญหาของ Request นี้ (ว่าง = ผ่าน)"""
+        problems = []
+        budget = get_budget(url_name)
+        if budget is None:
+            problems.append(f"no query budget for view '{url_name}'")
+        elif self.count > budget:
+            problems.append(f"'{url_name}' ran {self.count} queries (budget {budget})")
+        for shape, n in self.n_plus_one_suspects().items():
+            problems.append(f"possible N+1 in '{url_name}' ({n}x): {shape[:200]}")
+        return problems
+
+
+class QueryBudgetTestMixin:
+    """
+    Mixin สำหรับ django.test.TestCase
+
+        response = self.assertWithinQueryBudget('get', reverse('home_page'))
+
+    Test จะ fail ถ้าเกิน Budget ของ View หรือพบ Query ซ้ำแบบ N+1
+    """
+
+    def assertWithinQueryBudget(self, method, path, *args, **kwargs):
+        with QueryRecorder() as recorder:
+            response = getattr(self.client, method)(path, *args, **kwargs)
+        url_name = resolve(urlsplit(path).path).url_name
+        problems = recorder.report(url_name)
+        if problems:
+            self.fail('\n'.join(problems))
+        return response
+
+    def assertAllViewsBudgeted(self):
+        missing = missing_budgets()
+        if missing:
+            self.fail(f"views without a query budget: {', '.join(missing)}")
@@ -0,0 +1,118 @@
+# core/quizzes.py
+
+import hashlib
+import json
+import random
+import re
+
+from .models import GeneratedQuiz, Question
+
+QUIZ_SIZE = 5        # จำนวนข้อต่อชุด
+BANK_MIN_SIZE = 15   # คลังของหัวข้อไหนเหลือน้อยกว่านี้ ให้สั่งเติมเบื้องหลัง (สุ่มแล้วไม่ซ้ำชุดเดิมบ่อย)
+
+# ตัวนับรอบที่ตัวจัดตารางต่อท้ายหัวข้อ (scheduler.build_study_plan: "ทบทวน <วิชา> (ครั้งที่ N)")
+_ROUND_SUFFIX = re.compile(r'\s*\(ครั้งที่\s*\d+\)\s*$')
+
+
+def bank_key(text):
+    """
+    ปรับชื่อวิชา/หัวข้อให้เป็นกุญแจของคลัง (ตัวเล็ก ช่องว่างเดียว) ชื่อที่พิมพ์ต่างกันเล็กน้อยใช้คลังเดียวกัน
+    ตัด "(ครั้งที่ N)" ท้ายหัวข้อออก ทุกรอบของการทบทวนวิชาเดียวกันใช้คลังเดียวกัน
+    """
+    text = _ROUND_SUFFIX.sub('', text or '')
+    return ' '.join(text.split()).lower()[:255]
+
+
+def _hash(value):
+    canonical = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def question_content_hash(question):
+    """hash ของคำถาม 1 ข้อ (โจทย์/ตัวเลือก/เฉลยเหมือนกัน = ข้อเดียวกัน ไม่ว่า AI จะสร้างกี่ครั้ง)"""
+    return _hash({
+        'question': ' '.join(question['question'].split()),
+        'options': question['options'],
+        'correct_index': int(question['correct_index']),
+    })
+
+
+def quiz_content_hash(question_ids):
+    """hash ของชุดข้อสอบ (ข้อเดียวกันเรียงลำดับเดียวกัน = ชุดเดียวกัน)"""
+    return _hash([str(qid) for qid in question_ids])
+
+
+def build_questions(subject_name, topic, questions):
+    """
+    แปลงโจทย์จาก AI เป็น Question (ยังไม่บันทึก) ข้อที่ซ้ำกันในชุดเดียวกันเหลือข้อเดียว
+    คืนค่า dict {content_hash: Question} ตามลำดับเดิม
+    """
+    subject_key, topic_key = bank_key(subject_name), bank_key(topic)
+    built = {}
+    for q in questions:
+        content_hash = question_content_hash(q)
+        built.setdefault(content_hash, Question(
+            subject_key=subject_key, topic_key=topic_key, content_hash=content_hash,
+            question=q['question'], options=q['options'], correct_index=int(q['correct_index']),
+        ))
+    return built
+
+
+def add_to_bank(subject_name, topic, questions):
+    """
+    เพิ่มโจทย์เข้าคลัง (ข้อที่มีอยู่แล้วไม่เพิ่มซ้ำ) คืนค่า List ของ Question ตามลำดับเดิม
+    ข้อที่ซ้ำกับคลังจะได้แถวเดิมกลับมา (อาจอยู่ในคลังของหัวข้ออื่นก็ได้)
+    """
+    built = build_questions(subject_name, topic, questions)
+    Question.objects.bulk_create(built.values(), ignore_conflicts=True)
+    stored = {q.content_hash: q for q in Question.objects.filter(content_hash__in=list(built))}
+    return [stored[h] for h in built if h in stored]
+
+
+def sample_questions(subject_name, topic, size=QUIZ_SIZE, rng=random):
+    """สุ่มโจทย์จากคลังของวิชา/หัวข้อ คืนค่า (List ของ Question, จำนวนข้อในคลังทั้งหมด)"""
+    ids = list(Question.objects.filter(
+        subject_key=bank_key(subject_name), topic_key=bank_key(topic)
+    ).values_list('question_id', flat=True))
+    # เรียงตาม ID: สุ่มได้ข้อชุดเดียวกันจะได้ GeneratedQuiz แถวเดิม (ไม่สร้างชุดซ้ำ)
+    chosen = sorted(rng.sample(ids, min(size, len(ids))))
+    by_id = Question.objects.in_bulk(chosen)
+    return [by_id[qid] for qid in chosen], len(ids)
+
+
+def store_quiz(questions):
+    """บันทึกชุดข้อสอบ (เก็บแค่ ID ของข้อในคลัง) ถ้ามีชุดเดียวกันอยู่แล้วใช้แถวเดิม"""
+    question_ids = [str(q.question_id) for q in questions]
+    quiz, _ = GeneratedQuiz.objects.get_or_create(
+        content_hash=quiz_content_hash(question_ids),
+        defaults={'question_ids': question_ids},
+    )
+    return quiz
+
+
+def public_questions(questions):
+    """โจทย์ที่ส่งให้หน้าเว็บ (ตัดเฉลยออก)"""
+    return [{'question': q['question'], 'options': q['options']} for q in questions]
+
+
+def grade(questions, answers):
+    """
+    ตรวจคำตอบกับโจทย์ที่เก็บไว้ฝั่ง Server
+    answers: List ของ index ที่เลือก (None = ไม่ได้ตอบ) คืนค่า (คะแนน, คำตอบที่ปรับให้ยาวเท่าจำนวนข้อแล้ว)
+    """
+    answers = list(answers or [])[:len(questions)]
+    answers += [None] * (len(questions) - len(answers))
+
+    normalized = []
+    score = 0
+    for q, answer in zip(questions, answers):
+        try:
+            answer = int(answer) if answer is not None else None
+        except (TypeError, ValueError):
+            answer = None
+        if answer is not None and not 0 <= answer < len(q['options']):
+            answer = None
+        if answer is not None and answer == int(q['correct_index']):
+            score += 1
+        normalized.append(answer)
+    return score, normalized
@@ -0,0 +1,240 @@
+# core/scheduler.py
+
+import datetime
+from django.utils import timezone
+
+# จำนวนวันที่วางแผนล่วงหน้า (เหมือนที่เคยสั่ง AI ไว้ "Plan for the next 5 days only")
+PLAN_DAYS = 5
+
+# ถ้าผู้ใช้ยังไม่ได้ตั้งเวลาว่าง ให้ใช้ช่วงเย็น 18:00 - 22:00 ทุกวันแทน
+DEFAULT_HOURS = list(range(18, 22))
+
+# ปัดเวลาเริ่มให้ลงตัวทุกๆ 15 นาที
+SLOT_ROUNDING_MINUTES = 15
+
+
+def _round_up(dt, minutes=SLOT_ROUNDING_MINUTES):
+    """ปัดเวลาขึ้นให้ลงตัวตามจำนวนนาทีที่กำหนด"""
+    dt = dt.replace(second=0, microsecond=0)
+    remainder = dt.minute % minutes
+    if remainder:
+        dt += datetime.timedelta(minutes=minutes - remainder)
+    return dt
+
+
+def build_free_windows(availability_hours, now, days=PLAN_DAYS):
+    """
+    แปลงเวลาว่างรายชั่วโมง (day_of_week, hour) เป็นช่วงเวลาต่อเนื่องจริงในอีก N วันข้างหน้า
+    ชั่วโมงที่ติดกัน (รวมถึงข้ามเที่ยงคืน) จะถูกรวมเป็นช่วงเดียว
+    """
+    local_now = timezone.localtime(now)
+    today = local_now.date()
+
+    if availability_hours:
+        hours_by_day = {}
+        for day_of_week, hour in availability_hours:
+            hours_by_day.setdefault(day_of_week, set()).add(hour)
+    else:
+        hours_by_day = {d: set(DEFAULT_HOURS) for d in range(7)}
+
+    intervals = []
+    for offset in range(days):
+        day = today + datetime.timedelta(days=offset)
+        for hour in sorted(hours_by_day.get(day.weekday(), ())):
+            start = timezone.make_aware(datetime.datetime.combine(day, datetime.time(hour)))
+            intervals.append((start, start + datetime.timedelta(hours=1)))
+
+    # รวมชั่วโมงที่ต่อกันเป็นช่วงเดียว
+    windows = []
+    for start, end in sorted(intervals):
+        if windows and windows[-1][1] >= start:
+            windows[-1][1] = max(windows[-1][1], end)
+        else:
+            windows.append([start, end])
+
+    # ตัดส่วนที่อยู่ก่อนเวลาปัจจุบันทิ้ง (ห้ามวางแผนย้อนหลัง)
+    earliest = _round_up(local_now)
+    result = []
+    for start, end in windows:
+        start = max(start, earliest)
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def build_time_slots(windows, session_duration, break_duration):
+    """แบ่งช่วงเวลาว่างเป็นช่อง Session ตามความยาว Session และเวลาพัก"""
+    session_delta = datetime.timedelta(minutes=session_duration)
+    break_delta = datetime.timedelta(minutes=break_duration)
+
+    slots = []
+    for start, end in windows:
+        cursor = start
+        while cursor + session_delta <= end:
+            slots.append((cursor, cursor + session_delta))
+            cursor += session_delta + break_delta
+    return slots
+
+
+def subject_weight(subject, slot_start):
+    """
+    คำนวณน้ำหนักความสำคัญของวิชา ณ เวลาหนึ่ง
+    ยาก x สำคัญ x ความเร่งด่วน (ยิ่งใกล้วันสอบยิ่งได้น้ำหนักมาก)
+    """
+    days_left = (subject.exam_date - slot_start).total_seconds() / 86400
+    urgency = 1 + 7 / max(days_left, 0.5)
+    return subject.difficulty * subject.importance * urgency
+
+
+def build_study_plan(subjects, availability_hours, session_duration, break_duration, now=None, days=PLAN_DAYS):
+    """
+    สร้างตารางเรียนแบบ Deterministic (ไม่ต้องเรียก AI)
+    - subjects: รายการ Subject (ใช้ difficulty, importance, exam_date)
+    - availability_hours: รายการ (day_of_week, hour) จาก UserAvailability
+    คืนค่าเป็น List ของ dict {subject, start_time, end_time, topic} เรียงตามเวลา
+    ข้อมูลชุดเดิมจะได้ตารางเดิมเสมอ
+    """
+    if now is None:
+        now = timezone.now()
+    if session_duration <= 0:
+        return []
+
+    windows = build_free_windows(availability_hours, now, days)
+    slots = build_time_slots(windows, session_duration, max(break_duration, 0))
+
+    # เรียงวิชาให้ลำดับแน่นอนเสมอ (ใช้ตัดสินกรณีคะแนนเท่ากัน)
+    ordered_subjects = sorted(subjects, key=lambda s: (s.exam_date, s.name, str(s.pk)))
+    assigned_count = {s.pk: 0 for s in ordered_subjects}
+
+    plan = []
+    last_subject = None
+    last_end = None
+    back_to_back_gap = datetime.timedelta(minutes=max(break_duration, 0))
+    for start, end in slots:
+        # วิชาที่สอบไปแล้ว ไม่ต้องอ่านต่อ
+        candidates = [s for s in ordered_subjects if s.exam_date >= end]
+        if not candidates:
+            continue
+
+        # เลี่ยงการอ่านวิชาเดิมต่อเนื่องในช่วงเดียวกัน ถ้ามีวิชาอื่นให้เลือก
+        is_back_to_back = last_end is not None and start - last_end <= back_to_back_gap
+        if is_back_to_back and len(candidates) > 1:
+            candidates = [s for s in candidates if s.pk != last_subject.pk]
+
+        # แบ่งช่องตามสัดส่วนน้ำหนัก (วิชาที่ได้ช่องไปแล้วเยอะจะถูกลดลำดับ)
+        best = max(candidates, key=lambda s: subject_weight(s, start) / (assigned_count[s.pk] + 1))
+        assigned_count[best.pk] += 1
+        last_subject = best
+        last_end = end
+
+        plan.append({
+            'subject': best,
+            'start_time': start,
+            'end_time': end,
+            'topic': f"ทบทวน {best.name} (ครั้งที่ {assigned_count[best.pk]})",
+        })
+    return plan
+
+
+def _session_key(subject_id, start_time, end_time):
+    return (subject_id, start_time, end_time)
+
+
+def apply_study_plan(user, plan, now=None):
+    """
+    บันทึกแผนใหม่แบบ Incremental: เทียบกับ Session ที่ยังไม่เสร็จและยังไม่ถึงเวลาของผู้ใช้
+    (Session ที่เลยเวลาไปแล้วเก็บไว้เป็นประวัติ แผนใหม่เริ่มจากตอนนี้อยู่แล้ว)
+    - Session ที่ตรงกับแผนเดิม (วิชา/เวลาเดียวกัน) เก็บไว้ พร้อม google_event_id
+    - Session ที่เปลี่ยน นำแถวเดิมมาแก้ไข (is_synced=False เพื่อให้ซิงค์ไปแก้ Event เดิม)
+      ยกเว้นแถวที่มีสรุป/ผลสอบแล้ว จะลบแล้วสร้างใหม่แทน (สรุป/ผลสอบไม่ไปติดกับวิชา/หัวข้ออื่น)
+    - ส่วนที่เกินจึงค่อย insert หรือ delete
+    คืนค่า dict จำนวน kept / updated / created / deleted
+    """
+    # import ตรงนี้เพื่อให้ส่วนคำนวณตารางด้านบนไม่ต้องพึ่ง Database
+    from django.db import transaction
+    from django.db.models import Exists, OuterRef
+    from core.google_calendar import delete_events_from_google
+    from .models import QuizResult, StudySession, StudySummary
+    from .progress import session_bucket, update_progress
+
+    if now is None:
+        now = timezone.now()
+    existing = list(
+        StudySession.objects.filter(user=user, is_completed=False, start_time__gte=now)
+        .annotate(
+            has_summary=Exists(StudySummary.objects.filter(session=OuterRef('pk'))),
+            has_results=Exists(QuizResult.objects.filter(session=OuterRef('pk'))),
+        )
+        .order_by('start_time')
+    )
+    existing_by_key = {}
+    for session in existing:
+        existing_by_key.setdefault(_session_key(session.subject_id, session.start_time, session.end_time), []).append(session)
+
+    kept = 0
+    to_update, new_items, replaced = [], [], []
+    for item in plan:
+        matches = existing_by_key.get(_session_key(item['subject'].pk, item['start_time'], item['end_time']))
+        if matches:
+            session = matches.pop(0)
+            if session.topic == item['topic']:
+                kept += 1
+            elif session.has_summary or session.has_results:
+                replaced.append(session)
+                new_items.append(item)
+            else:
+                session.topic = item['topic']
+                session.is_synced = False
+                to_update.append(session)
+        else:
+            new_items.append(item)
+
+    # แถวเดิมที่ไม่ตรงกับแผนใหม่ นำกลับมาใช้ก่อน (ประหยัดทั้ง insert/delete และ Calendar API)
+    # แถวที่มีสรุป/ผลสอบแล้วไม่นำมาใช้ซ้ำ ลบทิ้งไปพร้อมกับสรุป/ผลสอบของมัน
+    leftovers = [s for sessions in existing_by_key.values() for s in sessions]
+    leftovers.sort(key=lambda s: s.start_time)
+    touched = {session_bucket(s) for s in leftovers + replaced} # วัน/วิชาเดิมของแถวที่จะถูกย้ายหรือลบ
+    reusable = [s for s in leftovers if not (s.has_summary or s.has_results)]
+    replaced += [s for s in leftovers if s.has_summary or s.has_results]
+    reused = 0
+    for session, item in zip(reusable, new_items):
+        session.subject = item['subject']
+        session.start_time = item['start_time']
+        session.end_time = item['end_time']
+        session.topic = item['topic']
+        session.is_synced = False
+        to_update.append(session)
+        reused += 1
+
+    to_create = [
+        StudySession(
+            user=user,
+            subject=item['subject'],
+            start_time=item['start_time'],
+            end_time=item['end_time'],
+            topic=item['topic'],
+        )
+        for item in new_items[reused:]
+    ]
+    to_delete = replaced + reusable[reused:]
+
+    with transaction.atomic():
+        if to_update:
+            StudySession.objects.bulk_update(to_update, ['subject', 'start_time', 'end_time', 'topic', 'is_synced'])
+        if to_create:
+            StudySession.objects.bulk_create(to_create)
+        if to_delete:
+            StudySession.objects.filter(pk__in=[s.pk for s in to_delete]).delete()
+
+    # bulk_create/bulk_update ไม่ส่ง Signal จึงต้องอัปเดตสรุปความก้าวหน้าเอง
+    update_progress(user.pk, touched | {session_bucket(s) for s in to_update + to_create})
+
+    # ลบ Event ใน Google เฉพาะ Session ที่ถูกลบจริงๆ (ส่งเป็น Batch เดียว)
+    delete_events_from_google(user, [s.google_event_id for s in to_delete if s.google_event_id])
+
+    return {
+        'kept': kept,
+        'updated': len(to_update),
+        'created': len(to_create),
+        'deleted': len(to_delete),
+    }
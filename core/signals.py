@@ -0,0 +1,21 @@
+# core/signals.py
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .blobs import release_blobs
+from .models import File, Notification
+from .notifications import invalidate_notification_summary
+
+
+@receiver([post_save, post_delete], sender=Notification)
+def invalidate_notifications_on_change(sender, instance, **kwargs):
+    # มีแจ้งเตือนใหม่/อ่านแล้ว -> ล้างสรุปใน Cache ให้คำนวณใหม่
+    invalidate_notification_summary(instance.recipient_id)
+
+
+@receiver(post_delete, sender=File)
+def release_blob_on_file_delete(sender, instance, **kwargs):
+    # ลบ File (รวมถึงลบตามวิชา) -> คืน Blob ถ้าไม่มี File อื่นใช้แล้วจะลบไฟล์ใน Storage หลัง Commit
+    if instance.blob_id:
+        release_blobs([instance.blob_id])
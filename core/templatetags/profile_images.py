@@ -0,0 +1,16 @@
+# core/templatetags/profile_images.py
+
+from django import template
+
+from core.thumbnails import thumbnail_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def profile_picture_url(user, size):
+    """
+    URL รูปโปรไฟล์ที่เหมาะกับขนาดที่แสดง (px จริงบนจอ เช่น 80 สำหรับรูป 40px)
+    ใช้: {% profile_picture_url user 80 %}
+    """
+    return thumbnail_url(user, int(size))
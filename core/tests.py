@@ -1,3 +1,927 @@
-from django.test import TestCase
+import contextlib
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime, timedelta
+from unittest import mock
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from google.auth.exceptions import RefreshError
+from PIL import Image
 
-# Create your tests here.
+from .ai_cache import cache_get, cache_set, get_cache_stats, make_cache_key
+from .ai_service import single_flight
+from .file_ordering import add_files
+from .jobs import JOB_HANDLERS, JOB_TIMEOUT, MAX_ATTEMPTS, claim_job, claim_next_job, enqueue_job, requeue_stale_jobs, run_job
+from .google_calendar import sync_sessions_to_google
+from .dashboard import get_dashboard_stats
+from .json_stream import JSONArrayStream
+from .llm import FakeProvider, set_provider
+from .materials import EXTRACTORS, material_context
+from .models import (
+    AICacheEntry, AIGenerationLock, BackgroundJob, Blob, CustomUser, File, FileChunk, GoogleCredential, IssuedQuiz, Notification, ProgressAnalytic, QuizResult, StudySession, StudySummary, Subject,
+    UserAvailability, UserSettings,
+)
+from .query_inspector import QueryBudgetTestMixin, core_url_names, normalize_sql
+from .progress import rebuild_progress, session_bucket, update_progress
+from .quizzes import add_to_bank, bank_key, sample_questions, store_quiz
+from .scheduler import apply_study_plan, build_study_plan
+from .thumbnails import THUMBNAIL_SIZES, refresh_profile_thumbnails, thumbnail_url
+from .uploads import UPLOAD_CHUNK_SIZE
+
+
+def make_quiz(subject_name, topic, size=5):
+    questions = [
+        {'question': f"{topic} ข้อ {i}", 'options': ['ก', 'ข', 'ค', 'ง'], 'correct_index': i % 4}
+        for i in range(size)
+    ]
+    return store_quiz(add_to_bank(subject_name, topic, questions))
+
+
+class AICacheTests(TestCase):
+    def test_hits_are_counted_per_entry_and_overall(self):
+        key = make_cache_key('model', 'prompt')
+        self.assertIsNone(cache_get(key))
+        cache_set(key, 'model', 'answer')
+        self.assertEqual([cache_get(key), cache_get(key)], ['answer', 'answer'])
+
+        self.assertEqual(AICacheEntry.objects.get(cache_key=key).hit_count, 2)
+        stats = get_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (2, 1, 1))
+
+
+class SingleFlightTests(TestCase):
+    def run_concurrently(self, leader_fn, followers=3):
+        """Leader ค้างอยู่ใน fn จน Follower ทุกตัวเข้ามารอ แล้วคืนผล/Error ของทุกตัว"""
+        started, release = threading.Event(), threading.Event()
+        calls = []
+        outcomes = {}
+
+        def fn():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return leader_fn()
+
+        def call(name):
+            try:
+                outcomes[name] = single_flight('key', fn)
+            except Exception as e:
+                outcomes[name] = e
+
+        # ล็อกข้าม Process ทดสอบแยก (Thread ในเทสไม่ได้ใช้ Transaction เดียวกับเทส)
+        with mock.patch('core.ai_service._process_lock', lambda key, timeout: contextlib.nullcontext()):
+            threads = [threading.Thread(target=call, args=('leader',))]
+            threads[0].start()
+            started.wait(5)
+            threads += [threading.Thread(target=call, args=(i,)) for i in range(followers)]
+            for thread in threads[1:]:
+                thread.start()
+            time.sleep(0.2)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+        return len(calls), outcomes
+
+    def test_concurrent_calls_share_one_result(self):
+        calls, outcomes = self.run_concurrently(lambda: ['quiz'])
+        self.assertEqual(calls, 1)
+        self.assertEqual(list(outcomes.values()), [['quiz']] * 4)
+
+    def test_leader_error_is_raised_to_followers(self):
+        error = RuntimeError('AI down')
+
+        def fail():
+            raise error
+
+        calls, outcomes = self.run_concurrently(fail)
+        self.assertEqual(calls, 1)
+        self.assertTrue(all(outcome is error for outcome in outcomes.values()))
+
+    def test_stale_process_lock_is_taken_over(self):
+        AIGenerationLock.objects.create(lock_key='key')
+        AIGenerationLock.objects.update(created_at=timezone.now() - timedelta(seconds=5))
+
+        self.assertEqual(single_flight('key', lambda: 'answer', timeout=2), 'answer')
+        self.assertFalse(AIGenerationLock.objects.exists())
+
+
+class JSONArrayStreamTests(TestCase):
+    def parse(self, text, chunk_size=1):
+        parser = JSONArrayStream()
+        items = []
+        for i in range(0, len(text), chunk_size):
+            items += parser.feed(text[i:i + chunk_size])
+        return items + parser.close(), parser.skipped
+
+    def test_brackets_and_quotes_inside_strings(self):
+        elements = [
+            {'question': 'ข้อใดคือ [a, b]?', 'options': ['{', '}', '"]"', 'a\\'], 'correct_index': 2},
+            {'question': 'จุลภาค, และ \\"อัญประกาศ\\"', 'options': [], 'correct_index': 0},
+        ]
+        text = '```json\n' + json.dumps(elements, ensure_ascii=False) + '\n```'
+        for chunk_size in (1, 3, len(text)):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self.parse(text, chunk_size), (elements, 0))
+
+    def test_truncated_stream_keeps_complete_elements(self):
+        self.assertEqual(self.parse('[{"a": 1}, {"a": 2}, {"a": "ตัดกลา'), ([{'a': 1}, {'a': 2}], 1))
+        # Element สุดท้ายครบแล้วแต่ไม่มี ']' ปิด
+        self.assertEqual(self.parse('[{"a": 1}, {"a": 2}'), ([{'a': 1}, {'a': 2}], 0))
+
+    def test_malformed_element_is_skipped(self):
+        self.assertEqual(self.parse('[{"a": 1}, {a: 2}, {"a": 3}]'), ([{'a': 1}, {'a': 3}], 1))
+
+
+class QuestionBankKeyTests(TestCase):
+    def test_review_rounds_share_one_bank(self):
+        self.assertEqual(bank_key('ทบทวน  คณิต (ครั้งที่ 12)'), 'ทบทวน คณิต')
+        self.assertEqual(bank_key('บทที่ 2 (ครั้งที่ 1) สรุป'), 'บทที่ 2 (ครั้งที่ 1) สรุป')
+
+        make_quiz('คณิต', 'ทบทวน คณิต (ครั้งที่ 1)')
+        questions, bank_size = sample_questions('คณิต', 'ทบทวน คณิต (ครั้งที่ 2)')
+        self.assertEqual((len(questions), bank_size), (5, 5))
+
+
+class ProgressRollupTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='tracker', email='tracker@example.com', password='pw')
+        self.subject = Subject.objects.create(user=self.user, name='คณิต', exam_date=timezone.now() + timedelta(days=30))
+        # 10 Session ที่เรียนจบแล้วในอดีต (เมื่อวาน, 2 วันก่อน, ...) ก่อนมีแถวสรุป
+        self.sessions = [self.make_session(-day, completed=True) for day in range(1, 11)]
+
+    def make_session(self, days, completed=False):
+        start = timezone.now().replace(microsecond=0) + timedelta(days=days)
+        return StudySession.objects.create(
+            user=self.user, subject=self.subject, topic='ทบทวน', start_time=start,
+            end_time=start + timedelta(hours=1), is_completed=completed,
+        )
+
+    def toggle(self, session):
+        session.is_completed = not session.is_completed
+        session.save()
+        update_progress(self.user.pk, [session_bucket(session)])
+
+    def total(self):
+        return ProgressAnalytic.objects.get(user=self.user, subject=None, date=None)
+
+    def test_first_toggle_counts_existing_history(self):
+        self.toggle(self.make_session(0))
+
+        stats = get_dashboard_stats(self.user)
+        self.assertEqual((stats['total_plans'], stats['completed_all'], stats['readiness_score']), (11, 11, 100))
+        self.assertEqual(self.total().study_streak_count, 11)
+
+    def test_uncomplete_updates_totals_and_streak(self):
+        rebuild_progress(self.user)
+        today = self.make_session(0, completed=True)
+        update_progress(self.user.pk, [session_bucket(today)])
+        self.toggle(self.sessions[0]) # เมื่อวานไม่ได้เรียนแล้ว
+
+        total = self.total()
+        self.assertEqual((total.sessions_planned, total.sessions_completed), (11, 10))
+        self.assertEqual(total.study_streak_count, 1)
+
+    def test_streak_resets_when_no_recent_study_day(self):
+        today = self.make_session(0, completed=True)
+        rebuild_progress(self.user)
+        self.assertEqual(self.total().study_streak_count, 11)
+        for session in (today, self.sessions[0]):
+            self.toggle(session)
+        # วันล่าสุดที่เรียนจบคือ 2 วันก่อน (อยู่นอกช่วงที่อัปเดต) streak ปัจจุบันต้องเป็น 0
+        self.assertEqual(self.total().study_streak_count, 0)
+
+    def test_delete_removes_day_row(self):
+        rebuild_progress(self.user)
+        session = self.sessions[3]
+        bucket = session_bucket(session)
+        session.delete()
+        update_progress(self.user.pk, [bucket])
+
+        total = self.total()
+        self.assertEqual((total.sessions_planned, total.sessions_completed), (9, 9))
+        self.assertFalse(ProgressAnalytic.objects.filter(user=self.user, subject=None, date=bucket[1]).exists())
+
+
+class SubmitQuizTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.users, self.sessions = [], []
+        for i in range(2):
+            user = CustomUser.objects.create_user(username=f"user{i}", email=f"user{i}@example.com", password='pw')
+            subject = Subject.objects.create(user=user, name=f"วิชา {i}", exam_date=now + timedelta(days=30))
+            session = StudySession.objects.create(
+                user=user, subject=subject, topic='บทที่ 1',
+                start_time=now, end_time=now + timedelta(hours=1),
+            )
+            self.users.append(user)
+            self.sessions.append(session)
+
+        # ชุดข้อสอบที่ออกให้ user0 (เหมือนที่ get_session_quiz บันทึกไว้ตอนส่งโจทย์)
+        self.quiz = make_quiz('วิชา 0', 'บทที่ 1')
+        IssuedQuiz.objects.create(user=self.users[0], session=self.sessions[0], quiz=self.quiz)
+
+    def submit(self, user, session, quiz_id):
+        self.client.force_login(user)
+        return self.client.post(
+            reverse('submit_quiz'),
+            json.dumps({'session_id': str(session.session_id), 'quiz_id': str(quiz_id), 'answers': [0, 1, 2, 3, 0]}),
+            content_type='application/json', secure=True,
+        )
+
+    def test_issued_quiz_is_graded(self):
+        response = self.submit(self.users[0], self.sessions[0], self.quiz.quiz_id)
+        self.assertTrue(response.json()['success'])
+        result = QuizResult.objects.get(user=self.users[0])
+        self.assertEqual((result.score, result.total_questions), (5, 5))
+
+    def test_served_quiz_stays_gradable_after_jobs_are_pruned(self):
+        previous = set_provider(FakeProvider())
+        self.addCleanup(set_provider, previous)
+        self.client.force_login(self.users[1])
+        served = self.client.get(reverse('get_session_quiz', args=[self.sessions[1].session_id]), secure=True).json()
+        BackgroundJob.objects.all().delete()
+
+        response = self.submit(self.users[1], self.sessions[1], served['quiz_id'])
+        self.assertTrue(response.json()['success'])
+
+    def test_malformed_quiz_id_is_rejected(self):
+        response = self.submit(self.users[0], self.sessions[0], 'not-a-uuid')
+        self.assertEqual(response.status_code, 403)
+
+    def test_quiz_of_another_user_is_rejected(self):
+        response = self.submit(self.users[1], self.sessions[1], self.quiz.quiz_id)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(QuizResult.objects.exists())
+
+    def test_quiz_of_another_session_is_rejected(self):
+        other = StudySession.objects.create(
+            user=self.users[0], subject=self.sessions[0].subject, topic='บทที่ 2',
+            start_time=timezone.now(), end_time=timezone.now() + timedelta(hours=1),
+        )
+        response = self.submit(self.users[0], other, self.quiz.quiz_id)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(QuizResult.objects.exists())
+
+
+@override_settings(USE_BACKGROUND_JOBS=True)
+class BackgroundJobTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='worker', email='worker@example.com', password='pw')
+
+    def test_job_is_claimed_once_in_queue_order(self):
+        first = enqueue_job(self.user, 'schedule')
+        second = enqueue_job(self.user, 'summary', {'session_id': 'x'})
+        self.assertEqual(enqueue_job(self.user, 'schedule').pk, first.pk) # งานเดียวกันที่รออยู่ไม่สร้างซ้ำ
+
+        claimed = claim_next_job()
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertFalse(claim_job(BackgroundJob.objects.get(pk=first.pk))) # Worker อีกตัวจองซ้ำไม่ได้
+        self.assertEqual(claim_next_job().pk, second.pk)
+        self.assertIsNone(claim_next_job())
+
+    def test_failed_job_records_error_and_can_be_retried(self):
+        job = enqueue_job(self.user, 'schedule')
+        claim_job(job)
+        with mock.patch.dict(JOB_HANDLERS, {'schedule': mock.Mock(side_effect=RuntimeError('AI down'))}):
+            run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.attempts), ('failed', 'AI down', 1))
+
+        retry = enqueue_job(self.user, 'schedule')
+        self.assertNotEqual(retry.pk, job.pk)
+        claim_job(retry)
+        with mock.patch.dict(JOB_HANDLERS, {'schedule': mock.Mock(return_value={'success': True})}):
+            run_job(retry)
+        retry.refresh_from_db()
+        self.assertEqual((retry.status, retry.result), ('done', {'success': True}))
+
+    def test_stale_jobs_are_requeued_until_attempts_run_out(self):
+        stale = timezone.now() - JOB_TIMEOUT - timedelta(minutes=1)
+        retried, exhausted, fresh = [
+            BackgroundJob.objects.create(user=self.user, job_type='summary', payload={'n': i}, status='running',
+                                         started_at=started_at, attempts=attempts)
+            for i, (started_at, attempts) in enumerate([(stale, 1), (stale, MAX_ATTEMPTS), (timezone.now(), 1)])
+        ]
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        statuses = dict(BackgroundJob.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            [statuses[retried.pk], statuses[exhausted.pk], statuses[fresh.pk]],
+            ['pending', 'failed', 'running'],
+        )
+        self.assertEqual(claim_next_job().pk, retried.pk)
+
+
+@override_settings(USE_BACKGROUND_JOBS=False)
+class MaterialIndexingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = CustomUser.objects.create_user(username='reader', email='reader@example.com', password='pw')
+        self.subject = Subject.objects.create(user=self.user, name='ชีวะ', exam_date=timezone.now() + timedelta(days=30))
+        add_files(self.subject, [SimpleUploadedFile('cells.txt', 'mitochondria powerhouse of the cell'.encode(), 'text/plain')])
+
+    def test_inline_indexing_runs_after_commit_outside_the_request(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            job = enqueue_job(self.user, 'index_materials', {'subject_id': str(self.subject.subject_id)})
+        self.assertEqual(job.status, 'pending')
+        self.assertFalse(FileChunk.objects.exists())
+
+        with mock.patch('core.jobs.threading.Thread') as thread:
+            for callback in callbacks:
+                callback()
+        thread.return_value.start.assert_called_once()
+        self.assertTrue(thread.call_args.kwargs['daemon'])
+
+        with mock.patch('core.jobs.connection'): # Thread จริงปิด Connection ของตัวเอง ในเทสใช้ Connection เดียวกัน
+            thread.call_args.kwargs['target'](*thread.call_args.kwargs['args'])
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertTrue(FileChunk.objects.filter(subject=self.subject).exists())
+
+    def test_unindexed_files_are_read_on_first_use(self):
+        self.assertEqual(material_context(self.subject.pk, 'mitochondria'), ['mitochondria powerhouse of the cell'])
+        self.assertFalse(File.objects.filter(subject=self.subject, is_indexed=False).exists())
+
+
+class BuildStudyPlanTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='scheduler', email='scheduler@example.com', password='pw')
+        # วันจันทร์ 08:00 (เวลาไทย)
+        self.now = timezone.make_aware(datetime(2026, 1, 5, 8, 0))
+
+    def subject(self, name, exam_in):
+        return Subject.objects.create(user=self.user, name=name, exam_date=self.now + exam_in)
+
+    def test_contiguous_hours_are_split_by_session_and_break(self):
+        math = self.subject('คณิต', timedelta(days=30))
+        plan = build_study_plan([math], [(0, 18), (0, 19), (0, 21)], 50, 10, now=self.now)
+
+        self.assertEqual(
+            [(item['start_time'].strftime('%a %H:%M'), item['end_time'].strftime('%H:%M')) for item in plan],
+            # 18:00-20:00 เป็นช่วงเดียว, 21:00 แยกอีกช่วง
+            [('Mon 18:00', '18:50'), ('Mon 19:00', '19:50'), ('Mon 21:00', '21:50')],
+        )
+
+    def test_subject_is_not_planned_after_its_exam(self):
+        soon = self.subject('เคมี', timedelta(days=1, hours=12)) # สอบวันอังคาร 20:00
+        later = self.subject('ชีวะ', timedelta(days=30))
+        plan = build_study_plan([soon, later], [], 60, 0, now=self.now)
+
+        soon_ends = [item['end_time'] for item in plan if item['subject'] == soon]
+        self.assertTrue(soon_ends)
+        self.assertTrue(all(end <= soon.exam_date for end in soon_ends))
+        self.assertTrue(any(item['start_time'] >= soon.exam_date for item in plan if item['subject'] == later))
+
+    def test_no_plan_without_eligible_subjects(self):
+        past = self.subject('สอบแล้ว', -timedelta(days=1))
+        self.assertEqual(build_study_plan([], [], 60, 10, now=self.now), [])
+        self.assertEqual(build_study_plan([past], [], 60, 10, now=self.now), [])
+
+
+class ApplyStudyPlanTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='planner', email='planner@example.com', password='pw')
+        self.now = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        self.math = Subject.objects.create(user=self.user, name='คณิต', exam_date=self.now + timedelta(days=30))
+        self.physics = Subject.objects.create(user=self.user, name='ฟิสิกส์', exam_date=self.now + timedelta(days=30))
+
+    def item(self, subject, hours, topic):
+        start = self.now + timedelta(hours=hours)
+        return {'subject': subject, 'start_time': start, 'end_time': start + timedelta(hours=1), 'topic': topic}
+
+    def test_session_without_dependents_is_reused(self):
+        apply_study_plan(self.user, [self.item(self.math, 0, 'ทบทวน คณิต (ครั้งที่ 1)')])
+        session = StudySession.objects.get(user=self.user)
+
+        changes = apply_study_plan(self.user, [self.item(self.physics, 2, 'ทบทวน ฟิสิกส์ (ครั้งที่ 1)')])
+        self.assertEqual((changes['updated'], changes['created'], changes['deleted']), (1, 0, 0))
+        session.refresh_from_db()
+        self.assertEqual(session.subject, self.physics)
+
+    def test_session_with_summary_is_not_reassigned(self):
+        apply_study_plan(self.user, [self.item(self.math, 0, 'ทบทวน คณิต (ครั้งที่ 1)')])
+        session = StudySession.objects.get(user=self.user)
+        StudySummary.objects.create(user=self.user, session=session, subject=self.math, content='สรุปคณิต')
+
+        changes = apply_study_plan(self.user, [self.item(self.physics, 2, 'ทบทวน ฟิสิกส์ (ครั้งที่ 1)')])
+        self.assertEqual((changes['updated'], changes['created'], changes['deleted']), (0, 1, 1))
+        new_session = StudySession.objects.get(user=self.user)
+        self.assertEqual(new_session.subject, self.physics)
+        self.assertFalse(StudySummary.objects.filter(session=new_session).exists())
+
+    def test_topic_change_replaces_session_with_quiz_results(self):
+        apply_study_plan(self.user, [self.item(self.math, 0, 'ทบทวน คณิต (ครั้งที่ 1)')])
+        session = StudySession.objects.get(user=self.user)
+        QuizResult.objects.create(user=self.user, session=session, user_answers=[], score=0, total_questions=0)
+
+        apply_study_plan(self.user, [self.item(self.math, 0, 'ทบทวน คณิต (ครั้งที่ 2)')])
+        new_session = StudySession.objects.get(user=self.user)
+        self.assertNotEqual(new_session.pk, session.pk)
+        self.assertEqual(new_session.topic, 'ทบทวน คณิต (ครั้งที่ 2)')
+        self.assertFalse(QuizResult.objects.filter(session=new_session).exists())
+
+    def test_regeneration_replaces_only_future_unfinished_sessions(self):
+        past = self.now - timedelta(days=3)
+        missed, done = [
+            StudySession.objects.create(
+                user=self.user, subject=self.math, topic=topic, is_completed=completed,
+                start_time=past + timedelta(hours=i), end_time=past + timedelta(hours=i + 1),
+            )
+            for i, (topic, completed) in enumerate([('พลาด', False), ('อ่านแล้ว', True)])
+        ]
+        apply_study_plan(self.user, [self.item(self.math, 0, 'ทบทวน คณิต (ครั้งที่ 1)')])
+        future = StudySession.objects.get(user=self.user, start_time__gte=self.now)
+
+        changes = apply_study_plan(self.user, [self.item(self.physics, 4, 'ทบทวน ฟิสิกส์ (ครั้งที่ 1)')])
+        self.assertEqual((changes['kept'], changes['updated'], changes['created'], changes['deleted']), (0, 1, 0, 0))
+        future.refresh_from_db()
+        self.assertEqual(future.subject, self.physics)
+        self.assertEqual(
+            set(StudySession.objects.filter(start_time__lt=self.now).values_list('pk', 'topic')),
+            {(missed.pk, 'พลาด'), (done.pk, 'อ่านแล้ว')},
+        )
+
+
+class SyncSessionsToGoogleTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='syncer', email='syncer@example.com', password='pw')
+        GoogleCredential.objects.create(user=self.user, token={'token': 't', 'refresh_token': 'r'})
+        subject = Subject.objects.create(user=self.user, name='คณิต', exam_date=timezone.now() + timedelta(days=30))
+        start = timezone.now() + timedelta(days=1)
+        self.ok, self.revoked = [
+            StudySession.objects.create(
+                user=self.user, subject=subject, topic=f"บทที่ {i}",
+                start_time=start + timedelta(hours=i), end_time=start + timedelta(hours=i + 1),
+            )
+            for i in range(2)
+        ]
+
+    @mock.patch('core.google_calendar.get_calendar_service')
+    @mock.patch('core.google_calendar.execute_in_batches')
+    def test_invalid_grant_keeps_events_already_created(self, execute, service):
+        execute.side_effect = [
+            {
+                str(self.ok.session_id): ({'id': 'event-1'}, None),
+                str(self.revoked.session_id): (None, Exception('invalid_grant: Token has been revoked')),
+            },
+            {},
+        ]
+        success, _ = sync_sessions_to_google(self.user)
+
+        self.assertFalse(success)
+        self.assertFalse(GoogleCredential.objects.filter(user=self.user).exists())
+        self.ok.refresh_from_db()
+        self.assertEqual((self.ok.google_event_id, self.ok.is_synced), ('event-1', True))
+        self.revoked.refresh_from_db()
+        self.assertFalse(self.revoked.is_synced)
+
+    @mock.patch('core.google_calendar.get_calendar_service')
+    def test_only_invalid_grant_deletes_credentials(self, service):
+        service.side_effect = OSError('connection reset')
+        success, _ = sync_sessions_to_google(self.user)
+        self.assertFalse(success)
+        self.assertTrue(GoogleCredential.objects.filter(user=self.user).exists())
+
+        service.side_effect = RefreshError('invalid_grant: Token has been expired or revoked.')
+        success, _ = sync_sessions_to_google(self.user)
+        self.assertFalse(success)
+        self.assertFalse(GoogleCredential.objects.filter(user=self.user).exists())
+
+    @mock.patch('core.google_calendar.BATCH_SIZE', 1)
+    @mock.patch('core.google_calendar.get_calendar_service')
+    def test_failed_batch_keeps_earlier_batches(self, service):
+        batches = []
+
+        def new_batch(callback):
+            batch = mock.Mock()
+            batch.add.side_effect = lambda request, request_id: batch.ids.append(request_id)
+            batch.ids = []
+            if batches:
+                batch.execute.side_effect = OSError('connection reset')
+            else:
+                batch.execute.side_effect = lambda: [callback(i, {'id': 'event-1'}, None) for i in batch.ids]
+            batches.append(batch)
+            return batch
+
+        service.return_value.new_batch_http_request.side_effect = new_batch
+        success, message = sync_sessions_to_google(self.user)
+
+        self.assertTrue(success)
+        self.assertIn('ไม่สำเร็จ 1', message)
+        synced = StudySession.objects.filter(user=self.user, is_synced=True)
+        self.assertEqual(list(synced.values_list('google_event_id', flat=True)), ['event-1'])
+
+
+class BlobNamingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_shared_content_is_stored_under_its_hash(self):
+        content = b'same lecture notes'
+        files = []
+        for name in ('alice-private-notes.TXT', 'bob.txt'):
+            user = CustomUser.objects.create_user(username=name, email=f"{name}@example.com", password='pw')
+            subject = Subject.objects.create(user=user, name='คณิต', exam_date=timezone.now() + timedelta(days=30))
+            files += add_files(subject, [SimpleUploadedFile(name, content, 'text/plain')])
+
+        expected = f"subject_materials/{hashlib.sha256(content).hexdigest()}.txt"
+        self.assertEqual([f.file.name for f in files], [expected, expected])
+        self.assertEqual([f.file_name for f in files], ['alice-private-notes.TXT', 'bob.txt'])
+
+
+class BlobRefcountTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = CustomUser.objects.create_user(username='sharer', email='sharer@example.com', password='pw')
+
+    def subject(self, name):
+        return Subject.objects.create(user=self.user, name=name, exam_date=timezone.now() + timedelta(days=30))
+
+    def test_blob_is_removed_with_its_last_file(self):
+        content = b'shared slides'
+        first, second = [
+            add_files(self.subject(name), [SimpleUploadedFile('slides.txt', content, 'text/plain')])[0]
+            for name in ('คณิต', 'ฟิสิกส์')
+        ]
+        blob = Blob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        path = os.path.join(self.media_root, blob.file.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(os.path.exists(path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.subject.delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_form_upload_is_hashed_while_it_is_received(self):
+        self.client.force_login(self.user)
+        for memory_size in (settings.FILE_UPLOAD_MAX_MEMORY_SIZE, 0): # 0 = เขียนลงไฟล์ชั่วคราว
+            content = f"lecture {memory_size}".encode()
+            with self.subTest(memory_size=memory_size), self.settings(FILE_UPLOAD_MAX_MEMORY_SIZE=memory_size), \
+                    mock.patch('core.blobs.hash_upload', side_effect=AssertionError('read twice')):
+                response = self.client.post(reverse('add_subject'), {
+                    'name': f"วิชา {memory_size}", 'difficulty': 2, 'exam_date': '2099-01-01T10:00',
+                    'files': SimpleUploadedFile('notes.txt', content, 'text/plain'),
+                }, secure=True)
+                self.assertEqual(response.status_code, 302)
+                self.assertTrue(Blob.objects.filter(content_hash=hashlib.sha256(content).hexdigest()).exists())
+
+
+class MediaGCTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        user = CustomUser.objects.create_user(username='collector', email='collector@example.com', password='pw')
+        subject = Subject.objects.create(user=user, name='คณิต', exam_date=timezone.now() + timedelta(days=30))
+        self.kept = add_files(subject, [SimpleUploadedFile('notes.txt', b'still used', 'text/plain')])[0].file.name
+        self.orphan = self.write('subject_materials/orphan.txt', age=timedelta(days=2))
+        self.fresh = self.write('uploads/in-progress/00000.part', age=timedelta(minutes=5))
+        os.utime(os.path.join(self.media_root, self.kept), (0, 0))
+
+    def write(self, name, age):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 2048)
+        mtime = (timezone.now() - age).timestamp()
+        os.utime(path, (mtime, mtime))
+        return name
+
+    def remaining(self):
+        return {name for name in (self.kept, self.orphan, self.fresh) if os.path.exists(os.path.join(self.media_root, name))}
+
+    def test_dry_run_reports_without_deleting(self):
+        out = io.StringIO()
+        call_command('gc_media', '--dry-run', stdout=out)
+        self.assertIn(self.orphan, out.getvalue())
+        self.assertIn('[dry-run] 1 orphaned files', out.getvalue())
+        self.assertEqual(self.remaining(), {self.kept, self.orphan, self.fresh})
+
+    def test_only_old_unreferenced_files_are_deleted(self):
+        out = io.StringIO()
+        call_command('gc_media', stdout=out)
+        self.assertIn('1 orphaned files (0.0 MB), 1 deleted', out.getvalue())
+        self.assertEqual(self.remaining(), {self.kept, self.fresh})
+
+
+class ProfileThumbnailTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = CustomUser.objects.create_user(username='pictured', email='pictured@example.com', password='pw')
+
+    def set_picture(self, data):
+        self.user.profile_picture.save('me.png', ContentFile(data))
+        return refresh_profile_thumbnails(self.user)
+
+    def test_square_thumbnails_are_generated_and_chosen_by_size(self):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (400, 200), (255, 0, 0, 128)).save(buffer, 'PNG')
+        thumbnails = self.set_picture(buffer.getvalue())
+
+        self.assertEqual(sorted(thumbnails, key=int), [str(size) for size in THUMBNAIL_SIZES])
+        storage = self.user.profile_picture.storage
+        for size, name in thumbnails.items():
+            with storage.open(name) as f, Image.open(f) as image:
+                self.assertEqual(image.size, (int(size), int(size)))
+        self.assertEqual(refresh_profile_thumbnails(self.user), thumbnails) # เนื้อหาเดิม ใช้ไฟล์เดิม
+
+        self.user.refresh_from_db()
+        self.assertEqual(thumbnail_url(self.user, 40), storage.url(thumbnails['80']))
+        self.assertEqual(thumbnail_url(self.user, 200), storage.url(thumbnails['320']))
+        self.assertEqual(thumbnail_url(self.user, 1000), storage.url(thumbnails['320']))
+
+    def test_unreadable_picture_falls_back_to_original(self):
+        self.assertEqual(self.set_picture(b'not an image'), {})
+        self.assertEqual(thumbnail_url(self.user, 40), self.user.profile_picture.url)
+        self.assertEqual(thumbnail_url(CustomUser(), 40), '')
+
+
+class ReorderFilesApiTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='sorter', email='sorter@example.com', password='pw')
+        self.subject = Subject.objects.create(user=self.user, name='คณิต', exam_date=timezone.now() + timedelta(days=30))
+        self.client.force_login(self.user)
+
+    def test_malformed_payload_is_rejected(self):
+        url = reverse('reorder_files', args=[self.subject.subject_id])
+        for body in ('[1]', '{"file_ids": 5}', '"file_ids"', '{}', 'not json'):
+            with self.subTest(body=body):
+                response = self.client.post(url, data=body, content_type='application/json', secure=True)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+
+
+def make_zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, text in members.items():
+            archive.writestr(name, text)
+    return buffer.getvalue()
+
+
+class ArchiveSizeLimitTests(TestCase):
+    docx = make_zip({'word/document.xml': '<w:p><w:t>' + 'ก' * 500 + '</w:t></w:p>'})
+    pptx = make_zip({f"ppt/slides/slide{i}.xml": '<a:p><a:t>' + 'ข' * 200 + '</a:t></a:p>' for i in (1, 2)})
+
+    def test_archives_under_the_limit_are_read(self):
+        self.assertIn('ก' * 500, EXTRACTORS['.docx'](self.docx))
+        self.assertIn('ข' * 200, EXTRACTORS['.pptx'](self.pptx))
+
+    @mock.patch('core.materials.MAX_XML_BYTES', 1000)
+    def test_oversized_xml_is_rejected_before_reading(self):
+        # docx: document.xml เดียวเกิน, pptx: แต่ละสไลด์ไม่เกินแต่รวมกันเกิน
+        with mock.patch.object(zipfile.ZipFile, 'read') as read:
+            for ext, data in (('.docx', self.docx), ('.pptx', self.pptx)):
+                with self.subTest(ext=ext), self.assertRaises(ValueError):
+                    EXTRACTORS[ext](data)
+            read.assert_not_called()
+
+
+class StartUploadApiTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='uploader', email='uploader@example.com', password='pw')
+        self.subject = Subject.objects.create(user=self.user, name='คณิต', exam_date=timezone.now() + timedelta(days=30))
+        self.client.force_login(self.user)
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def stored_materials(self):
+        path = os.path.join(self.media_root, 'subject_materials')
+        return sorted(os.listdir(path)) if os.path.isdir(path) else []
+
+    def upload_all(self, content):
+        upload = self.start(json.dumps({'file_name': 'a.txt', 'size': len(content), 'content_type': 'text/plain'})).json()
+        for index in upload['missing']:
+            chunk = content[index * upload['chunk_size']:(index + 1) * upload['chunk_size']]
+            response = self.client.put(f"{upload['chunk_url']}{index}/", chunk, content_type='application/octet-stream', secure=True)
+            self.assertEqual(response.status_code, 200)
+        return upload
+
+    def start(self, body):
+        return self.client.post(
+            reverse('start_upload', args=[self.subject.subject_id]), body,
+            content_type='application/json', secure=True,
+        )
+
+    def test_malformed_bodies_are_rejected(self):
+        for body in ('[1]', 'null', '"x"', '{"file_name": 5, "size": 10}',
+                     '{"file_name": "a.pdf", "size": 1e400}', '{"file_name": "a.pdf", "size": "big"}', 'not json'):
+            with self.subTest(body=body):
+                self.assertEqual(self.start(body).status_code, 400)
+
+    def test_oversized_file_is_rejected_before_upload(self):
+        response = self.start(json.dumps({'file_name': 'a.pdf', 'size': 50 * 1024 * 1024}))
+        self.assertEqual(response.status_code, 413)
+
+    def test_valid_request_starts_upload(self):
+        response = self.start(json.dumps({'file_name': 'a.pdf', 'size': 3 * 1024 * 1024, 'content_type': 'application/pdf'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['missing'], [0, 1, 2])
+
+    def test_chunks_are_assembled_into_subject_file(self):
+        upload = self.upload_all(b'x' * (UPLOAD_CHUNK_SIZE + 10))
+        response = self.client.post(upload['complete_url'], secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(File.objects.get(subject=self.subject).size_in_bytes, UPLOAD_CHUNK_SIZE + 10)
+        self.assertEqual(len(self.stored_materials()), 1)
+
+    def test_full_subject_stores_nothing_on_complete(self):
+        upload = self.upload_all(b'late file')
+        # วิชาเต็มจากหน้าเพิ่มวิชาระหว่างที่กำลังอัปโหลดอยู่
+        add_files(self.subject, [SimpleUploadedFile(f"{i}.txt", str(i).encode(), 'text/plain') for i in range(5)])
+        before = self.stored_materials()
+
+        response = self.client.post(upload['complete_url'], secure=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stored_materials(), before)
+
+    def test_failed_insert_removes_stored_blob(self):
+        with mock.patch.object(File.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                add_files(self.subject, [SimpleUploadedFile('a.txt', b'rolled back', 'text/plain')])
+        self.assertEqual(self.stored_materials(), [])
+        self.assertFalse(Blob.objects.exists())
+
+
+class QueryInspectorTests(TestCase):
+    def test_transaction_statements_are_not_n_plus_one(self):
+        for sql in ('BEGIN', 'SAVEPOINT "s1_x1"', 'RELEASE SAVEPOINT "s1_x1"', 'ROLLBACK TO SAVEPOINT "s1_x1"', 'COMMIT'):
+            self.assertIsNone(normalize_sql(sql))
+        self.assertEqual(normalize_sql('SELECT * FROM t WHERE id IN (%s, %s)'), 'SELECT * FROM t WHERE id IN (...)')
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """เรียกทุก URL ใน core/urls.py ด้วยข้อมูลหลายแถว (ให้ N+1 โผล่) แล้วตรวจกับ QUERY_BUDGETS"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.previous_provider = set_provider(FakeProvider())
+
+    @classmethod
+    def tearDownClass(cls):
+        set_provider(cls.previous_provider)
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        now = timezone.now()
+        self.user = CustomUser.objects.create_user(username='budget', email='budget@example.com', password='pw')
+        UserSettings.objects.create(user=self.user)
+        UserAvailability.objects.bulk_create(
+            UserAvailability(user=self.user, day_of_week=day, hour=hour) for day in range(7) for hour in (18, 19, 20)
+        )
+        self.subjects, self.sessions = [], []
+        for i in range(3):
+            subject = Subject.objects.create(user=self.user, name=f"วิชา {i}", exam_date=now + timedelta(days=14 + i))
+            add_files(subject, [SimpleUploadedFile(f"note{i}-{n}.txt", f"เนื้อหา {i} {n}".encode(), 'text/plain') for n in range(2)])
+            self.subjects.append(subject)
+            for k in range(4):
+                start = now + timedelta(days=k, hours=i)
+                session = StudySession.objects.create(
+                    user=self.user, subject=subject, topic=f"บทที่ {k}",
+                    start_time=start, end_time=start + timedelta(hours=1), is_completed=(k == 0),
+                )
+                StudySummary.objects.create(user=self.user, session=session, subject=subject, content=f"<p>สรุป {k}</p>")
+                self.sessions.append(session)
+        self.session = StudySession.objects.create(
+            user=self.user, subject=self.subjects[0], topic='บทที่ใหม่', start_time=now, end_time=now + timedelta(hours=1),
+        )
+        quiz = make_quiz('วิชา 0', 'บทที่ 0')
+        self.results = [
+            QuizResult.objects.create(user=self.user, session=self.sessions[0], quiz=quiz, user_answers=[0] * 5, score=1, total_questions=5)
+            for _ in range(3)
+        ]
+        self.notifications = [Notification.objects.create(recipient=self.user, message=f"แจ้งเตือน {i}") for i in range(3)]
+        self.client.force_login(self.user)
+        self.visited = set()
+
+    def check(self, method, name, args=(), **kwargs):
+        self.visited.add(name)
+        kwargs.setdefault('secure', True)
+        with self.subTest(view=name, method=method):
+            return self.assertWithinQueryBudget(method, reverse(name, args=args), **kwargs)
+
+    def test_every_view_is_budgeted(self):
+        self.assertAllViewsBudgeted()
+
+    @mock.patch('core.views.sync_sessions_to_google', return_value=(True, 'synced'))
+    @mock.patch('core.views.exchange_code_for_token')
+    @mock.patch('core.views.get_auth_url', return_value='https://accounts.google.com/o/oauth2/auth')
+    @mock.patch('google_auth_oauthlib.flow.Flow.from_client_secrets_file')
+    def test_every_view_within_budget(self, flow, *google_mocks):
+        flow.return_value.authorization_url.return_value = ('https://accounts.google.com/o/oauth2/auth', 'state')
+        session, subject = self.session, self.subjects[0]
+
+        self.check('get', 'home_page')
+        self.check('get', 'add_subject')
+        self.check('post', 'add_subject', data={
+            'name': 'วิชาใหม่', 'difficulty': 2, 'exam_date': '2099-01-01T10:00',
+            'files': [SimpleUploadedFile('new.txt', b'new material', 'text/plain')],
+        })
+        files = list(subject.subject_files.order_by('order'))
+        self.check('post', 'reorder_files', args=[subject.subject_id], content_type='application/json',
+                   data=json.dumps({'file_ids': [str(f.file_id) for f in reversed(files)]}))
+        self.check('get', 'delete_file', args=[files[0].file_id])
+
+        response = self.check('post', 'start_upload', args=[subject.subject_id], content_type='application/json',
+                              data=json.dumps({'file_name': 'big.txt', 'size': 11, 'content_type': 'text/plain'}))
+        upload_id = response.json()['upload_id']
+        self.check('get', 'upload_status', args=[upload_id])
+        self.check('put', 'upload_chunk', args=[upload_id, 0], data=b'hello world', content_type='application/octet-stream')
+        self.check('post', 'complete_upload', args=[upload_id])
+
+        self.check('get', 'set_schedule')
+        self.check('post', 'set_schedule', data={'hour_0_18': 'on', 'hour_1_19': 'on', 'hour_2_20': 'on'})
+        self.check('get', 'study_settings')
+        self.check('post', 'study_settings', data={'session_duration': 60, 'break_duration': 10})
+        session = StudySession.objects.filter(user=self.user, is_completed=False).first()
+
+        self.check('get', 'toggle_session_complete', args=[session.session_id])
+        self.check('get', 'start_studying', args=[session.session_id])
+        self.check('get', 'finished_studying', args=[session.session_id])
+        self.check('get', 'complete_session', args=[session.session_id])
+        self.check('get', 'get_session_summary', args=[session.session_id])
+        self.check('get', 'study_summary', args=[session.session_id])
+        self.check('get', 'summary_history')
+
+        response = self.check('get', 'get_session_quiz', args=[session.session_id])
+        self.check('post', 'submit_quiz', content_type='application/json', data=json.dumps({
+            'session_id': str(session.session_id), 'quiz_id': response.json()['quiz_id'], 'answers': [0, 1, 2, 3, 0],
+        }))
+        self.check('get', 'quiz_result', args=[self.results[0].result_id])
+        self.check('get', 'quiz_solution', args=[self.results[0].result_id])
+        job = BackgroundJob.objects.filter(user=self.user).first()
+        self.check('get', 'job_status', args=[job.job_id])
+
+        self.check('get', 'edit_profile')
+        self.check('post', 'edit_profile', data={
+            'first_name': 'ทดสอบ', 'last_name': 'งบ', 'email': self.user.email, 'session_duration': 60, 'break_duration': 10,
+        })
+        self.check('get', 'mark_notification_read', args=[self.notifications[0].notification_id])
+        self.check('post', 'submit_feedback', data={'category': 'other', 'message': 'ดีมาก', 'rating': 5})
+        self.check('get', 'google_auth_start')
+        self.check('get', 'google_auth_callback', data={'code': 'abc'})
+        self.check('get', 'sync_calendar')
+        self.check('get', 'delete_subject', args=[self.subjects[2].subject_id])
+        self.check('post', 'delete_subject', args=[self.subjects[2].subject_id])
+        self.check('get', 'logout')
+
+        # หน้าที่ไม่ต้อง Login
+        self.check('get', 'landing_page')
+        self.check('get', 'register')
+        self.check('post', 'register', data={
+            'username': 'newbie', 'email': 'newbie@example.com', 'password1': 'Sup3r-secret-pw', 'password2': 'Sup3r-secret-pw',
+        })
+        self.client.logout()
+        self.check('get', 'login')
+        self.check('post', 'login', data={'username': 'budget', 'password': 'pw'})
+        self.check('get', 'google_login_start')
+        self.check('get', 'google_login_callback', data={'code': 'abc', 'state': 'state'})
+
+        self.assertEqual(set(core_url_names()) - self.visited, set())
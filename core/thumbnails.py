@@ -0,0 +1,68 @@
+# core/thumbnails.py
+
+import hashlib
+import io
+import os
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+from .models import CustomUser
+
+# ขนาดรูปย่อ (px, สี่เหลี่ยมจัตุรัส) = 2 เท่าของขนาดที่แสดง เพื่อให้จอความละเอียดสูงยังคมชัด
+# 80 = รูปใน Navbar/Popup (40px), 320 = รูปในหน้าแก้ไขโปรไฟล์ (120-160px)
+THUMBNAIL_SIZES = (80, 320)
+THUMBNAIL_QUALITY = 80
+# WebP เล็กกว่า JPEG มาก แต่ Pillow บางเครื่องไม่ได้ Build มาพร้อม WebP
+THUMBNAIL_FORMAT, THUMBNAIL_EXT = ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def generate_thumbnails(picture):
+    """
+    สร้างรูปย่อทุกขนาดจากรูปต้นฉบับ (FieldFile) บันทึกไว้ข้างไฟล์ต้นฉบับ ชื่อไฟล์มี hash ของเนื้อหา
+    (รูปเปลี่ยน = URL เปลี่ยน Cache ได้นาน) คืนค่า dict {ขนาด: ชื่อไฟล์}
+    """
+    with picture.open('rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    stem = os.path.splitext(picture.name)[0]
+    storage = picture.storage
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image) # รูปจากมือถือที่หมุนไว้ด้วย EXIF
+        transparent = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+        image = image.convert('RGBA' if THUMBNAIL_FORMAT == 'WEBP' and transparent else 'RGB')
+        thumbnails = {}
+        for size in THUMBNAIL_SIZES:
+            name = f"{stem}_{digest}_{size}.{THUMBNAIL_EXT}"
+            if not storage.exists(name):
+                thumb = ImageOps.fit(image, (size, size), Image.LANCZOS)
+                buffer = io.BytesIO()
+                thumb.save(buffer, THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+                name = storage.save(name, ContentFile(buffer.getvalue()))
+            thumbnails[str(size)] = name
+    return thumbnails
+
+
+def refresh_profile_thumbnails(user):
+    """สร้างรูปย่อของรูปโปรไฟล์ปัจจุบันแล้วบันทึกลง user (ไม่มีรูป/เปิดรูปไม่ได้ = ล้างรูปย่อ ใช้รูปต้นฉบับแทน)"""
+    thumbnails = {}
+    if user.profile_picture:
+        try:
+            thumbnails = generate_thumbnails(user.profile_picture)
+        except Exception as e:
+            print(f"Error generating thumbnails for {user.profile_picture.name}: {e}")
+    CustomUser.objects.filter(pk=user.pk).update(profile_thumbnails=thumbnails)
+    user.profile_thumbnails = thumbnails
+    return thumbnails
+
+
+def thumbnail_url(user, size):
+    """URL ของรูปย่อขนาดเล็กที่สุดที่ไม่เล็กกว่า size (ไม่มีรูปย่อ = รูปต้นฉบับ, ไม่มีรูป = '')"""
+    if not user.profile_picture:
+        return ''
+    thumbnails = user.profile_thumbnails or {}
+    if not thumbnails:
+        return user.profile_picture.url
+    sizes = sorted(int(s) for s in thumbnails)
+    chosen = next((s for s in sizes if s >= size), sizes[-1])
+    return user.profile_picture.storage.url(thumbnails[str(chosen)])
@@ -0,0 +1,229 @@
+# core/uploads.py
+
+import datetime
+import hashlib
+import os
+import tempfile
+from django.core.files.storage import default_storage
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import transaction
+from django.utils import timezone
+
+from .blobs import discard_unreferenced
+from .file_ordering import MAX_FILES_PER_SUBJECT, add_files
+from .models import File, UploadSession
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024          # 1 MB ต่อส่วน (เน็ตหลุดเสียไม่เกินส่วนเดียว)
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024       # 10 MB เท่ากับหน้าเพิ่มวิชา
+UPLOAD_EXPIRY = datetime.timedelta(hours=24) # การอัปโหลดที่ค้างนานกว่านี้ถูกลบทิ้ง
+
+# นามสกุลที่รองรับ และ Byte แรกของไฟล์ที่ต้องตรงกัน (None = ไฟล์ข้อความ ตรวจว่าไม่ใช่ Binary)
+FILE_SIGNATURES = {
+    '.pdf': b'%PDF',
+    '.docx': b'PK\x03\x04',
+    '.pptx': b'PK\x03\x04',
+    '.txt': None,
+}
+
+
+class UploadError(Exception):
+    """คำขออัปโหลดไม่ถูกต้อง (ข้อความส่งกลับให้ผู้ใช้ได้เลย)"""
+    status = 400
+
+
+class UploadTooLarge(UploadError):
+    status = 413
+
+
+class _HashingMixin:
+    """
+    คำนวณ sha256 ระหว่างที่ Handler เขียนแต่ละส่วนลง Memory/ไฟล์ชั่วคราว
+    แล้วแนบไว้ที่ไฟล์เป็น content_hash (acquire_blob ใช้ค่านี้แทนการอ่านไฟล์ใหม่ทั้งไฟล์)
+    """
+
+    def new_file(self, *args, **kwargs):
+        self.digest = hashlib.sha256() # ตั้งก่อน super() เพราะ Memory handler จะ raise StopFutureHandlers
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        passed_on = super().receive_data_chunk(raw_data, start)
+        if passed_on is None: # Handler นี้เป็นคนเก็บข้อมูลส่วนนี้
+            self.digest.update(raw_data)
+        return passed_on
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.digest.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(_HashingMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(_HashingMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def chunk_storage():
+    """
+    Storage ที่ใช้เก็บส่วนของไฟล์ = Storage หลักของเว็บ
+    ยกเว้น Cloudinary ที่ต้องเก็บเป็น raw (Storage หลักอัปโหลดเป็นรูปภาพ ไฟล์ .part จะถูกปฏิเสธ)
+    """
+    if default_storage.__class__.__module__.startswith('cloudinary_storage'):
+        from cloudinary_storage.storage import RawMediaCloudinaryStorage # import เมื่อใช้ Cloudinary จริงเท่านั้น
+        return RawMediaCloudinaryStorage()
+    return default_storage
+
+
+def chunk_name(upload, index):
+    """ชื่อที่ขอให้ Storage ใช้ (ชื่อจริงอาจต่างออกไป ดู UploadSession.parts)"""
+    return f"uploads/{upload.upload_id}/{index:05d}.part"
+
+
+def expected_chunk_size(upload, index):
+    if index == upload.total_chunks - 1:
+        return upload.size_in_bytes - index * upload.chunk_size
+    return upload.chunk_size
+
+
+def start_upload(user, subject, file_name, size, content_type=''):
+    """
+    เริ่มอัปโหลด (ตรวจนามสกุล/ขนาด/โควต้าก่อนรับข้อมูลจริง)
+    ถ้ามีการอัปโหลดไฟล์เดียวกันค้างอยู่ คืนอันเดิมเพื่ออัปโหลดต่อ
+    """
+    if not isinstance(file_name, str):
+        raise UploadError('ต้องระบุชื่อไฟล์')
+    file_name = os.path.basename(file_name).strip()
+    if len(file_name) > 255:
+        raise UploadError('ชื่อไฟล์ยาวเกินไป')
+    ext = os.path.splitext(file_name)[1].lower()
+    if ext not in FILE_SIGNATURES:
+        raise UploadError(f"ไม่รองรับไฟล์ {file_name} (รองรับเฉพาะ .pdf, .docx, .pptx, .txt)")
+    try:
+        size = int(size)
+    except (TypeError, ValueError, OverflowError):
+        raise UploadError('ต้องระบุขนาดไฟล์')
+    if size <= 0:
+        raise UploadError(f"ไฟล์ {file_name} ว่างเปล่า")
+    if size > MAX_UPLOAD_SIZE:
+        raise UploadTooLarge(f"ไฟล์ {file_name} มีขนาดใหญ่เกิน 10MB")
+
+    existing = UploadSession.objects.filter(
+        user=user, subject=subject, file_name=file_name, size_in_bytes=size
+    ).first()
+    if existing:
+        return existing
+
+    pending = UploadSession.objects.filter(subject=subject).count()
+    if File.objects.filter(subject=subject).count() + pending >= MAX_FILES_PER_SUBJECT:
+        raise UploadError(f"อัปโหลดได้สูงสุด {MAX_FILES_PER_SUBJECT} ไฟล์ต่อวิชา")
+
+    return UploadSession.objects.create(
+        user=user, subject=subject, file_name=file_name,
+        file_type=(content_type or 'application/octet-stream')[:255],
+        size_in_bytes=size, chunk_size=UPLOAD_CHUNK_SIZE,
+    )
+
+
+def check_chunk_header(upload, index, content_length):
+    """ตรวจ index/ขนาดจาก Header ก่อนอ่าน Body (ส่วนที่ผิดถูกปฏิเสธโดยไม่ต้องรับข้อมูล)"""
+    if not 0 <= index < upload.total_chunks:
+        raise UploadError(f"ส่วนที่ {index} เกินจำนวนส่วนของไฟล์ ({upload.total_chunks})")
+    expected = expected_chunk_size(upload, index)
+    if content_length > expected:
+        raise UploadTooLarge(f"ส่วนที่ {index} ต้องมีขนาด {expected} bytes")
+    if content_length != expected:
+        raise UploadError(f"ส่วนที่ {index} ต้องมีขนาด {expected} bytes")
+
+
+def save_chunk(upload, index, data):
+    """บันทึกส่วนที่ index ลง Storage ทันที (ส่งซ้ำได้ ส่วนเดิมถูกเขียนทับ)"""
+    check_chunk_header(upload, index, len(data))
+    if index == 0:
+        signature = FILE_SIGNATURES[os.path.splitext(upload.file_name)[1].lower()]
+        if signature is None and b'\x00' in data:
+            raise UploadError(f"ไฟล์ {upload.file_name} ไม่ใช่ไฟล์ข้อความ")
+        if signature is not None and not data.startswith(signature):
+            raise UploadError(f"เนื้อหาไฟล์ {upload.file_name} ไม่ตรงกับนามสกุล")
+
+    name = chunk_storage().save(chunk_name(upload, index), ContentFile(data))
+
+    with transaction.atomic():
+        upload = UploadSession.objects.select_for_update().get(pk=upload.pk)
+        replaced = upload.parts.get(str(index))
+        upload.parts[str(index)] = name
+        upload.save(update_fields=['parts', 'updated_at'])
+        if replaced and replaced != name:
+            # ส่งส่วนเดิมซ้ำ ลบไฟล์ของครั้งก่อนทิ้ง
+            transaction.on_commit(lambda: _delete_chunks([replaced]))
+    return upload
+
+
+def missing_chunks(upload):
+    return [i for i in range(upload.total_chunks) if str(i) not in upload.parts]
+
+
+def _delete_chunks(names):
+    storage = chunk_storage()
+    for name in names:
+        storage.delete(name)
+
+
+def complete_upload(upload):
+    """
+    รวมทุกส่วนเป็นไฟล์เดียว (คำนวณ hash ระหว่างรวม) แล้วบันทึกเป็น File ของวิชา
+    คืนค่า File ที่สร้าง
+    """
+    missing = missing_chunks(upload)
+    if missing:
+        raise UploadError(f"ยังขาดส่วนที่ {', '.join(map(str, missing[:10]))}")
+
+    # ตรวจโควต้าก่อนรวมไฟล์/เขียนลง Storage (วิชาอาจเต็มจากหน้าเพิ่มวิชาระหว่างที่อัปโหลดอยู่)
+    if File.objects.filter(subject=upload.subject).count() >= MAX_FILES_PER_SUBJECT:
+        raise UploadError(f"อัปโหลดได้สูงสุด {MAX_FILES_PER_SUBJECT} ไฟล์ต่อวิชา")
+
+    names = [upload.parts[str(index)] for index in range(upload.total_chunks)]
+    storage = chunk_storage()
+    digest = hashlib.sha256()
+    with tempfile.SpooledTemporaryFile(max_size=UPLOAD_CHUNK_SIZE) as assembled:
+        for name in names:
+            with storage.open(name, 'rb') as part:
+                for block in iter(lambda: part.read(64 * 1024), b''):
+                    digest.update(block)
+                    assembled.write(block)
+        if assembled.tell() != upload.size_in_bytes:
+            raise UploadError('ขนาดไฟล์ที่ได้รับไม่ตรงกับที่แจ้งไว้')
+        assembled.seek(0)
+
+        content = UploadedFile(
+            file=assembled, name=upload.file_name,
+            content_type=upload.file_type, size=upload.size_in_bytes,
+        )
+        created = []
+        try:
+            with transaction.atomic():
+                # add_files นับเฉพาะ File ที่บันทึกแล้ว (โควต้าของการอัปโหลดนี้ถูกจองไว้ตั้งแต่ start_upload)
+                created = add_files(upload.subject, [content], content_hashes=[digest.hexdigest()])
+                if not created:
+                    raise UploadError(f"อัปโหลดได้สูงสุด {MAX_FILES_PER_SUBJECT} ไฟล์ต่อวิชา")
+                upload.delete()
+                transaction.on_commit(lambda: _delete_chunks(names))
+        except Exception:
+            # Rollback แล้ว ไฟล์ที่ add_files เพิ่งเขียนลง Storage ต้องลบทิ้งเอง
+            discard_unreferenced([f.file.name for f in created])
+            raise
+
+    return created[0]
+
+
+def purge_expired_uploads(max_age=UPLOAD_EXPIRY):
+    """ลบการอัปโหลดที่ค้างไว้นานเกิน max_age พร้อมส่วนที่เก็บไว้ใน Storage คืนค่าจำนวนที่ลบ"""
+    expired = list(UploadSession.objects.filter(updated_at__lt=timezone.now() - max_age))
+    for upload in expired:
+        _delete_chunks(upload.parts.values())
+        upload.delete()
+    return len(expired)
@@ -16,6 +16,11 @@ urlpatterns = [
     path('add-subject/', views.add_subject_view, name='add_subject'),
     path('delete-subject/<uuid:subject_id>/', views.delete_subject_view, name='delete_subject'),
     path('delete-file/<uuid:file_id>/', views.delete_file_view, name='delete_file'),
+    path('api/subjects/<uuid:subject_id>/reorder-files/', views.reorder_files_api, name='reorder_files'),
+    path('api/subjects/<uuid:subject_id>/uploads/', views.start_upload_api, name='start_upload'),
+    path('api/uploads/<uuid:upload_id>/', views.upload_status_api, name='upload_status'),
+    path('api/uploads/<uuid:upload_id>/chunks/<int:index>/', views.upload_chunk_api, name='upload_chunk'),
+    path('api/uploads/<uuid:upload_id>/complete/', views.complete_upload_api, name='complete_upload'),
     path('set-schedule/', views.set_schedule_view, name='set_schedule'),
     path('study-settings/', views.study_settings_view, name='study_settings'),
     path('toggle-session/<uuid:session_id>/', toggle_session_complete, name='toggle_session_complete'),
@@ -32,6 +37,8 @@ urlpatterns = [
     path('api/submit-quiz/', views.submit_quiz_view, name='submit_quiz'),
     path('quiz-result/<uuid:result_id>/', views.quiz_result_view, name='quiz_result'),
     path('quiz-solution/<uuid:result_id>/', views.quiz_solution_view, name='quiz_solution'),
+    # Background job URL
+    path('api/job-status/<uuid:job_id>/', views.job_status_view, name='job_status'),
     path('logout/', logout_view, name='logout'),
     # Google Calendar Integration URLs
     path('google/login/', views.google_auth_start, name='google_auth_start'),
@@ -3,29 +3,34 @@
 from datetime import timedelta, datetime
 import json
 import os
+from django.core.exceptions import ValidationError
 from django.http import JsonResponse
 from django.urls import reverse
 from django.utils import timezone # ใช้ timezone
 from django.shortcuts import get_object_or_404, render, redirect
-from django.contrib.auth import login, authenticate, logout
+from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from datetime import timedelta, datetime, date
 from django.contrib import messages
 from django.db.models import Count, Q
-from django.views.decorators.http import require_POST
-from google_auth_oauthlib.flow import Flow
-from google_auth_oauthlib.flow import Flow
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+from django.views.decorators.http import require_http_methods, require_POST
 from django.contrib.auth import login
 from django.conf import settings
 
-from core.google_calendar import delete_event_from_google, exchange_code_for_token, get_auth_url, sync_sessions_to_google
+from core.google_calendar import delete_events_from_google, exchange_code_for_token, get_auth_url, sync_sessions_to_google
 from smart_study_planner import settings
 
 from .forms import CustomUserCreationForm, CustomAuthenticationForm, FeedbackForm, SubjectForm, UserSettingsForm, UserUpdateForm
-from .models import CustomUser, File, Notification, QuizResult, StudySummary, Subject, UserAvailability, UserSettings, StudySession
-from .ai_service import generate_content_summary, generate_quiz_questions, generate_study_schedule
+from .models import BackgroundJob, CustomUser, File, GeneratedQuiz, IssuedQuiz, Notification, QuizResult, StudySummary, Subject, UploadSession, UserAvailability, UserSettings, StudySession
+from .calendar_grid import build_calendar_grid
+from .dashboard import get_dashboard_stats
+from .file_ordering import add_files, reorder_files
+from .materials import rebuild_subject_index
+from .progress import get_progress, rebuild_progress, session_bucket, update_progress
+from .uploads import UploadError, check_chunk_header, complete_upload, missing_chunks, save_chunk, start_upload
+from .jobs import enqueue_job
+from .quizzes import grade
+from .thumbnails import refresh_profile_thumbnails
 
 # ตั้งค่า Path (ใช้ตัวเดียวกับที่มีอยู่)
 # CLIENT_SECRETS_FILE = os.path.join(settings.BASE_DIR, "client_secret.json")
@@ -54,6 +59,8 @@ def landing_page_view(request):
 
 def google_login_start(request):
     """ส่งผู้ใช้ไปหน้า Google Login"""
+    from google_auth_oauthlib.flow import Flow # โหลด SDK เฉพาะตอนใช้ (ไม่ให้ Worker เริ่มช้า)
+
     flow = Flow.from_client_secrets_file(
         CLIENT_SECRETS_FILE,
         scopes=LOGIN_SCOPES,
@@ -68,6 +75,10 @@ def google_login_start(request):
 
 def google_login_callback(request):
     """รับ Code จาก Google และทำการ Login/Register"""
+    from google_auth_oauthlib.flow import Flow
+    from google.oauth2 import id_token
+    from google.auth.transport import requests as google_requests
+
     state = request.session.get('google_oauth_state')
     
     try:
@@ -147,11 +158,9 @@ def login_view(request):
     if request.method == 'POST':
         form = CustomAuthenticationForm(request, data=request.POST)
         if form.is_valid():
-            email = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password')
+            # form.is_valid() ตรวจรหัสผ่านไปแล้ว ใช้ผู้ใช้จากฟอร์มเลย ไม่ต้อง authenticate (Hash รหัสผ่าน) ซ้ำ
+            user = form.get_user()
 
-            user = authenticate(request, username=email, password=password)
-            
             if user is not None:
                 login(request, user)
                 return redirect('home_page')
@@ -185,7 +194,6 @@ def homepage_view(request):
     # สูตร: current_date - timedelta(days=current_date.isoweekday() % 7)
     # ใส่ int() ครอบ current_date.strftime("%w")
     start_of_week = current_date - timedelta(days=int(current_date.strftime("%w")))
-    end_of_week = start_of_week + timedelta(days=6)
 
     # สร้าง List วันที่ในสัปดาห์ (อาทิตย์ - เสาร์) เพื่อใช้ทำหัวตาราง
     week_dates = []
@@ -193,61 +201,37 @@ def homepage_view(request):
         day = start_of_week + timedelta(days=i)
         week_dates.append(day)
 
-    # ดึงข้อมูล Session ในสัปดาห์นั้นมา
+    # ดึงข้อมูล Session ที่คาบเกี่ยวกับสัปดาห์นั้น (รวม Session ที่ข้ามเที่ยงคืนเข้ามา)
+    week_start_dt = timezone.make_aware(datetime.combine(start_of_week, datetime.min.time()))
+    week_end_dt = week_start_dt + timedelta(days=7)
     weekly_sessions = StudySession.objects.filter(
         user=user,
-        start_time__date__gte=start_of_week,
-        start_time__date__lte=end_of_week
-    )
+        start_time__lt=week_end_dt,
+        end_time__gt=week_start_dt
+    ).select_related('subject') # ใช้ชื่อวิชาในตาราง (กัน N+1)
 
-    # สร้างตาราง Grid (Time Slots) ตั้งแต่ 06:00 - 23:00 (ปรับช่วงเวลาได้ตามต้องการ)
-    hours_range = range(1, 24) # 6 โมงเช้า ถึง เที่ยงคืน
-    calendar_grid = []
-
-    for hour in hours_range:
-        row = {'hour': f"{hour:02d}:00", 'days': []}
-        for day in week_dates:
-            # หาวิชาที่เรียนในวันนั้น และ ชั่วโมงนั้น
-            # หมายเหตุ: Logic นี้แบบง่าย เช็คเฉพาะชั่วโมงเริ่มต้น
-            sessions_in_slot = []
-            for s in weekly_sessions:
-                # แปลงเป็น local time ก่อนเทียบ
-                local_start = timezone.localtime(s.start_time)
-                if local_start.date() == day and local_start.hour == hour:
-                    sessions_in_slot.append(s)
-            
-            row['days'].append({
-                'date': day,
-                'sessions': sessions_in_slot
-            })
-        calendar_grid.append(row)
+    # สร้างตาราง Grid (Time Slots) ในรอบเดียว: จัด Session ลงช่อง (วัน, ชั่วโมง) ก่อน แล้วค่อยประกอบแถว
+    calendar_grid = build_calendar_grid(weekly_sessions, week_dates)
 
-    today_sessions = StudySession.objects.filter(user=user, start_time__date=today).order_by('start_time')
-    total_today = today_sessions.count()
-    completed_today = today_sessions.filter(is_completed=True).count()
-    
-    daily_progress = int((completed_today / total_today) * 100) if total_today > 0 else 0
+    # 1. Session ของวันนี้ (ดึงครั้งเดียว แล้วหา next_session จาก List)
+    today_start = timezone.make_aware(datetime.combine(today, datetime.min.time()))
+    today_sessions = list(StudySession.objects.filter(
+        user=user,
+        start_time__gte=today_start,
+        start_time__lt=today_start + timedelta(days=1)
+    ).select_related('subject').order_by('start_time'))
+    next_session = next((s for s in today_sessions if not s.is_completed), None)
 
-    next_session = today_sessions.filter(is_completed=False).first()
-    
-    # 2. ข้อมูลตารางเรียนทั้งหมด (Upcoming)
-    upcoming_sessions = StudySession.objects.filter(
-        user=user, 
-        start_time__gte=now - timedelta(days=1) 
-    ).order_by('start_time')[:20] 
-
-    # 3. ข้อมูลสถิติ
-    all_subjects = Subject.objects.filter(user=user).annotate(
+    # 2. ข้อมูลสถิติ (นับทั้งหมดใน Query เดียว และ Cache ไว้จนกว่าข้อมูลจะเปลี่ยน)
+    stats = get_dashboard_stats(user, today)
+
+    # 3. รายวิชา + วันสอบที่ใกล้เข้ามา (ใช้ Query เดียวกัน)
+    all_subjects = list(Subject.objects.filter(user=user).annotate(
         file_count=Count('subject_files')
-    ).order_by('name')
-    
-    total_subjects = all_subjects.count()
-    total_plans = StudySession.objects.filter(user=user).count()
-    
-    completed_all = StudySession.objects.filter(user=user, is_completed=True).count()
-    readiness_score = int((completed_all / total_plans) * 100) if total_plans > 0 else 0
+    ).order_by('name'))
+    total_subjects = len(all_subjects)
 
-    upcoming_exams = Subject.objects.filter(user=user, exam_date__gte=now).order_by('exam_date')
+    upcoming_exams = sorted((s for s in all_subjects if s.exam_date >= now), key=lambda s: s.exam_date)
     exams_data = []
     for subject in upcoming_exams:
         days_left = (subject.exam_date.date() - today).days
@@ -256,7 +240,7 @@ def homepage_view(request):
     context = {
         'user': user,
         'today_sessions': today_sessions,
-        'daily_progress': daily_progress,
+        'daily_progress': stats['daily_progress'],
         'next_session': next_session,
         # ส่งข้อมูล Calendar ไปใหม่
         'calendar_grid': calendar_grid, 
@@ -265,8 +249,8 @@ def homepage_view(request):
         # ข้อมูลเดิม
         'total_subjects': total_subjects,
         'all_subjects': all_subjects, # ✅ ส่งตัวแปรนี้เพิ่มเข้าไป
-        'total_plans': total_plans,
-        'readiness_score': readiness_score,
+        'total_plans': stats['total_plans'],
+        'readiness_score': stats['readiness_score'],
         'exams_data': exams_data,
     }
     return render(request, 'core/home_page.html', context)
@@ -284,25 +268,10 @@ def add_subject_view(request):
             subject.user = request.user
             subject.save()
 
-            # 2. จัดการไฟล์
-            files = request.FILES.getlist('files')
-            
-            # เช็คโควต้าว่าถ้ารวมของเดิมแล้วเกิน 5 ไหม (เผื่อในอนาคตมี Edit)
-            current_files_count = File.objects.filter(subject=subject).count()
-            
-            for index, f in enumerate(files):
-                if current_files_count + index + 1 > 5:
-                    break # หยุดถ้าเกิน 5
-
-                # สร้าง File object
-                File.objects.create(
-                    subject=subject,
-                    file=f,
-                    file_name=f.name,
-                    file_type=f.content_type,
-                    size_in_bytes=f.size,
-                    order=index + 1 # ลำดับเริ่มที่ 1
-                )
+            # 2. จัดการไฟล์ (บันทึกทั้งหมดใน INSERT เดียว ไม่เกิน 5 ไฟล์ต่อวิชา)
+            if add_files(subject, request.FILES.getlist('files')):
+                # อ่านข้อความจากไฟล์ไว้ครั้งเดียว ใช้ประกอบการสรุป/ออกข้อสอบภายหลัง
+                enqueue_job(request.user, 'index_materials', {'subject_id': str(subject.subject_id)})
             
             return redirect('add_subject')
     else:
@@ -319,12 +288,14 @@ def delete_subject_view(request, subject_id):
     subject = get_object_or_404(Subject, subject_id=subject_id, user=request.user)
     if request.method == 'POST':
         # --- ✅ เพิ่ม: ตามลบ Event ใน Google ของวิชานี้ ---
-        related_sessions = StudySession.objects.filter(subject=subject)
-        for session in related_sessions:
-            if session.google_event_id:
-                delete_event_from_google(request.user, session.google_event_id)
+        event_ids = StudySession.objects.filter(
+            subject=subject, google_event_id__isnull=False
+        ).values_list('google_event_id', flat=True)
+        delete_events_from_google(request.user, list(event_ids))
 
         subject.delete()
+        # แถวสรุปของวิชาถูกลบตามไปแล้ว คำนวณยอดรวมของผู้ใช้ใหม่
+        rebuild_progress(request.user)
         return redirect('add_subject')
     return redirect('add_subject')
 
@@ -332,21 +303,109 @@ def delete_subject_view(request, subject_id):
 def delete_file_view(request, file_id):
     # 1. ดึงไฟล์ที่ต้องการลบ (เช็ค user เพื่อความปลอดภัย)
     file_obj = get_object_or_404(File, file_id=file_id, subject__user=request.user)
-    subject = file_obj.subject
     
     # 2. ลบไฟล์ (ไฟล์จริงจะหายไปเพราะ Django จัดการให้ หรือต้องใช้ Library cleanup)
+    # ไฟล์ที่เหลือไม่ต้องรันเลขใหม่ ลำดับเว้นช่องได้ (ดู file_ordering.ORDER_GAP)
     file_obj.delete()
-    
-    # 3. Reorder Logic: เรียงลำดับไฟล์ที่เหลือใหม่
-    remaining_files = File.objects.filter(subject=subject).order_by('uploaded_at') # เรียงตามเวลาที่อัป
-    
-    for index, f in enumerate(remaining_files):
-        f.order = index + 1 # รันเลขใหม่เริ่มจาก 1
-        f.save()
-        
+    rebuild_subject_index(file_obj.subject_id) # Chunk ของไฟล์ถูกลบตามไปแล้ว
+
     messages.success(request, 'ลบไฟล์เรียบร้อยแล้ว')
     return redirect('add_subject')
 
+@login_required
+@require_POST
+def reorder_files_api(request, subject_id):
+    """
+    API เรียงลำดับไฟล์ของวิชา (ลากวางในหน้าเว็บแล้วส่งมาได้เลย ไม่ต้องโหลดหน้าใหม่)
+    รับ JSON {"file_ids": [...]} ตามลำดับใหม่ ต้องมีครบทุกไฟล์ของวิชา
+    """
+    subject = get_object_or_404(Subject, subject_id=subject_id, user=request.user)
+    try:
+        data = json.loads(request.body)
+        file_ids = data.get('file_ids') if isinstance(data, dict) else None
+        if not isinstance(file_ids, list):
+            raise ValueError('file_ids must be a list')
+        files = reorder_files(subject, file_ids)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'files': [{'file_id': str(f.file_id), 'file_name': f.file_name, 'order': f.order} for f in files],
+    })
+
+def _upload_status(upload):
+    return {
+        'success': True,
+        'upload_id': str(upload.upload_id),
+        'chunk_size': upload.chunk_size,
+        'total_chunks': upload.total_chunks,
+        'missing': missing_chunks(upload),
+        # หน้าเว็บต่อท้าย chunk_url ด้วย "<index>/" เอง
+        'chunk_url': reverse('upload_chunk', args=[upload.upload_id, 0])[:-len('0/')],
+        'complete_url': reverse('complete_upload', args=[upload.upload_id]),
+    }
+
+@login_required
+@require_POST
+def start_upload_api(request, subject_id):
+    """
+    API เริ่มอัปโหลดไฟล์ใหญ่ทีละส่วน รับ JSON {"file_name", "size", "content_type"}
+    ตรวจนามสกุล/ขนาด/โควต้าก่อนส่งข้อมูลจริง ถ้าเคยเริ่มไฟล์เดิมไว้จะได้ upload_id เดิมพร้อมส่วนที่ยังขาด
+    """
+    subject = get_object_or_404(Subject, subject_id=subject_id, user=request.user)
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise UploadError('Invalid request')
+        content_type = data.get('content_type')
+        upload = start_upload(
+            request.user, subject, data.get('file_name'), data.get('size'),
+            content_type if isinstance(content_type, str) else '',
+        )
+    except UploadError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=e.status)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
+    return JsonResponse(_upload_status(upload))
+
+@login_required
+def upload_status_api(request, upload_id):
+    """API ดูว่ายังขาดส่วนไหน (ใช้ตอนเน็ตหลุดแล้วกลับมาอัปโหลดต่อ)"""
+    upload = get_object_or_404(UploadSession, upload_id=upload_id, user=request.user)
+    return JsonResponse(_upload_status(upload))
+
+@login_required
+@require_http_methods(['PUT'])
+def upload_chunk_api(request, upload_id, index):
+    """
+    API รับข้อมูลส่วนที่ index (Body = Byte ของส่วนนั้น) เขียนลง Storage ทันที
+    ขนาดตรวจจาก Content-Length ก่อนอ่าน Body ส่วนที่ผิดถูกปฏิเสธโดยไม่ต้องรับข้อมูล
+    """
+    upload = get_object_or_404(UploadSession, upload_id=upload_id, user=request.user)
+    try:
+        check_chunk_header(upload, index, int(request.META.get('CONTENT_LENGTH') or 0))
+        upload = save_chunk(upload, index, request.body)
+    except UploadError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=e.status)
+    return JsonResponse(_upload_status(upload))
+
+@login_required
+@require_POST
+def complete_upload_api(request, upload_id):
+    """API รวมทุกส่วนเป็นไฟล์ของวิชา (ต้องส่งครบทุกส่วนแล้ว)"""
+    upload = get_object_or_404(UploadSession.objects.select_related('subject'), upload_id=upload_id, user=request.user)
+    try:
+        file_obj = complete_upload(upload)
+    except UploadError as e:
+        return JsonResponse({'success': False, 'error': str(e), 'missing': missing_chunks(upload)}, status=e.status)
+
+    enqueue_job(request.user, 'index_materials', {'subject_id': str(upload.subject_id)})
+    return JsonResponse({
+        'success': True,
+        'file': {'file_id': str(file_obj.file_id), 'file_name': file_obj.file_name, 'order': file_obj.order},
+    })
+
 # @login_required
 # def set_schedule_view(request):
 #     existing_slots = UserAvailability.objects.filter(user=request.user)
@@ -470,17 +529,17 @@ def study_settings_view(request):
     if request.method == 'POST':
         form = UserSettingsForm(request.POST, instance=settings)
         if form.is_valid():
-            user_settings = form.save() # บันทึกค่า settings ก่อน
+            form.save() # บันทึกค่า settings ก่อน
             
-            # --- เริ่มกระบวนการ AI ---
-            # messages.info(request, 'กำลังประมวลผลและสร้างตารางเรียนด้วย AI กรุณารอสักครู่...')
-            
-            success = generate_study_schedule(request.user, user_settings)
-            
-            if success:
+            # --- เริ่มกระบวนการสร้างตาราง (ส่งเข้าคิว ไม่ต้องรอใน Request) ---
+            job = enqueue_job(request.user, 'schedule')
+
+            if job.status == 'done' and job.result.get('success'):
                 messages.success(request, 'สร้างตารางเรียนเรียบร้อยแล้ว!')
-            else:
+            elif job.status in ('done', 'failed'):
                 messages.warning(request, 'บันทึกการตั้งค่าแล้ว แต่เกิดข้อผิดพลาดในการสร้างตาราง (อาจไม่มีข้อมูลวิชา หรือ AI มีปัญหา)')
+            else:
+                messages.info(request, 'บันทึกการตั้งค่าแล้ว กำลังสร้างตารางเรียน ระบบจะแจ้งเตือนเมื่อเสร็จ')
             
             return redirect('home_page')
     else:
@@ -496,12 +555,13 @@ def toggle_session_complete(request, session_id):
     session = get_object_or_404(StudySession, session_id=session_id, user=request.user)
     session.is_completed = not session.is_completed
     session.save()
+    update_progress(request.user.pk, [session_bucket(session)])
     return redirect('home_page')
 
 @login_required
 def start_studying_view(request, session_id):
-    # ดึงข้อมูล Session ที่จะเรียน
-    session = get_object_or_404(StudySession, session_id=session_id, user=request.user)
+    # ดึงข้อมูล Session ที่จะเรียน (พร้อมวิชา เพราะหน้าเว็บแสดงชื่อ/ความยาก)
+    session = get_object_or_404(StudySession.objects.select_related('subject'), session_id=session_id, user=request.user)
     
     # ดึงการตั้งค่า (เพื่อเอาเวลาพัก)
     settings, _ = UserSettings.objects.get_or_create(user=request.user)
@@ -509,9 +569,8 @@ def start_studying_view(request, session_id):
     # คำนวณระยะเวลาเรียนเป็นนาที
     duration = (session.end_time - session.start_time).total_seconds() / 60
     
-    # (Optional) คำนวณความคืบหน้าของวิชานี้ (สมมติ)
-    # อาจจะดึงจาก ProgressAnalytic หรือคำนวณสดๆ ก็ได้
-    subject_progress = 0 # ใส่ Logic คำนวณจริงตรงนี้ถ้ามี
+    # ความคืบหน้าของวิชานี้ (อ่านจากแถวสรุปของวิชา ไม่ต้องนับ Session ใหม่)
+    subject_progress = int(get_progress(request.user, subject=session.subject).completion_percentage)
     
     context = {
         'session': session,
@@ -527,13 +586,14 @@ def complete_session_view(request, session_id):
     session = get_object_or_404(StudySession, session_id=session_id, user=request.user)
     session.is_completed = True
     session.save()
+    update_progress(request.user.pk, [session_bucket(session)])
     
     # 2. Redirect ไปยังหน้าแสดงผลลัพธ์ (Finished Page)
     return redirect('finished_studying', session_id=session.session_id)
 
 @login_required
 def finished_studying_view(request, session_id):
-    session = get_object_or_404(StudySession, session_id=session_id, user=request.user)
+    session = get_object_or_404(StudySession.objects.select_related('subject'), session_id=session_id, user=request.user)
     settings, _ = UserSettings.objects.get_or_create(user=request.user)
     
     # คำนวณระยะเวลา (นาที)
@@ -555,24 +615,19 @@ def get_session_summary(request, session_id):
         try:
             session = get_object_or_404(StudySession, session_id=session_id, user=request.user)
             
-            # 1. เช็คว่ามีสรุปเดิมอยู่แล้วไหม
-            summary_obj, created = StudySummary.objects.get_or_create(
-                session=session,
-                defaults={
-                    'user': request.user,
-                    'subject': session.subject,
-                    'content': ''
-                }
-            )
-
-            # 2. ถ้ายังไม่มีเนื้อหา ให้เรียก AI สร้างใหม่และบันทึก
-            if not summary_obj.content:
-                ai_content = generate_content_summary(session.subject.name, session.topic)
-                summary_obj.content = ai_content
-                summary_obj.save()
-            
-            # 3. ส่งผลลัพธ์กลับว่า "เสร็จแล้ว" (ไม่ต้องส่ง content กลับไป เพราะเดี๋ยวจะ redirect ไปดูหน้าเต็ม)
-            return JsonResponse({'success': True})
+            # 1-2. ถ้ามีสรุปที่มีเนื้อหาแล้ว ส่งผลลัพธ์กลับว่า "เสร็จแล้ว" (ไม่ต้องส่ง content กลับไป เพราะเดี๋ยวจะ redirect ไปดูหน้าเต็ม)
+            # แถวสรุปยังไม่ต้องสร้างตรงนี้ งาน summary จะสร้างให้เอง
+            if StudySummary.objects.filter(session=session).exclude(content='').exists():
+                return JsonResponse({'success': True, 'status': 'done'})
+
+            # 3. ถ้ายังไม่มีเนื้อหา ส่งงานให้ AI สรุปเข้าคิว แล้วให้หน้าเว็บ poll สถานะเอง
+            job = enqueue_job(request.user, 'summary', {'session_id': str(session.session_id)})
+            return JsonResponse({
+                'success': job.status != 'failed',
+                'status': job.status,
+                'job_id': str(job.job_id),
+                'error': job.error,
+            })
 
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
@@ -587,7 +642,7 @@ def study_summary_view(request, session_id):
     session = get_object_or_404(StudySession, session_id=session_id, user=request.user)
     
     # 1. เช็คว่ามีสรุปอยู่แล้วหรือไม่?
-    summary_obj, created = StudySummary.objects.get_or_create(
+    summary_obj, created = StudySummary.objects.select_related('subject', 'session').get_or_create(
         session=session,
         defaults={
             'user': request.user,
@@ -596,23 +651,21 @@ def study_summary_view(request, session_id):
         }
     )
 
-    # 2. ถ้าเพิ่งสร้าง (ยังไม่มีเนื้อหา) หรือเนื้อหาว่างเปล่า -> ให้ AI สรุป
+    # 2. ถ้าเพิ่งสร้าง (ยังไม่มีเนื้อหา) หรือเนื้อหาว่างเปล่า -> ส่งงานให้ AI สรุปเข้าคิว
+    job = None
     if created or not summary_obj.content:
-        # เรียก AI
-        ai_content = generate_content_summary(session.subject.name, session.topic)
-        
-        # บันทึกลง DB
-        summary_obj.content = ai_content
-        summary_obj.save()
+        job = enqueue_job(request.user, 'summary', {'session_id': str(session.session_id)})
+        if job.status == 'done':
+            summary_obj.refresh_from_db()
 
-    return render(request, 'core/summary_detail.html', {'summary': summary_obj})
+    return render(request, 'core/summary_detail.html', {'summary': summary_obj, 'job': job})
 
 @login_required
 def summary_history_view(request):
     """
     หน้ารวมรายการสรุปทั้งหมดที่เคยทำ
     """
-    summaries = StudySummary.objects.filter(user=request.user).select_related('subject')
+    summaries = StudySummary.objects.filter(user=request.user).select_related('subject', 'session')
     return render(request, 'core/summary_list.html', {'summaries': summaries})
 
 @login_required
@@ -620,50 +673,72 @@ def get_session_quiz(request, session_id):
     if request.method == 'GET':
         try:
             session = StudySession.objects.get(session_id=session_id, user=request.user)
-            # เรียก AI สร้างโจทย์
-            quiz_data = generate_quiz_questions(session.subject.name, session.topic)
-            
-            if quiz_data:
-                return JsonResponse({'success': True, 'quiz': quiz_data})
+            # ส่งงานให้ AI สร้างโจทย์เข้าคิว
+            payload = {'session_id': str(session.session_id)}
+            if request.GET.get('fresh'):
+                payload['fresh'] = True # ขอข้อสอบชุดใหม่ (ไม่ใช้ Cache)
+            job = enqueue_job(request.user, 'quiz', payload)
+
+            if job.status == 'done':
+                return JsonResponse({'success': True, 'status': 'done', 'quiz_id': job.result['quiz_id'], 'quiz': job.result['quiz']})
+            elif job.status == 'failed':
+                return JsonResponse({'success': False, 'error': job.error or 'AI could not generate quiz'})
             else:
-                return JsonResponse({'success': False, 'error': 'AI could not generate quiz'})
+                # ยังไม่เสร็จ ให้หน้าเว็บ poll ที่ job_status_view
+                return JsonResponse({'success': True, 'status': job.status, 'job_id': str(job.job_id)})
                 
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
             
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
+@login_required
+def job_status_view(request, job_id):
+    """
+    API สำหรับให้หน้าเว็บ poll สถานะงานเบื้องหลัง
+    """
+    job = get_object_or_404(BackgroundJob, job_id=job_id, user=request.user)
+    return JsonResponse({
+        'success': job.status != 'failed',
+        'status': job.status,
+        'result': job.result if job.status == 'done' else None,
+        'error': job.error,
+    })
+
 @login_required
 @require_POST
 def submit_quiz_view(request):
     """
     API รับข้อมูลการสอบ บันทึก และส่งคืน URL สำหรับ redirect
+    หน้าเว็บส่งมาแค่ quiz_id + คำตอบ (โจทย์/เฉลยเก็บไว้ฝั่ง Server แล้ว)
     """
     try:
         data = json.loads(request.body)
         session_id = data.get('session_id')
-        questions = data.get('questions') # โจทย์ที่ AI สร้าง (ส่งกลับมาบันทึก)
+        quiz_id = data.get('quiz_id')
         user_answers = data.get('answers') # คำตอบที่ user เลือก (Array of int)
 
         session = get_object_or_404(StudySession, session_id=session_id, user=request.user)
+        # GeneratedQuiz ใช้ร่วมกันทุกคน รับเฉพาะชุดที่เคยออกให้ Session นี้ของผู้ใช้คนนี้
+        try:
+            issued = IssuedQuiz.objects.filter(user=request.user, session=session, quiz_id=quiz_id).exists()
+        except ValidationError: # quiz_id ไม่ใช่ UUID
+            issued = False
+        if not issued:
+            return JsonResponse({'success': False, 'error': 'Quiz was not issued for this session'}, status=403)
+        quiz = get_object_or_404(GeneratedQuiz, quiz_id=quiz_id)
 
-        # คำนวณคะแนน Server-side
-        score = 0
-        for i, q in enumerate(questions):
-            # ตรวจว่าตอบถูกไหม (เทียบ user_answers[i] กับ correct_index)
-            # ต้องระวังเรื่อง index out of range หรือค่าว่าง
-            user_ans = user_answers[i]
-            if user_ans is not None and int(user_ans) == int(q['correct_index']):
-                score += 1
+        # คำนวณคะแนน Server-side กับโจทย์ที่เก็บไว้ (ไม่เชื่อข้อมูลโจทย์จากหน้าเว็บ)
+        score, user_answers = grade(quiz.questions, user_answers)
 
-        # บันทึกลง DB
+        # บันทึกลง DB (อ้างอิงชุดข้อสอบ ไม่ต้องเก็บโจทย์ซ้ำทุกครั้ง)
         quiz_result = QuizResult.objects.create(
             user=request.user,
             session=session,
-            questions_data=questions,
+            quiz=quiz,
             user_answers=user_answers,
             score=score,
-            total_questions=len(questions)
+            total_questions=len(quiz.questions)
         )
 
         return JsonResponse({
@@ -677,7 +752,7 @@ def submit_quiz_view(request):
 @login_required
 def quiz_result_view(request, result_id):
     """ หน้าแสดงผลคะแนน """
-    result = get_object_or_404(QuizResult, result_id=result_id, user=request.user)
+    result = get_object_or_404(QuizResult.objects.select_related('session'), result_id=result_id, user=request.user)
     percentage = int((result.score / result.total_questions) * 100)
     
     return render(request, 'core/quiz_result.html', {
@@ -688,11 +763,11 @@ def quiz_result_view(request, result_id):
 @login_required
 def quiz_solution_view(request, result_id):
     """ หน้าดูเฉลยละเอียด """
-    result = get_object_or_404(QuizResult, result_id=result_id, user=request.user)
+    result = get_object_or_404(QuizResult.objects.select_related('session__subject', 'quiz'), result_id=result_id, user=request.user)
     
     # รวมข้อมูลโจทย์และคำตอบผู้ใช้ เพื่อส่งไปวนลูปใน Template ได้ง่ายๆ
     solution_data = []
-    for i, q in enumerate(result.questions_data):
+    for i, q in enumerate(result.questions):
         user_ans_index = result.user_answers[i]
         solution_data.append({
             'question': q['question'],
@@ -759,6 +834,9 @@ def edit_profile_view(request):
         if user_form.is_valid() and settings_form.is_valid():
             user_form.save()
             settings_form.save()
+            if 'profile_picture' in user_form.changed_data:
+                # สร้างรูปย่อไว้ครั้งเดียวตอนอัปโหลด ทุกหน้าแสดงรูปย่อแทนรูปต้นฉบับ
+                refresh_profile_thumbnails(request.user)
             messages.success(request, 'อัปเดตโปรไฟล์เรียบร้อยแล้ว!')
             return redirect('edit_profile') # โหลดหน้าเดิมเพื่อให้เห็นข้อมูลใหม่
     else:
@@ -779,8 +857,9 @@ def logout_view(request):
 @login_required
 def mark_notification_as_read(request, notification_id):
     notification = get_object_or_404(Notification, notification_id=notification_id, recipient=request.user)
-    notification.is_read = True
-    notification.save()
+    if not notification.is_read:
+        notification.is_read = True
+        notification.save(update_fields=['is_read']) # Signal จะอัปเดตจำนวนที่ยังไม่อ่านใน Cache ให้
     
     # ถ้ามีลิงก์ ให้เด้งไปที่ลิงก์นั้น ถ้าไม่มี ให้เด้งกลับหน้าเดิม
     if notification.link:
@@ -21,6 +21,20 @@ DEBUG = os.getenv('DEBUG') == 'True'
 
 # AI Configuration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+# ตัวเรียก AI: 'gemini' (ของจริง) หรือ 'fake' (จำลองในเครื่อง ไม่ต้องต่อเน็ต สำหรับ Load test / CI)
+AI_PROVIDER = os.getenv('AI_PROVIDER', 'gemini')
+# จำลองความช้า (วินาที) และอัตราความล้มเหลว (0-1) ของ AI
+AI_PROVIDER_LATENCY = float(os.getenv('AI_PROVIDER_LATENCY', 0))
+AI_PROVIDER_FAILURE_RATE = float(os.getenv('AI_PROVIDER_FAILURE_RATE', 0))
+# ให้ AI ช่วยตั้งชื่อหัวข้อใน Session (ตารางเรียนสร้างในเครื่องอยู่แล้ว ไม่ต้องรอ AI)
+AI_TOPIC_LABELLING = os.getenv('AI_TOPIC_LABELLING') == 'True'
+# ส่งงาน AI เข้าคิวให้ Worker (python manage.py run_jobs) ทำแทน ถ้าไม่เปิดจะรันใน Request เหมือนเดิม
+USE_BACKGROUND_JOBS = os.getenv('USE_BACKGROUND_JOBS') == 'True'
+# Cache ผลลัพธ์ AI (สรุป/ข้อสอบ): อายุ (วินาที) และจำนวนรายการสูงสุดก่อนลบแบบ LRU
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', 30 * 24 * 3600))
+AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', 5000))
+# ตรวจจำนวน Query ต่อ Request และเตือน N+1 (ค่าเริ่มต้นเปิดเฉพาะตอน DEBUG)
+QUERY_INSPECTOR = os.getenv('QUERY_INSPECTOR', str(DEBUG)) == 'True'
 
 ALLOWED_HOSTS = ['*']
 
@@ -61,6 +75,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', # ✅ เพิ่มบรรทัดนี้ (ต้องอยู่ต่อจาก SecurityMiddleware ทันที)
+    'core.middleware.QueryCountMiddleware', # นับ Query ต่อ Request และเตือน N+1 (เปิดตาม QUERY_INSPECTOR)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -115,6 +130,24 @@ DATABASES = {
     )
 }
 
+# Cache กลางที่ทุก Worker/Process เห็นตรงกัน (สถิติหน้าแรก, กระดิ่งแจ้งเตือน, ตัวนับ AI Cache)
+# ถ้าใช้ LocMemCache ค่าเริ่มต้น แต่ละ Process มี Cache ของตัวเอง ลบ/เขียนทับใน Process หนึ่ง อีก Process ยังเห็นค่าเก่า
+# มี REDIS_URL = ใช้ Redis (ต้องติดตั้ง redis เพิ่ม) ไม่มี = เก็บในตาราง django_cache ของ DB (สร้างด้วย createcachetable)
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -212,5 +245,11 @@ else:
     MEDIA_URL = '/media/'
     MEDIA_ROOT = BASE_DIR / 'media'
 
+# คำนวณ sha256 ระหว่างรับไฟล์ที่อัปโหลด (core.blobs ไม่ต้องอ่านไฟล์ซ้ำเพื่อหา Blob เดิม)
+FILE_UPLOAD_HANDLERS = [
+    'core.uploads.HashingMemoryFileUploadHandler',
+    'core.uploads.HashingTemporaryFileUploadHandler',
+]
+
 # บอก Django ว่าถ้ามีการอัปโหลดไฟล์ (Media) ให้ไปเก็บที่ Cloudinary
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
\ No newline at end of file